@@ -0,0 +1,166 @@
+import atexit
+import datetime
+import os
+import queue
+import threading
+import zipfile
+
+import numpy
+import pandas
+
+ARTIFACT_FOLDER = "data"
+# Snapshots waiting to be written. Once full, new snapshots are dropped rather than holding up the caller
+MAX_QUEUE = 64
+# Snapshots written together in one pass over the archive
+BATCH_SIZE = 16
+# An archive is closed and a new one started once it reaches this size
+MAX_FILE_BYTES = 64 * 1024 * 1024
+
+
+# Class to write signal snapshots from a background thread
+class ArtifactWriter:
+    """
+    Background writer of signal snapshots. Callers hand over a snapshot (a dictionary of column name -> numpy array)
+    and return straight away. A worker thread writes snapshots in batches as .npy members of a zip archive (readable
+    with numpy.load as a .npz file), rotating to a new archive once the current one reaches max_file_bytes. The queue is
+    bounded: when it is full, submit waits up to block_timeout and then drops the snapshot
+    """
+
+    def __init__(self, folder=ARTIFACT_FOLDER, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE,
+                 max_file_bytes=MAX_FILE_BYTES, block_timeout=0.0):
+        """
+        :param folder: string of the folder archives are written to
+        :param max_queue: integer of the number of snapshots waiting to be written
+        :param batch_size: integer of the most snapshots written in one pass
+        :param max_file_bytes: integer of the size at which the archive is rotated
+        :param block_timeout: float of seconds submit waits for room in a full queue. Defaults to 0.0 (never waits)
+        """
+        self.folder = folder
+        self.batch_size = batch_size
+        self.max_file_bytes = max_file_bytes
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.archive_filepath = None
+        self.sequence = 0
+        self.written = 0
+        self.dropped = 0
+
+    # Function to hand a snapshot to the writer
+    def submit(self, name, columns):
+        """
+        Function to hand a snapshot to the writer. Arrays are written as they are when the worker reaches them, so pass
+        copies of any buffer which is reused
+        :param name: string of the snapshot name (i.e. EURUSD-EMA5-EMA10 CROSS STRATEGY)
+        :param columns: dictionary of column name -> numpy array
+        :return: Boolean. True if queued, False if dropped because the queue is full
+        """
+        self.start()
+        try:
+            if self.block_timeout > 0:
+                self.queue.put((name, columns), timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait((name, columns))
+        except queue.Full:
+            self.dropped += 1
+            print(f"Artifact queue full. Snapshot {name} dropped ({self.dropped} dropped so far)")
+            return False
+        return True
+
+    # Function to start the worker thread
+    def start(self):
+        """
+        Function to start the worker thread, if it is not running
+        :return: None
+        """
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="artifact-writer", daemon=True)
+                self.thread.start()
+
+    # Function run by the worker thread
+    def run(self):
+        """
+        Function run by the worker thread. Waits for a snapshot, then takes whatever else is queued (up to batch_size)
+        and writes them together. A None item stops the thread once everything before it is written
+        :return: None
+        """
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            snapshots = [item for item in batch if item is not None]
+            try:
+                if snapshots:
+                    self.write_batch(snapshots)
+            except Exception as e:
+                print(f"Error writing {len(snapshots)} artifact snapshots: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if batch[-1] is None:
+                return
+
+    # Function to write a batch of snapshots
+    def write_batch(self, snapshots):
+        """
+        Function to append a batch of snapshots to the current archive. Each column is stored as <snapshot>/<column>,
+        where the snapshot is numbered so names never clash
+        :param snapshots: list of (name, columns) tuples
+        :return: None
+        """
+        if self.archive_filepath is None or not os.path.exists(self.archive_filepath) \
+                or os.path.getsize(self.archive_filepath) >= self.max_file_bytes:
+            os.makedirs(self.folder, exist_ok=True)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            self.archive_filepath = os.path.join(self.folder, f"snapshots-{timestamp}.npz")
+        with zipfile.ZipFile(self.archive_filepath, mode='a', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, columns in snapshots:
+                self.sequence += 1
+                for column, values in columns.items():
+                    with archive.open(f"{self.sequence:08d}-{name}/{column}.npy", mode='w') as member:
+                        numpy.lib.format.write_array(member, numpy.asarray(values), allow_pickle=False)
+                self.written += 1
+
+    # Function to wait until every queued snapshot is written
+    def flush(self):
+        """
+        Function to block until every snapshot queued so far has been written
+        :return: None
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    # Function to stop the worker thread
+    def close(self):
+        """
+        Function to write every queued snapshot and stop the worker thread
+        :return: None
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+# Function to read the snapshots of an archive
+def read_snapshots(archive_filepath):
+    """
+    Function to read the snapshots of an archive written by ArtifactWriter
+    :param archive_filepath: string of the archive
+    :return: dictionary of snapshot name -> dataframe, in the order written
+    """
+    snapshots = {}
+    with numpy.load(archive_filepath, allow_pickle=False) as archive:
+        for key in archive.files:
+            name, column = key.rsplit("/", 1)
+            snapshots.setdefault(name, {})[column] = archive[key]
+    return {name: pandas.DataFrame(columns) for name, columns in snapshots.items()}
+
+
+# Writer shared by the whole bot. Queued snapshots are written before the interpreter exits
+artifact_writer = ArtifactWriter()
+atexit.register(artifact_writer.close)
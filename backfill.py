@@ -0,0 +1,209 @@
+import argparse
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import MetaTrader5
+import numpy
+
+import history_store
+import mt5_lib
+
+# Candles requested per window. Matches the limit of get_candlesticks, which MT5 handles with its default settings
+CHUNK_CANDLES = 50000
+# Symbols backfilled at the same time. Terminal calls are serialized by mt5_lock, so more workers only overlap the
+# disk writes of one symbol with the terminal requests of another
+MAX_WORKERS = 4
+# Attempts at a window the terminal returns nothing for, and the wait between them
+MAX_ATTEMPTS = 3
+RETRY_WAIT = 1.0
+# Weekly and monthly candles have no fixed length. These are used to size windows and spot the forming candle
+VARIABLE_TIMEFRAME_SECONDS = {
+    'weekly': 7 * 24 * 60 * 60,
+    'W1': 7 * 24 * 60 * 60,
+    'monthly': 31 * 24 * 60 * 60,
+    'MN1': 31 * 24 * 60 * 60
+}
+
+
+# Function to convert a date to seconds
+def to_seconds(date):
+    """
+    Function to convert a date to seconds since 1970-01-01, the format of candle times
+    :param date: datetime (naive datetimes are taken as UTC), string (i.e. 2020-01-01) or integer of seconds
+    :return: integer of seconds
+    """
+    if isinstance(date, str):
+        date = datetime.datetime.fromisoformat(date)
+    if isinstance(date, datetime.datetime):
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return int(date.timestamp())
+    return int(date)
+
+
+# Function to format seconds as a date
+def format_time(seconds):
+    """
+    Function to format seconds since 1970-01-01 as a UTC datetime, for progress messages
+    :param seconds: integer of seconds
+    :return: datetime
+    """
+    return datetime.datetime.fromtimestamp(int(seconds), tz=datetime.timezone.utc).replace(tzinfo=None)
+
+
+# Function to get the length of a timeframe for the backfill
+def get_backfill_seconds(timeframe):
+    """
+    Function to get the length of a timeframe in seconds, with an upper bound for weekly and monthly candles
+    :param timeframe: string of the timeframe
+    :return: integer of seconds
+    """
+    seconds = mt5_lib.get_timeframe_seconds(timeframe) or VARIABLE_TIMEFRAME_SECONDS.get(timeframe)
+    if seconds is None:
+        raise ValueError(f"Incorrect timeframe provided. {timeframe}")
+    return seconds
+
+
+# Function to request one window of candles from MT5
+def get_window(symbol, mt5_timeframe, window_start, window_end):
+    """
+    Function to request the candles opening between window_start and window_end (inclusive) from MT5. A window with
+    no trading (i.e. a weekend) is an empty array. None is retried, as the terminal may still be downloading history
+    :param symbol: string of the symbol
+    :param mt5_timeframe: MT5 timeframe constant
+    :param window_start: integer of seconds
+    :param window_end: integer of seconds
+    :return: structured array of candles. None if the terminal returned nothing after every attempt
+    """
+    date_from = datetime.datetime.fromtimestamp(window_start, tz=datetime.timezone.utc)
+    date_to = datetime.datetime.fromtimestamp(window_end, tz=datetime.timezone.utc)
+    for attempt in range(MAX_ATTEMPTS):
+        with mt5_lib.mt5_lock:
+            candles = MetaTrader5.copy_rates_range(symbol, mt5_timeframe, date_from, date_to)
+            error = MetaTrader5.last_error() if candles is None else None
+        if candles is not None:
+            return candles
+        print(f"No candles returned for {symbol} from {date_from} to {date_to}. Error: {error}")
+        if attempt < MAX_ATTEMPTS - 1:
+            time.sleep(RETRY_WAIT)
+    return None
+
+
+# Function to backfill the history of one symbol
+def backfill_symbol(symbol, timeframe, start, end=None, chunk_candles=CHUNK_CANDLES,
+                    history_folder=history_store.HISTORY_FOLDER):
+    """
+    Function to page through the history of a symbol with copy_rates_range, one window of chunk_candles at a time, and
+    append each window to the history store as it arrives, so only one window is held in memory. The store is
+    append-only, so the backfill always runs forwards and resumes after the most recent stored candle: run it again
+    after an interruption and it carries on where it stopped. Duplicate candles, within a window or overlapping what
+    is stored, are dropped
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param start: datetime, string or integer of seconds of the first candle wanted
+    :param end: datetime, string or integer of seconds of the last candle wanted. Defaults to None (the latest tick)
+    :param chunk_candles: integer of candles per window
+    :param history_folder: string of the root folder of the history store
+    :return: integer of the number of candles written
+    """
+    mt5_timeframe = mt5_lib.set_query_timeframe(timeframe=timeframe)
+    seconds = get_backfill_seconds(timeframe=timeframe)
+    start = to_seconds(start)
+    if end is None:
+        with mt5_lib.mt5_lock:
+            tick = MetaTrader5.symbol_info_tick(symbol)
+        end = tick.time if tick is not None else int(time.time())
+    end = to_seconds(end)
+    # Resume after the most recent stored candle
+    stored = history_store.open_history(symbol=symbol, timeframe=timeframe, history_folder=history_folder)
+    stored_time = stored.get('time')
+    if stored_time is not None and len(stored_time) > 0:
+        if stored_time[0] > start:
+            print(f"{symbol} {timeframe} history starts at {format_time(stored_time[0])}. Earlier candles cannot be "
+                  f"added to the store, continuing from its end")
+        start = max(start, int(stored_time[-1]) + 1)
+    written = 0
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + chunk_candles * seconds - 1, end)
+        candles = get_window(symbol=symbol, mt5_timeframe=mt5_timeframe, window_start=window_start,
+                             window_end=window_end)
+        if candles is None:
+            # Stop here. Running the backfill again resumes from this window
+            print(f"Backfill of {symbol} {timeframe} stopped at {format_time(window_start)}. Run again to resume")
+            break
+        if len(candles) > 0:
+            # Sort, drop duplicate times and the candle still forming at the end
+            _, first_rows = numpy.unique(candles['time'], return_index=True)
+            candles = candles[first_rows]
+            candles = candles[candles['time'] + seconds <= end]
+            written += history_store.append_candles(symbol=symbol, timeframe=timeframe, candles=candles,
+                                                    history_folder=history_folder)
+        print(f"{symbol} {timeframe}: {format_time(window_start)} to {format_time(window_end)}. "
+              f"{written} candles written")
+        window_start = window_end + 1
+    return written
+
+
+# Function to backfill the history of several symbols
+def backfill(symbols, timeframe, start, end=None, chunk_candles=CHUNK_CANDLES, max_workers=MAX_WORKERS,
+             history_folder=history_store.HISTORY_FOLDER):
+    """
+    Function to backfill the history of several symbols concurrently. An error on one symbol does not stop the others
+    :param symbols: list of symbols
+    :param timeframe: string of the timeframe
+    :param start: datetime, string or integer of seconds of the first candle wanted
+    :param end: datetime, string or integer of seconds of the last candle wanted. Defaults to None (the latest tick)
+    :param chunk_candles: integer of candles per window
+    :param max_workers: integer of symbols backfilled at the same time
+    :param history_folder: string of the root folder of the history store
+    :return: dictionary of symbol -> number of candles written. None for a symbol which failed
+    """
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(backfill_symbol, symbol=symbol, timeframe=timeframe, start=start, end=end,
+                            chunk_candles=chunk_candles, history_folder=history_folder): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                outcomes[symbol] = future.result()
+            except Exception as e:
+                print(f"Error backfilling {symbol}: {e}")
+                outcomes[symbol] = None
+    return outcomes
+
+
+# Main function
+if __name__ == '__main__':
+    import main
+    parser = argparse.ArgumentParser(description="Backfill the history store from MetaTrader 5")
+    parser.add_argument("--start", required=True, help="first candle wanted, i.e. 2020-01-01")
+    parser.add_argument("--end", default=None, help="last candle wanted. Defaults to the latest tick")
+    parser.add_argument("--symbols", nargs="+", default=None, help="defaults to the symbols in the settings")
+    parser.add_argument("--timeframe", default=None, help="defaults to the timeframe in the settings")
+    parser.add_argument("--chunk", type=int, default=CHUNK_CANDLES)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    arguments = parser.parse_args()
+    project_settings = main.get_project_settings(settings_filepath=main.SETTINGS_FILEPATH)
+    if arguments.symbols is not None:
+        project_settings["mt5"]["symbols"] = arguments.symbols
+    if not main.startup(project_settings=project_settings):
+        print("Bye")
+        exit(1)
+    backfill_outcomes = backfill(
+        symbols=project_settings["mt5"]["symbols"],
+        timeframe=arguments.timeframe or project_settings["mt5"]["timeframe"],
+        start=arguments.start,
+        end=arguments.end,
+        chunk_candles=arguments.chunk,
+        max_workers=arguments.workers
+    )
+    for symbol, candles_written in backfill_outcomes.items():
+        if candles_written is None:
+            print(f"{symbol}: failed")
+        else:
+            print(f"{symbol}: {candles_written} candles written")
@@ -0,0 +1,288 @@
+import numpy as np
+import pandas
+
+import ema_cross_strategy
+import history_store
+import mt5_lib
+import tick_feed
+from helper_functions import FOREX_CONTRACT_SIZE, calc_forex_quote_to_account, calc_lot_sizes, calc_profit
+
+
+# Function to backtest the EMA Cross Strategy on one symbol
+def run_backtest(symbol, timeframe, ema_one, ema_two, balance, amount_to_risk, data=None, number_of_candles=None):
+    """
+    Function to backtest the EMA Cross Strategy on stored candles. Candles are replayed through calc_indicators and
+    det_trade, then every signal is simulated the way the live bot trades it:
+    1. After a candle closes with a signal, a BUY_STOP or SELL_STOP is placed with the values from make_trade
+    2. The order is rejected if its stop_price is already through the market (the open of the next candle)
+    3. The order can only fill during the next candle, as run_strategy cancels it when that candle closes
+    4. Once filled, the position is closed at the stop_loss or take_profit. If both are inside the same candle, the
+    stop_loss is assumed to be hit first
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param ema_one: integer of EMA size
+    :param ema_two: integer of EMA size
+    :param balance: float of the (static) balance used for sizing
+    :param amount_to_risk: float of the amount to risk (expressed as decimal)
+    :param data: dataframe of candlesticks. Defaults to None (read from the history store)
+    :param number_of_candles: integer of the number of stored candles to use. Defaults to None (all)
+    :return: dataframe of simulated orders
+    """
+    # Step 1: Retrieve data
+    if data is None:
+        data = history_store.read_candles(symbol=symbol, timeframe=timeframe, number_of_candles=number_of_candles)
+    if len(data) < 3:
+        return make_orders_dataframe(symbol=symbol, orders={})
+    # Step 2: Calculate indicators. calc_indicators drops rows in place, so work on a copy of the caller's data
+    data = ema_cross_strategy.calc_indicators(dataframe=data.copy(), ema_one=ema_one, ema_two=ema_two)
+    # Step 3: Calculate trade events
+    data = ema_cross_strategy.det_trade(dataframe=data, ema_one=ema_one, ema_two=ema_two)
+    # Step 4: Simulate the orders
+    orders = simulate_orders(dataframe=data, symbol=symbol, balance=balance, amount_to_risk=amount_to_risk)
+    return make_orders_dataframe(symbol=symbol, orders=orders)
+
+
+# Function to backtest the EMA Cross Strategy on several symbols
+def run_backtests(symbols, timeframe, ema_one, ema_two, balance, amount_to_risk, number_of_candles=None):
+    """
+    Function to backtest the EMA Cross Strategy on a list of symbols from the history store
+    :param symbols: list of symbols
+    :param timeframe: string of the timeframe
+    :param ema_one: integer of EMA size
+    :param ema_two: integer of EMA size
+    :param balance: float of the (static) balance used for sizing
+    :param amount_to_risk: float of the amount to risk (expressed as decimal)
+    :param number_of_candles: integer of the number of stored candles to use. Defaults to None (all)
+    :return: tuple of (dataframe of all simulated orders, dataframe of the summary per symbol)
+    """
+    all_orders = []
+    for symbol in symbols:
+        all_orders.append(run_backtest(
+            symbol=symbol,
+            timeframe=timeframe,
+            ema_one=ema_one,
+            ema_two=ema_two,
+            balance=balance,
+            amount_to_risk=amount_to_risk,
+            number_of_candles=number_of_candles
+        ))
+    orders = pandas.concat(all_orders, ignore_index=True)
+    summary = pandas.DataFrame([{'symbol': symbol, **summarize_orders(orders=symbol_orders)}
+                                for symbol, symbol_orders in orders.groupby('symbol')])
+    return orders, summary
+
+
+# Function to simulate the pending orders of every signal
+def simulate_orders(dataframe, symbol, balance, amount_to_risk):
+    """
+    Function to simulate the pending orders placed on every signal. Placement and fill detection are vectorized over
+    all signals, exits are found with a forward search per filled order
+    :param dataframe: dataframe of candlesticks with trade values from det_trade
+    :param symbol: string of the symbol
+    :param balance: float of the (static) balance used for sizing
+    :param amount_to_risk: float of the amount to risk (expressed as decimal)
+    :return: dictionary of column name -> numpy array, one row per signal
+    """
+    times = dataframe['time'].to_numpy()
+    opens = dataframe['open'].to_numpy()
+    highs = dataframe['high'].to_numpy()
+    lows = dataframe['low'].to_numpy()
+    closes = dataframe['close'].to_numpy()
+    take_profit = dataframe['take_profit'].to_numpy()
+    stop_loss = dataframe['stop_loss'].to_numpy()
+    stop_price = dataframe['stop_price'].to_numpy()
+    # Find the signals which make_trade would act on. The last candle has no next candle to trade in
+    signal_mask = dataframe['ema_cross'].to_numpy(dtype=bool) & (take_profit > 0) & (stop_loss > 0) & (stop_price > 0)
+    signal_mask[-1] = False
+    signals = np.flatnonzero(signal_mask)
+    # Round prices to the tick size and digits of the symbol, as mt5_lib.place_order does for live orders
+    symbol_info = mt5_lib.symbol_registry.get_info(symbol)
+    take_profit = mt5_lib.normalize_prices(take_profit[signals], symbol_info)
+    stop_loss = mt5_lib.normalize_prices(stop_loss[signals], symbol_info)
+    stop_price = mt5_lib.normalize_prices(stop_price[signals], symbol_info)
+    is_buy = stop_price > stop_loss
+    # An order with its stop_loss at the stop_price fails the order check
+    valid = stop_price != stop_loss
+    lot_size = np.where(valid, calc_order_lot_sizes(symbol=symbol, balance=balance, amount_to_risk=amount_to_risk,
+                                                    stop_loss=stop_loss, stop_price=stop_price), 0.00)
+    # The order lives for the next candle only
+    order_candle = signals + 1
+    accepted = valid & np.where(is_buy, stop_price > opens[order_candle], stop_price < opens[order_candle])
+    filled = accepted & np.where(is_buy, highs[order_candle] >= stop_price, lows[order_candle] <= stop_price)
+    status = np.where(filled, "filled", np.where(accepted, "cancelled", "rejected"))
+    # Find the exit of each filled order
+    exit_candle = np.full(len(signals), -1)
+    exit_price = np.full(len(signals), np.nan)
+    exit_reason = np.full(len(signals), "", dtype=object)
+    for i in np.flatnonzero(filled):
+        exit_candle[i], exit_price[i], exit_reason[i] = find_exit(
+            highs=highs,
+            lows=lows,
+            closes=closes,
+            start=order_candle[i],
+            is_buy=is_buy[i],
+            stop_loss=stop_loss[i],
+            take_profit=take_profit[i]
+        )
+    profit = np.zeros(len(signals))
+    direction = np.where(is_buy, 1, -1)
+    profit[filled] = calc_profit(lot_size=direction[filled] * lot_size[filled], entry_price=stop_price[filled],
+                                 exit_price=exit_price[filled], symbol=symbol)
+    return {
+        'signal_time': times[signals],
+        'order_type': np.where(is_buy, "BUY_STOP", "SELL_STOP"),
+        'stop_price': stop_price,
+        'stop_loss': stop_loss,
+        'take_profit': take_profit,
+        'lot_size': lot_size,
+        'status': status,
+        'exit_time': np.where(exit_candle >= 0, times[exit_candle], 0),
+        'exit_price': exit_price,
+        'exit_reason': exit_reason,
+        'profit': profit
+    }
+
+
+# Function to size the orders of every signal
+def calc_order_lot_sizes(symbol, balance, amount_to_risk, stop_loss, stop_price):
+    """
+    Function to calculate the lot size of every signal in one numpy call, from the symbol metadata as make_trade does.
+    Without a cross rate to the account currency (i.e. offline), FOREX pairs use the calculation of calc_lot_size and
+    other symbols are not traded
+    :param symbol: string of the symbol
+    :param balance: float of the (static) balance used for sizing
+    :param amount_to_risk: float of the amount to risk (expressed as decimal)
+    :param stop_loss: numpy array of stop_loss prices
+    :param stop_price: numpy array of stop_price prices
+    :return: numpy array of lot sizes
+    """
+    sizing_metadata = mt5_lib.get_sizing_metadata(symbols=[symbol])
+    if np.isnan(sizing_metadata['quote_to_account'][0]):
+        if not mt5_lib.is_forex_symbol(symbol):
+            return np.zeros(len(stop_price))
+        return calc_lot_sizes(
+            balance=balance,
+            risk_amount=amount_to_risk,
+            stop_loss=stop_loss,
+            stop_price=stop_price,
+            contract_size=FOREX_CONTRACT_SIZE,
+            quote_to_account=calc_forex_quote_to_account(symbol=symbol, stop_price=stop_price)
+        )
+    return calc_lot_sizes(
+        balance=balance,
+        risk_amount=amount_to_risk,
+        stop_loss=stop_loss,
+        stop_price=stop_price,
+        **{name: values[0] for name, values in sizing_metadata.items()}
+    )
+
+
+# Function to find the exit of a filled order
+def find_exit(highs, lows, closes, start, is_buy, stop_loss, take_profit, window=256):
+    """
+    Function to find the first candle from start where the stop_loss or take_profit of a position is hit. Candles are
+    searched in growing windows so short trades do not scan the rest of the history
+    :param highs: numpy array of candle highs
+    :param lows: numpy array of candle lows
+    :param closes: numpy array of candle closes
+    :param start: integer of the candle the order filled in
+    :param is_buy: Boolean. True for a BUY position
+    :param stop_loss: float of the stop_loss
+    :param take_profit: float of the take_profit
+    :param window: integer of the initial search window
+    :return: tuple of (candle index, exit price, exit reason). Reason is 'open' if neither is hit by the last candle
+    """
+    while start < len(highs):
+        end = min(start + window, len(highs))
+        if is_buy:
+            hit_stop_loss = lows[start:end] <= stop_loss
+            hit_take_profit = highs[start:end] >= take_profit
+        else:
+            hit_stop_loss = highs[start:end] >= stop_loss
+            hit_take_profit = lows[start:end] <= take_profit
+        hit = hit_stop_loss | hit_take_profit
+        if hit.any():
+            offset = int(np.argmax(hit))
+            # Assume the stop_loss is hit first if both are inside the candle
+            if hit_stop_loss[offset]:
+                return start + offset, stop_loss, "stop_loss"
+            return start + offset, take_profit, "take_profit"
+        start = end
+        window *= 2
+    # Still open at the end of the data, value at the last close
+    return len(closes) - 1, closes[-1], "open"
+
+
+# Function to replay simulated orders on ticks
+def replay_orders(orders, ticks, timeframe_seconds, symbol):
+    """
+    Function to replay the orders simulated on candles on ticks instead, for fills and exits at the tick they happen.
+    Each order is placed when its signal candle closes and cancelled when the next candle closes, as in the live bot.
+    Fills at the ask (BUY_STOP) or bid (SELL_STOP), so the spread and gaps through the stop_price are accounted for
+    :param orders: dataframe of simulated orders from run_backtest
+    :param ticks: structured array of ticks covering the orders, oldest first (see tick_feed.get_ticks)
+    :param timeframe_seconds: integer of the length of the candles the orders were simulated on
+    :param symbol: string of the symbol
+    :return: dataframe of orders with status, fill_price, exit and profit columns from the ticks
+    """
+    orders = orders.copy()
+    fill_price = np.full(len(orders), np.nan)
+    for i, order in enumerate(orders.itertuples(index=False)):
+        # Orders which fail the order check are not sent
+        if order.lot_size <= 0:
+            continue
+        start_msc = (int(order.signal_time) + timeframe_seconds) * 1000
+        status, _, fill_price[i], exit_time, exit_price, exit_reason = tick_feed.replay_stop_order(
+            ticks=ticks,
+            order_type=order.order_type,
+            stop_price=order.stop_price,
+            stop_loss=order.stop_loss,
+            take_profit=order.take_profit,
+            start_msc=start_msc,
+            expiry_msc=start_msc + timeframe_seconds * 1000
+        )
+        profit = 0.00
+        if status == "filled":
+            direction = 1 if order.order_type == "BUY_STOP" else -1
+            profit = calc_profit(lot_size=direction * order.lot_size, entry_price=fill_price[i],
+                                 exit_price=exit_price, symbol=symbol)
+        orders.iloc[i, orders.columns.get_indexer(['status', 'exit_time', 'exit_price', 'exit_reason', 'profit'])] = \
+            [status, exit_time // 1000, exit_price, exit_reason, profit]
+    orders.insert(orders.columns.get_loc('exit_time'), 'fill_price', fill_price)
+    return orders
+
+
+# Function to build the dataframe of simulated orders
+def make_orders_dataframe(symbol, orders):
+    """
+    Function to build the dataframe of simulated orders
+    :param symbol: string of the symbol
+    :param orders: dictionary of column name -> numpy array from simulate_orders
+    :return: dataframe of simulated orders
+    """
+    columns = ['signal_time', 'order_type', 'stop_price', 'stop_loss', 'take_profit', 'lot_size', 'status',
+               'exit_time', 'exit_price', 'exit_reason', 'profit']
+    dataframe = pandas.DataFrame({column: orders.get(column, []) for column in columns})
+    dataframe.insert(0, 'symbol', symbol)
+    return dataframe
+
+
+# Function to summarize simulated orders
+def summarize_orders(orders):
+    """
+    Function to summarize simulated orders
+    :param orders: dataframe of simulated orders
+    :return: dictionary of summary statistics
+    """
+    filled = orders[orders['status'] == "filled"]
+    equity = filled['profit'].cumsum()
+    return {
+        'signals': len(orders),
+        'filled': len(filled),
+        'rejected': int((orders['status'] == "rejected").sum()),
+        'cancelled': int((orders['status'] == "cancelled").sum()),
+        'wins': int((filled['profit'] > 0).sum()),
+        'losses': int((filled['profit'] < 0).sum()),
+        'profit': float(filled['profit'].sum()),
+        'max_drawdown': float((equity.cummax() - equity).max()) if len(equity) > 0 else 0.00
+    }
@@ -0,0 +1,252 @@
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import fake_mt5
+
+# The fake terminal must be installed before any module importing MetaTrader5
+terminal = fake_mt5.install()
+
+import numpy
+import pandas
+
+import ema_cross_strategy
+import indicator_lib
+import main
+import mt5_lib
+import strategy_lib
+from artifact_writer import artifact_writer
+
+CANDLE_COUNTS = [1000, 10000, 50000]
+SYMBOL_COUNTS = [1, 10, 100]
+RESULTS_FILEPATH = os.path.join("benchmarks", "results.csv")
+# A benchmark is reported as a regression when its median is this much slower than the previous run
+REGRESSION_THRESHOLD = 1.25
+EMA_ONE = main.EMA_1_PERIOD
+EMA_TWO = main.EMA_2_PERIOD
+
+
+# Function to time a function
+def time_function(function, repeat, warmup=1):
+    """
+    Function to time a function over several runs, after warm up runs which are not recorded
+    :param function: function taking no arguments
+    :param repeat: integer of the number of timed runs
+    :param warmup: integer of the number of runs before timing
+    :return: list of floats of seconds per run
+    """
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+# Function to get the names of the benchmark symbols
+def get_symbols(number_of_symbols):
+    """
+    Function to get the names of the benchmark symbols, adding synthetic symbols to the fake terminal past the defaults
+    :param number_of_symbols: integer of the number of symbols
+    :return: list of symbols
+    """
+    symbols = list(fake_mt5.DEFAULT_SYMBOLS)[:number_of_symbols]
+    for i in range(len(symbols), number_of_symbols):
+        symbol = f"SYN{i:03d}USD"
+        if symbol not in terminal.symbols:
+            terminal.add_symbol(symbol, currency_base=f"S{i:02d}", price=1.0 + i / 100)
+        symbols.append(symbol)
+    return symbols
+
+
+# Function to clear every cache held between cycles
+def reset_state(symbols):
+    """
+    Function to clear the candle cache, indicator states, frames, registered strategies, open orders and positions,
+    reset the clock and reload symbol metadata, so every benchmark starts from the same state
+    :param symbols: list of symbols to enable
+    :return: None
+    """
+    terminal.time = fake_mt5.DEFAULT_START_TIME
+    mt5_lib.invalidate_candle_cache()
+    ema_cross_strategy.streaming_states.clear()
+    ema_cross_strategy.candle_frames.clear()
+    strategy_lib.strategy_registry.clear()
+    terminal.orders.clear()
+    terminal.positions.clear()
+    mt5_lib.enable_all_symbols(symbol_array=symbols)
+
+
+# Function to benchmark calc_ema
+def bench_calc_ema(number_of_candles, repeat):
+    candles = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=number_of_candles,
+                                       use_cache=False)
+    return time_function(lambda: indicator_lib.calc_ema(dataframe=candles, ema_size=EMA_TWO), repeat=repeat)
+
+
+# Function to benchmark det_trade
+def bench_det_trade(number_of_candles, repeat):
+    candles = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=number_of_candles,
+                                       use_cache=False)
+    candles = ema_cross_strategy.calc_indicators(dataframe=candles, ema_one=EMA_ONE, ema_two=EMA_TWO)
+    return time_function(lambda: ema_cross_strategy.det_trade(dataframe=candles, ema_one=EMA_ONE, ema_two=EMA_TWO),
+                         repeat=repeat)
+
+
+# Function to benchmark run_strategy with a full recompute each time
+def bench_run_strategy(number_of_candles, number_of_symbols, repeat):
+    symbols = get_symbols(number_of_symbols)
+    reset_state(symbols)
+    project_settings = {"mt5": {"symbols": symbols, "timeframe": "M1"}}
+    main.NUMBER_OF_CANDLES = number_of_candles
+    main.STREAMING = False
+    return time_function(lambda: main.run_strategy(project_settings=project_settings, comment="BENCHMARK"),
+                         repeat=repeat)
+
+
+# Function to benchmark full cycles, one new candle each
+def bench_full_cycle(number_of_candles, number_of_symbols, repeat):
+    symbols = get_symbols(number_of_symbols)
+    reset_state(symbols)
+    project_settings = {"mt5": {"symbols": symbols, "timeframe": "M1"}}
+    main.NUMBER_OF_CANDLES = number_of_candles
+    main.STREAMING = True
+
+    def run_cycle():
+        terminal.advance(60)
+        previous_times = {}
+        new_symbols = main.get_symbols_with_new_candle(symbols=symbols, timeframe="M1", previous_times=previous_times)
+        main.run_strategy(project_settings=project_settings, comment="BENCHMARK", symbols=new_symbols)
+
+    return time_function(run_cycle, repeat=repeat)
+
+
+# Function to run every benchmark
+def run_benchmarks(candle_counts=CANDLE_COUNTS, symbol_counts=SYMBOL_COUNTS, repeat=5, latency=0.0):
+    """
+    Function to run every benchmark against the fake terminal
+    :param candle_counts: list of integers of candles per symbol
+    :param symbol_counts: list of integers of symbols per cycle
+    :param repeat: integer of timed runs per benchmark
+    :param latency: float of seconds each fake terminal call sleeps for
+    :return: dataframe of results, one row per benchmark
+    """
+    terminal.set_latency(latency)
+    rows = []
+
+    def record(name, number_of_candles, number_of_symbols, timings):
+        rows.append({
+            'name': name, 'candles': number_of_candles, 'symbols': number_of_symbols, 'repeat': len(timings),
+            'median': statistics.median(timings), 'best': min(timings), 'latency': latency
+        })
+        print(f"{name:<14} candles={number_of_candles:<6} symbols={number_of_symbols:<4} "
+              f"median={statistics.median(timings) * 1000:9.2f}ms best={min(timings) * 1000:9.2f}ms")
+
+    # Strategy output (dots, signals, CSV dumps) goes to a scratch folder and is kept off the console
+    working_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_folder:
+        os.chdir(scratch_folder)
+        os.makedirs(main.OUTPUT_FOLDER, exist_ok=True)
+        try:
+            for number_of_candles in candle_counts:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings = bench_calc_ema(number_of_candles, repeat)
+                record("calc_ema", number_of_candles, 1, timings)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings = bench_det_trade(number_of_candles, repeat)
+                record("det_trade", number_of_candles, 1, timings)
+                for number_of_symbols in symbol_counts:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        timings = bench_run_strategy(number_of_candles, number_of_symbols, repeat)
+                    record("run_strategy", number_of_candles, number_of_symbols, timings)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        timings = bench_full_cycle(number_of_candles, number_of_symbols, repeat)
+                    record("full_cycle", number_of_candles, number_of_symbols, timings)
+        finally:
+            # Snapshots are written to the scratch folder, so let the writer finish before leaving it
+            artifact_writer.flush()
+            os.chdir(working_folder)
+    return pandas.DataFrame(rows)
+
+
+# Function to get the current git commit
+def get_commit():
+    """
+    Function to get the short hash of the current git commit
+    :return: string of the hash, "unknown" outside a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# Function to compare results with the previous run
+def compare_results(results, results_filepath=RESULTS_FILEPATH, threshold=REGRESSION_THRESHOLD):
+    """
+    Function to compare results with the most recent stored run at the same latency
+    :param results: dataframe of results from run_benchmarks
+    :param results_filepath: string of the results CSV
+    :param threshold: float of the slowdown ratio reported as a regression
+    :return: dataframe of regressions. Empty if none or no previous run
+    """
+    if not os.path.exists(results_filepath):
+        return pandas.DataFrame()
+    previous = pandas.read_csv(results_filepath)
+    previous = previous[previous['latency'] == results['latency'].iloc[0]]
+    if previous.empty:
+        return pandas.DataFrame()
+    previous = previous[previous['run'] == previous['run'].max()]
+    previous = previous.rename(columns={'median': 'median_previous', 'commit': 'commit_previous'})
+    merged = results.merge(previous[['name', 'candles', 'symbols', 'median_previous', 'commit_previous']],
+                           on=['name', 'candles', 'symbols'])
+    merged['ratio'] = merged['median'] / merged['median_previous']
+    return merged[merged['ratio'] > threshold]
+
+
+# Function to store results
+def save_results(results, results_filepath=RESULTS_FILEPATH):
+    """
+    Function to append results to the results CSV, tagged with the run time, commit and versions
+    :param results: dataframe of results from run_benchmarks
+    :param results_filepath: string of the results CSV
+    :return: None
+    """
+    results = results.copy()
+    results.insert(0, 'run', datetime.datetime.now().isoformat(timespec='seconds'))
+    results.insert(1, 'commit', get_commit())
+    results['python'] = platform.python_version()
+    results['numpy'] = numpy.__version__
+    results['pandas'] = pandas.__version__
+    os.makedirs(os.path.dirname(results_filepath) or ".", exist_ok=True)
+    results.to_csv(results_filepath, mode='a', index=False, header=not os.path.exists(results_filepath))
+
+
+# Main function
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the trading bot against a fake MetaTrader 5 terminal")
+    parser.add_argument("--candles", type=int, nargs="+", default=CANDLE_COUNTS)
+    parser.add_argument("--symbols", type=int, nargs="+", default=SYMBOL_COUNTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each terminal call sleeps for")
+    parser.add_argument("--results", default=RESULTS_FILEPATH)
+    parser.add_argument("--no-save", action="store_true")
+    arguments = parser.parse_args()
+    benchmark_results = run_benchmarks(candle_counts=arguments.candles, symbol_counts=arguments.symbols,
+                                       repeat=arguments.repeat, latency=arguments.latency)
+    regressions = compare_results(results=benchmark_results, results_filepath=arguments.results)
+    if not regressions.empty:
+        print("\nRegressions against the previous run:")
+        print(regressions[['name', 'candles', 'symbols', 'median_previous', 'median', 'ratio', 'commit_previous']])
+    if not arguments.no_save:
+        save_results(results=benchmark_results, results_filepath=arguments.results)
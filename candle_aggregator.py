@@ -0,0 +1,209 @@
+import MetaTrader5
+import numpy
+import pandas
+
+import mt5_lib
+
+BASE_TIMEFRAME = 'M1'
+
+
+# Function to aggregate candles into a higher timeframe
+def aggregate_candles(candles, seconds):
+    """
+    Function to aggregate candles into candles of a higher timeframe. Candles are grouped by the start of the higher
+    timeframe candle they fall in (MT5 candle times are server times, so daily candles start at server midnight).
+    Open is the first open, high the highest high, low the lowest low, close the last close, volumes are summed and
+    spread is the lowest spread
+    :param candles: structured array of candles as returned by MT5, oldest first
+    :param seconds: integer of the length of the higher timeframe in seconds
+    :return: structured array of aggregated candles, same dtype as candles
+    """
+    if len(candles) == 0:
+        return candles[:0].copy()
+    buckets = candles['time'] // seconds * seconds
+    # Index of the first and last candle of each bucket
+    starts = numpy.flatnonzero(numpy.r_[True, buckets[1:] != buckets[:-1]])
+    ends = numpy.r_[starts[1:], len(candles)] - 1
+    aggregated = numpy.empty(len(starts), dtype=candles.dtype)
+    for name in candles.dtype.names:
+        if name == 'time':
+            aggregated[name] = buckets[starts]
+        elif name == 'open':
+            aggregated[name] = candles[name][starts]
+        elif name == 'high':
+            aggregated[name] = numpy.maximum.reduceat(candles[name], starts)
+        elif name in ('low', 'spread'):
+            aggregated[name] = numpy.minimum.reduceat(candles[name], starts)
+        elif name in ('tick_volume', 'real_volume'):
+            aggregated[name] = numpy.add.reduceat(candles[name], starts)
+        else:
+            aggregated[name] = candles[name][ends]
+    return aggregated
+
+
+# Class to build several timeframes from a single base timeframe feed
+class TimeframeAggregator:
+    """
+    Candles of several timeframes for one symbol, built from the base timeframe (M1) candle cache. Each timeframe is
+    seeded once with a direct fetch. From then on, every update makes a single delta request for base candles and folds
+    them into each timeframe, so the terminal is queried once per cycle whatever the number of timeframes.
+    Base candles of a candle still forming are held back until the candle is complete
+    """
+
+    def __init__(self, symbol, timeframes, number_of_candles, base_timeframe=BASE_TIMEFRAME):
+        """
+        :param symbol: string of the symbol
+        :param timeframes: list of timeframe strings. Each must have a fixed length which is a multiple of the base
+        timeframe length (weekly and monthly are not supported)
+        :param number_of_candles: integer of the number of candles kept for each timeframe
+        :param base_timeframe: string of the base timeframe. Defaults to M1
+        """
+        self.symbol = symbol
+        self.base_timeframe = base_timeframe
+        self.base_seconds = mt5_lib.get_timeframe_seconds(base_timeframe)
+        self.timeframe_seconds = {}
+        for timeframe in timeframes:
+            seconds = mt5_lib.get_timeframe_seconds(timeframe)
+            if seconds is None or self.base_seconds is None or seconds % self.base_seconds != 0:
+                raise ValueError(f"{timeframe} cannot be built from {base_timeframe} candles")
+            if timeframe != base_timeframe:
+                self.timeframe_seconds[timeframe] = seconds
+        self.number_of_candles = number_of_candles
+        # The base window must cover a full candle of the longest timeframe, so a forming candle can be rebuilt
+        longest = max(self.timeframe_seconds.values(), default=self.base_seconds)
+        self.base_window = max(number_of_candles, longest // self.base_seconds + 1)
+        self.caches = {}
+        self.pending = {}
+        self.last_base_time = None
+
+    # Function to get the base candles from the candle cache
+    def get_base_candles(self):
+        """
+        Function to bring the base timeframe candle cache up to date and get its candles
+        :return: structured array of base candles, oldest first
+        """
+        cache = mt5_lib.update_candle_cache(
+            symbol=self.symbol,
+            timeframe=self.base_timeframe,
+            mt5_timeframe=mt5_lib.set_query_timeframe(timeframe=self.base_timeframe),
+            number_of_candles=self.base_window
+        )
+        candles, _ = cache.tail(self.base_window)
+        return candles
+
+    # Function to seed every timeframe
+    def seed(self, base_candles):
+        """
+        Function to seed every timeframe with a direct fetch of its completed candles, then rebuild the candle still
+        forming from the base candles
+        :param base_candles: structured array of base candles, oldest first
+        :return: None
+        """
+        for timeframe, seconds in self.timeframe_seconds.items():
+            with mt5_lib.mt5_lock:
+                candles = MetaTrader5.copy_rates_from_pos(self.symbol, mt5_lib.set_query_timeframe(timeframe), 1,
+                                                          self.number_of_candles)
+            if candles is None:
+                candles = base_candles[:0]
+            cache = mt5_lib.CandleCache(max_candles=self.number_of_candles)
+            cache.replace(candles)
+            self.caches[timeframe] = cache
+            # Base candles after the last completed candle belong to the candle still forming
+            self.pending[timeframe] = base_candles[:0]
+            last_time = cache.last_time()
+            if last_time is None:
+                self.fold(timeframe=timeframe, base_candles=base_candles)
+            else:
+                self.fold(timeframe=timeframe, base_candles=base_candles[base_candles['time'] >= last_time + seconds])
+        self.last_base_time = base_candles['time'][-1]
+
+    # Function to fold new base candles into a timeframe
+    def fold(self, timeframe, base_candles):
+        """
+        Function to fold new base candles into a timeframe. Completed candles are appended to the timeframe cache and
+        base candles of the candle still forming are held back
+        :param timeframe: string of the timeframe
+        :param base_candles: structured array of base candles newer than those already folded, oldest first
+        :return: None
+        """
+        candles = numpy.concatenate((self.pending[timeframe], base_candles))
+        if len(candles) == 0:
+            return
+        seconds = self.timeframe_seconds[timeframe]
+        aggregated = aggregate_candles(candles=candles, seconds=seconds)
+        # A candle is complete once the base candle covering its last interval has closed
+        complete = aggregated['time'] + seconds <= candles['time'][-1] + self.base_seconds
+        cache = self.caches[timeframe]
+        last_time = cache.last_time()
+        if last_time is None:
+            cache.replace(aggregated[complete])
+        else:
+            cache.append(aggregated[complete & (aggregated['time'] > last_time)])
+        if complete[-1]:
+            self.pending[timeframe] = candles[:0]
+        else:
+            self.pending[timeframe] = candles[candles['time'] >= aggregated['time'][-1]]
+
+    # Function to bring every timeframe up to date
+    def update(self):
+        """
+        Function to bring every timeframe up to date with a single request for new base candles. Timeframes are
+        reseeded if more base candles arrived than the base window holds
+        :return: Boolean. True if new base candles were folded in
+        """
+        base_candles = self.get_base_candles()
+        if len(base_candles) == 0:
+            return False
+        if self.last_base_time is None or base_candles['time'][0] > self.last_base_time:
+            self.seed(base_candles=base_candles)
+            return True
+        new_candles = base_candles[base_candles['time'] > self.last_base_time]
+        if len(new_candles) == 0:
+            return False
+        for timeframe in self.timeframe_seconds:
+            self.fold(timeframe=timeframe, base_candles=new_candles)
+        self.last_base_time = new_candles['time'][-1]
+        return True
+
+    # Function to get the candles of a timeframe
+    def get_candlesticks(self, timeframe, number_of_candles):
+        """
+        Function to get the most recent completed candles of a timeframe, in the same format as
+        mt5_lib.get_candlesticks. Call update first to bring the candles up to date
+        :param timeframe: string of the timeframe
+        :param number_of_candles: integer of the number of candles
+        :return: dataframe of the candlesticks
+        """
+        if timeframe == self.base_timeframe:
+            cache = mt5_lib.candle_cache.get((self.symbol, self.base_timeframe))
+        else:
+            cache = self.caches.get(timeframe)
+        if cache is None:
+            raise ValueError(f"{timeframe} is not aggregated for {self.symbol}. Call update first")
+        candles, human_time = cache.tail(number_of_candles)
+        dataframe = pandas.DataFrame(candles)
+        dataframe['human_time'] = human_time
+        return dataframe
+
+
+# Aggregators per symbol
+aggregators = {}
+
+
+# Function to get the aggregator of a symbol
+def get_aggregator(symbol, timeframes, number_of_candles):
+    """
+    Function to get the aggregator of a symbol, creating it the first time. An existing aggregator which does not
+    cover every timeframe requested, or keeps fewer candles, is replaced
+    :param symbol: string of the symbol
+    :param timeframes: list of timeframe strings
+    :param number_of_candles: integer of the number of candles kept for each timeframe
+    :return: TimeframeAggregator
+    """
+    aggregator = aggregators.get(symbol)
+    if aggregator is None or aggregator.number_of_candles < number_of_candles \
+            or any(timeframe not in aggregator.timeframe_seconds and timeframe != aggregator.base_timeframe
+                   for timeframe in timeframes):
+        aggregator = TimeframeAggregator(symbol=symbol, timeframes=timeframes, number_of_candles=number_of_candles)
+        aggregators[symbol] = aggregator
+    return aggregator
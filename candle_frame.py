@@ -0,0 +1,91 @@
+import numpy
+import pandas
+
+
+# Class to hold candles and indicators in preallocated columns
+class CandleFrame:
+    """
+    Columnar container of candles and indicator values. Every column is a numpy array allocated once at a fixed
+    capacity and reused on each load, so a long running strategy writes its candles and indicators in place every cycle
+    instead of building and copying dataframes. Columns are accessed by name and only cover the rows loaded. A dataframe
+    is only built when asked for with to_dataframe
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: integer of the number of rows each column can hold
+        """
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.size]
+
+    # Function to get a column, allocating it the first time
+    def column(self, name, dtype=numpy.float64):
+        """
+        Function to get a column to write into, allocating it at full capacity the first time it is used. Values left
+        from a previous load are not cleared
+        :param name: string of the column name
+        :param dtype: numpy dtype of the column. Defaults to float64. Only used when the column is allocated
+        :return: numpy array of the column (a view covering the rows loaded)
+        """
+        if name not in self.columns:
+            self.columns[name] = numpy.empty(self.capacity, dtype=dtype)
+        return self.columns[name][:self.size]
+
+    # Function to load candles into the frame
+    def load(self, candles):
+        """
+        Function to load candles into the frame, replacing the rows held. Columns keep their buffers, and are only
+        reallocated if there are more candles than the capacity
+        :param candles: structured array of candles as returned by MT5, or dictionary of field name -> array
+        :return: CandleFrame
+        """
+        names = candles.dtype.names if hasattr(candles, 'dtype') else list(candles)
+        size = len(candles[names[0]]) if names else 0
+        if size > self.capacity:
+            # Grow every column once
+            self.capacity = size
+            self.columns = {name: numpy.empty(size, dtype=values.dtype) for name, values in self.columns.items()}
+        self.size = size
+        for name in names:
+            self.column(name, dtype=candles[name].dtype)[:] = candles[name]
+        return self
+
+    # Function to get a single row
+    def record(self, index):
+        """
+        Function to get a single row as a dictionary of python values
+        :param index: integer of the row. Negative values count from the most recent row
+        :return: dictionary of column name -> value, with the row number under 'index'
+        """
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(f"Row {index} is out of range")
+        record = {name: values[index].item() for name, values in self.columns.items()}
+        record['index'] = index
+        return record
+
+    # Function to convert the frame to a dataframe
+    def to_dataframe(self, columns=None):
+        """
+        Function to convert the frame to a dataframe, in the same format as mt5_lib.get_candlesticks (with a
+        human_time column). The dataframe holds a copy of the values
+        :param columns: list of column names. Defaults to None (every column)
+        :return: dataframe
+        """
+        if columns is None:
+            columns = list(self.columns)
+        dataframe = pandas.DataFrame({name: self[name].copy() for name in columns})
+        if 'time' in self.columns:
+            dataframe['human_time'] = pandas.to_datetime(dataframe['time'], unit='s')
+        return dataframe
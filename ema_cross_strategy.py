@@ -1,21 +1,37 @@
-import os.path
 import warnings
 
+import numpy as np
+
+import history_store
 import indicator_lib
+import metrics
 import mt5_lib
+from artifact_writer import artifact_writer
+from candle_frame import CandleFrame
 from make_trade import make_trade
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
+# Incremental indicator state per (symbol, timeframe, ema_one, ema_two), used in streaming mode
+streaming_states = {}
+
+# Reusable candle frames per (symbol, timeframe, ema_one, ema_two), and per (symbol, timeframe) for the shared indicator
+# graph of strategy_lib
+candle_frames = {}
+
+
 # Main EMA Cross Strategy Function
-def ema_cross_strategy(symbol, timeframe, number_of_candles, ema_one, ema_two, balance, amount_to_risk, comment):
+def ema_cross_strategy(symbol, timeframe, number_of_candles, ema_one, ema_two, balance, amount_to_risk, comment,
+                       streaming=False):
     """
     Main EMA Cross Strategy Function
     :param symbol:
     :param timeframe:
     :param ema_one:
     :param ema_two:
+    :param streaming: Boolean. Defaults to False. When True, number_of_candles is only fetched to seed the indicators
+    and every later call updates them with the newest candle only
     :return:
     """
     # Retreive data -> get_data()
@@ -27,36 +43,52 @@ def ema_cross_strategy(symbol, timeframe, number_of_candles, ema_one, ema_two, b
         print("We cannot have EMA_ONE equal to EMA_TWO")
         return None
 
-    # Step 1: Retrieve data
-    data = get_data(
-        symbol=symbol,
-        timeframe=timeframe,
-        number_of_candles=number_of_candles
-    )
-    # Step 2: Pass data to calculate indicators
-    data = calc_indicators(
-        dataframe=data,
-        ema_one=ema_one,
-        ema_two=ema_two
-    )
-    # Step 3: Calculate trade events
-    data = det_trade(
-        dataframe=data,
-        ema_one=ema_one,
-        ema_two=ema_two
-    )
-    # Step 4: check the last line of data frame
-    trade_event = data.tail(1).copy().to_dict('records')[0]
+    if streaming:
+        # Steps 1 - 3 on the incremental indicator state
+        data = None
+        trade_event = get_streaming_trade_event(
+            symbol=symbol,
+            timeframe=timeframe,
+            number_of_candles=number_of_candles,
+            ema_one=ema_one,
+            ema_two=ema_two
+        )
+    else:
+        # Step 1: Retrieve data into the reusable candle frame
+        frame = get_frame(
+            symbol=symbol,
+            timeframe=timeframe,
+            number_of_candles=number_of_candles,
+            key=(symbol, timeframe, ema_one, ema_two)
+        )
+        # Step 2: Calculate indicators in place
+        with metrics.timed("calc_indicators", symbol):
+            frame = calc_frame_indicators(
+                frame=frame,
+                ema_one=ema_one,
+                ema_two=ema_two
+            )
+        # Step 3: Calculate trade events in place
+        with metrics.timed("det_trade", symbol):
+            frame = det_frame_trade(
+                frame=frame,
+                ema_one=ema_one,
+                ema_two=ema_two
+            )
+        # Step 4: check the last line of the frame
+        if len(frame) == 0:
+            print(f"No candles for {symbol}")
+            return False
+        trade_event = frame.record(-1)
+        # Kept for the snapshot written if a signal is found
+        data = frame
     take_profit = trade_event['take_profit']
     stop_loss = trade_event['stop_loss']
     stop_price = trade_event['stop_price']
     trade_outcome = False
     if trade_event['ema_cross']:
-        print()
-        print(data.tail(3))
-        data.to_csv(os.path.join("data", f'{symbol}-{comment}.csv'))
+        # Send the order first, reporting and persistence come afterwards
         if take_profit > 0 and stop_loss > 0 and stop_price > 0:
-            print(f"{comment}: Signal found :-)")
             trade_outcome = make_trade(
                 balance=balance,
                 comment=comment,
@@ -66,10 +98,70 @@ def ema_cross_strategy(symbol, timeframe, number_of_candles, ema_one, ema_two, b
                 stop_loss=stop_loss,
                 stop_price=stop_price,
             )
+        print()
+        print(trade_event)
+        if take_profit > 0 and stop_loss > 0 and stop_price > 0:
+            print(f"{comment}: Signal found :-)")
+        if data is not None:
+            # Hand a copy of the frame to the background writer, as the frame is reused next cycle
+            columns = {name: data[name].copy() for name in data.columns}
+        else:
+            # Streaming keeps no frame, so the snapshot is the row produced by the incremental state
+            columns = make_event_snapshot(trade_event=trade_event)
+        artifact_writer.submit(name=f"{symbol}-{comment}", columns=columns)
 
     return trade_outcome
 
 
+# Function to turn a trade event into a snapshot
+def make_event_snapshot(trade_event):
+    """
+    Function to turn the trade event of a single candle into a snapshot for the artifact writer, one row per column.
+    Only numeric and boolean values are kept (i.e. human_time is dropped), as snapshots are stored without pickling
+    :param trade_event: dictionary of the candle with indicators and trade values
+    :return: dictionary of column name -> numpy array of one value
+    """
+    return {
+        name: np.array([value]) for name, value in trade_event.items()
+        if isinstance(value, (bool, int, float, np.number, np.bool_))
+    }
+
+
+# Function to determine the trade event for the newest candle from the incremental indicator state
+def get_streaming_trade_event(symbol, timeframe, number_of_candles, ema_one, ema_two, candles=None):
+    """
+    Function to update the incremental indicator state for a symbol and determine the trade event of the newest
+    candle. The state is seeded from number_of_candles on first use, and re-seeded if a candle was missed
+    :param symbol: string of the symbol to be retrieved
+    :param timeframe: string of the timeframe to be queried
+    :param number_of_candles: integer of the number of candles used to seed the state
+    :param ema_one: integer of EMA size
+    :param ema_two: integer of EMA size
+    :param candles: list of the two most recent candles as dictionaries, when already retrieved. Defaults to None
+    (retrieved here)
+    :return: dictionary of the newest candle with indicators and trade values
+    """
+    key = (symbol, timeframe, ema_one, ema_two)
+    state = streaming_states.get(key)
+    in_sync = False
+    if state is not None:
+        # Retrieve the two most recent candles, the first one is used to detect gaps
+        if candles is None:
+            candles = get_data(symbol=symbol, timeframe=timeframe, number_of_candles=2).to_dict('records')
+        if len(candles) == 2:
+            with metrics.timed("calc_indicators", symbol):
+                in_sync = state.update(candle=candles[1], previous_time=candles[0]['time'])
+    if not in_sync:
+        # Seed (or re-seed) the state from history
+        state = indicator_lib.EmaCrossState(ema_one=ema_one, ema_two=ema_two)
+        data = get_data(symbol=symbol, timeframe=timeframe, number_of_candles=number_of_candles)
+        with metrics.timed("calc_indicators", symbol):
+            state.seed(dataframe=data)
+        streaming_states[key] = state
+    with metrics.timed("det_trade", symbol):
+        return det_trade_event(latest=state.latest, previous=state.previous, ema_one=ema_one, ema_two=ema_two)
+
+
 # Function to retrieve data for strategy
 def get_data(symbol, timeframe, number_of_candles):
     """
@@ -80,12 +172,61 @@ def get_data(symbol, timeframe, number_of_candles):
     :return: dataframe
     """
     # Note, this function can be expanded to retrieve data from other exchanges also.
-    data = mt5_lib.get_candlesticks(symbol=symbol, timeframe=timeframe, number_of_candles=number_of_candles)
-    # No further computation for this function
+    try:
+        data = mt5_lib.get_candlesticks(symbol=symbol, timeframe=timeframe, number_of_candles=number_of_candles)
+    except Exception as e:
+        print(f"Error retrieving candles for {symbol} from MT5: {e}")
+        data = None
+    # If the terminal is unavailable, fall back to the history store
+    if data is None or data.empty:
+        data = history_store.read_candles(symbol=symbol, timeframe=timeframe, number_of_candles=number_of_candles)
     # Return dataframe
     return data
 
 
+# Function to retrieve data for strategy into a reusable candle frame
+def get_frame(symbol, timeframe, number_of_candles, key=None):
+    """
+    Function to retrieve candles from MT5 into a CandleFrame, falling back to the history store like get_data. The
+    frame stored under key is reused, so its columns are only allocated once
+    :param symbol: string of the symbol to be retrieved
+    :param timeframe: string of the timeframe to be queried
+    :param number_of_candles: integer of the number of candles
+    :param key: key of the reusable frame in candle_frames. Defaults to None (a new frame)
+    :return: CandleFrame
+    """
+    try:
+        candles = mt5_lib.get_candle_array(symbol=symbol, timeframe=timeframe, number_of_candles=number_of_candles)
+    except Exception as e:
+        print(f"Error retrieving candles for {symbol} from MT5: {e}")
+        candles = None
+    # If the terminal is unavailable, fall back to the history store
+    if candles is None or len(candles) == 0:
+        columns = history_store.open_history(symbol=symbol, timeframe=timeframe)
+        candles = {name: values[-number_of_candles:] for name, values in columns.items()}
+    frame = candle_frames.get(key) if key is not None else None
+    if frame is None:
+        frame = CandleFrame(capacity=number_of_candles)
+        if key is not None:
+            candle_frames[key] = frame
+    return frame.load(candles)
+
+
+# Function to calculate indicators into a candle frame
+def calc_frame_indicators(frame, ema_one, ema_two):
+    """
+    Function to calculate the indicators for a strategy into the columns of a CandleFrame. Same values as
+    calc_indicators
+    :param frame: CandleFrame of the raw data
+    :param ema_one: integer for the first ema
+    :param ema_two: integer for the second ema
+    :return: CandleFrame with updated columns
+    """
+    frame = indicator_lib.calc_frame_emas(frame=frame, ema_sizes=[ema_one, ema_two])
+    frame = indicator_lib.calc_frame_ema_cross(frame=frame, ema_one=ema_one, ema_two=ema_two)
+    return frame
+
+
 # Function to calculate indicators
 def calc_indicators(dataframe, ema_one, ema_two):
     """
@@ -95,15 +236,10 @@ def calc_indicators(dataframe, ema_one, ema_two):
     :param ema_two: integer for the second ema
     :return: dataframe with updated columns
     """
-    # Pass the dataframe to calculate ema_one
-    data = indicator_lib.calc_ema(
+    # Pass the dataframe to calculate ema_one and ema_two in a single pass
+    data = indicator_lib.calc_emas(
         dataframe=dataframe,
-        ema_size=ema_one
-    )
-    # Pass the dataframe to calculate ema_two
-    data = indicator_lib.calc_ema(
-        dataframe=dataframe,
-        ema_size=ema_two
+        ema_sizes=[ema_one, ema_two]
     )
     # Pass the dataframe with both EMA's to the ema_cross calculator
     data = indicator_lib.calc_ema_cross(
@@ -116,7 +252,7 @@ def calc_indicators(dataframe, ema_one, ema_two):
 
 
 # Function to calculate trade values
-def det_trade(dataframe, ema_one, ema_two):
+def det_trade(dataframe, ema_one, ema_two, vectorized=True):
     """
     Function to calculate the trade values for the strategy. For the EMA Cross strategy, rules are as follows:
     1. For each trade, stop_loss is the corresponding highest EMA (i.e. if ema_one is 50 and ema_two is 200, stop_loss
@@ -128,6 +264,7 @@ def det_trade(dataframe, ema_one, ema_two):
     :param dataframe: dataframe of data with indicators
     :param ema_one: integer of EMA size
     :param ema_two: integer of EMA size
+    :param vectorized: Boolean. Defaults to True. When False, uses the row by row loop
     :return: dataframe with trade values added
     """
     # Get the EMA column names
@@ -143,6 +280,101 @@ def det_trade(dataframe, ema_one, ema_two):
     else:
         raise ValueError("EMA values are the same!")
 
+    if vectorized:
+        return det_trade_vectorized(dataframe=dataframe, ema_column=ema_column, min_value=min_value)
+    return det_trade_loop(dataframe=dataframe, ema_column=ema_column, min_value=min_value)
+
+
+# Function to calculate trade values with shifted columns and masks
+def det_trade_vectorized(dataframe, ema_column, min_value):
+    """
+    Function to calculate the trade values in one vectorized step. Values from the previous completed candle are
+    taken from shifted columns and only written on EMA cross rows past the EMA calculations. The dataframe is updated
+    in place, no copy is made
+    :param dataframe: dataframe of data with indicators
+    :param ema_column: string of the column name of the largest EMA
+    :param min_value: integer of the largest EMA size. Rows up to this index are skipped
+    :return: dataframe with trade values added
+    """
+    # Get the previous completed candle for every row
+    previous_open = dataframe['open'].shift(1).to_numpy()
+    previous_close = dataframe['close'].shift(1).to_numpy()
+    previous_high = dataframe['high'].shift(1).to_numpy()
+    previous_low = dataframe['low'].shift(1).to_numpy()
+    previous_ema = dataframe[ema_column].shift(1).to_numpy()
+    # Find when an EMA cross is True, skipping rows until past EMA calculations
+    cross = dataframe['ema_cross'].to_numpy(dtype=bool) & (dataframe.index.to_numpy() > min_value)
+    # Determine GREEN candles. Anything else is RED
+    green = previous_open < previous_close
+    # stop_loss = column of largest EMA
+    stop_loss = previous_ema
+    # stop_price (Entry Price) = high of the most recent complete candle if GREEN, low if RED
+    stop_price = np.where(green, previous_high, previous_low)
+    # take_profit = distance between stop_price and stop_loss, added to a BUY and subtracted from a SELL
+    take_profit = np.where(
+        green,
+        stop_price + (stop_price - stop_loss),
+        stop_price - (stop_loss - stop_price)
+    )
+    # Add the calculated values to the dataframe, 0.00 when no cross
+    dataframe['take_profit'] = np.where(cross, take_profit, 0.00)
+    dataframe['stop_price'] = np.where(cross, stop_price, 0.00)
+    dataframe['stop_loss'] = np.where(cross, stop_loss, 0.00)
+    # Return the completed dataframe
+    return dataframe
+
+
+# Function to calculate trade values into a candle frame
+def det_frame_trade(frame, ema_one, ema_two):
+    """
+    Function to calculate the trade values into the columns of a CandleFrame, following the same rules as det_trade.
+    Only the EMA cross rows are computed, every other row is 0.00
+    :param frame: CandleFrame of data with indicators
+    :param ema_one: integer of EMA size
+    :param ema_two: integer of EMA size
+    :return: CandleFrame with trade values added
+    """
+    if ema_one == ema_two:
+        raise ValueError("EMA values are the same!")
+    min_value = max(ema_one, ema_two)
+    ema_values = frame["ema_" + str(min_value)]
+    take_profit = frame.column('take_profit')
+    stop_price = frame.column('stop_price')
+    stop_loss = frame.column('stop_loss')
+    take_profit[:] = 0.00
+    stop_price[:] = 0.00
+    stop_loss[:] = 0.00
+    # Find when an EMA cross is True, skipping rows until past EMA calculations
+    rows = np.flatnonzero(frame['ema_cross'][min_value + 1:]) + min_value + 1
+    if len(rows) == 0:
+        return frame
+    previous = rows - 1
+    # Determine GREEN candles. Anything else is RED
+    green = frame['open'][previous] < frame['close'][previous]
+    # stop_loss = largest EMA of the previous candle
+    stop_loss[rows] = ema_values[previous]
+    # stop_price (Entry Price) = high of the most recent complete candle if GREEN, low if RED
+    stop_price[rows] = np.where(green, frame['high'][previous], frame['low'][previous])
+    # take_profit = distance between stop_price and stop_loss, added to a BUY and subtracted from a SELL
+    take_profit[rows] = np.where(
+        green,
+        stop_price[rows] + (stop_price[rows] - stop_loss[rows]),
+        stop_price[rows] - (stop_loss[rows] - stop_price[rows])
+    )
+    return frame
+
+
+# Function to calculate trade values by iterating through the dataframe
+def det_trade_loop(dataframe, ema_column, min_value):
+    """
+    Function to calculate the trade values by iterating through a copy of the dataframe row by row. This is the
+    original implementation, kept as the reference for det_trade_vectorized. As calc_ema_cross drops the first row, the
+    loop never reaches the last candle
+    :param dataframe: dataframe of data with indicators
+    :param ema_column: string of the column name of the largest EMA
+    :param min_value: integer of the largest EMA size. Rows up to this index are skipped
+    :return: dataframe with trade values added
+    """
     # Add take_profit, stop_loss, stop_price columns to dataframe
     dataframe['take_profit'] = 0.00
     dataframe['stop_price'] = 0.00
@@ -185,3 +417,48 @@ def det_trade(dataframe, ema_one, ema_two):
                 dataframe_copy.loc[i, 'take_profit'] = take_profit
     # Return the completed dataframe
     return dataframe_copy
+
+
+# Function to calculate the trade values of a single candle
+def det_trade_event(latest, previous, ema_one, ema_two):
+    """
+    Function to calculate the trade values for a single candle, following the same rules as det_trade
+    :param latest: dictionary of the candle with indicators
+    :param previous: dictionary of the previous completed candle with indicators
+    :param ema_one: integer of EMA size
+    :param ema_two: integer of EMA size
+    :return: dictionary of the candle with trade values added
+    """
+    # Choose largest EMA to work with
+    if ema_one == ema_two:
+        raise ValueError("EMA values are the same!")
+    min_value = max(ema_one, ema_two)
+    ema_column = "ema_" + str(min_value)
+    # Nothing to trade if the state has not been seeded
+    if latest is None or previous is None:
+        return {'ema_cross': False, 'take_profit': 0.00, 'stop_price': 0.00, 'stop_loss': 0.00}
+    trade_event = dict(latest)
+    trade_event['take_profit'] = 0.00
+    trade_event['stop_price'] = 0.00
+    trade_event['stop_loss'] = 0.00
+    # Skip candles until past EMA calculations
+    if latest['index'] <= min_value or not latest['ema_cross']:
+        return trade_event
+    # stop_loss = column of largest EMA
+    stop_loss = previous[ema_column]
+    # Determine if a GREEN candle
+    if previous['open'] < previous['close']:
+        # stop_price (Entry Price) = high of most recent complete candle
+        stop_price = previous['high']
+        distance = stop_price - stop_loss
+        take_profit = stop_price + distance
+    # If the candle is not GREEN then it is RED
+    else:
+        # stop_price (Entry Price) = low of most recent complete candle
+        stop_price = previous['low']
+        distance = stop_loss - stop_price
+        take_profit = stop_price - distance
+    trade_event['stop_loss'] = stop_loss
+    trade_event['stop_price'] = stop_price
+    trade_event['take_profit'] = take_profit
+    return trade_event
@@ -0,0 +1,610 @@
+import collections
+import datetime
+import sys
+import time
+import zlib
+
+import numpy
+
+# Timeframe constants, same values as the MetaTrader5 package
+TIMEFRAME_M1 = 1
+TIMEFRAME_M2 = 2
+TIMEFRAME_M3 = 3
+TIMEFRAME_M4 = 4
+TIMEFRAME_M5 = 5
+TIMEFRAME_M6 = 6
+TIMEFRAME_M10 = 10
+TIMEFRAME_M12 = 12
+TIMEFRAME_M15 = 15
+TIMEFRAME_M20 = 20
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H2 = 16386
+TIMEFRAME_H3 = 16387
+TIMEFRAME_H4 = 16388
+TIMEFRAME_H6 = 16390
+TIMEFRAME_H8 = 16392
+TIMEFRAME_H12 = 16396
+TIMEFRAME_D1 = 16408
+TIMEFRAME_W1 = 32769
+TIMEFRAME_MN1 = 49153
+
+# Order, action, filling and time constants
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TYPE_BUY_LIMIT = 2
+ORDER_TYPE_SELL_LIMIT = 3
+ORDER_TYPE_BUY_STOP = 4
+ORDER_TYPE_SELL_STOP = 5
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+TRADE_ACTION_REMOVE = 8
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+ORDER_TIME_GTC = 0
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+SYMBOL_CALC_MODE_FOREX = 0
+SYMBOL_CALC_MODE_FUTURES = 1
+SYMBOL_CALC_MODE_CFD = 2
+SYMBOL_CALC_MODE_FOREX_NO_LEVERAGE = 5
+
+# Tick constants
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+TICK_FLAG_BID = 2
+TICK_FLAG_ASK = 4
+
+# Return codes
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_TIMEOUT = 10012
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_CLIENT_DISABLES_AT = 10027
+
+# Length of each timeframe in seconds. Weekly and monthly are approximated with a fixed length
+TIMEFRAME_SECONDS = {
+    TIMEFRAME_M1: 60, TIMEFRAME_M2: 120, TIMEFRAME_M3: 180, TIMEFRAME_M4: 240, TIMEFRAME_M5: 300, TIMEFRAME_M6: 360,
+    TIMEFRAME_M10: 600, TIMEFRAME_M12: 720, TIMEFRAME_M15: 900, TIMEFRAME_M20: 1200, TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600, TIMEFRAME_H2: 7200, TIMEFRAME_H3: 10800, TIMEFRAME_H4: 14400, TIMEFRAME_H6: 21600,
+    TIMEFRAME_H8: 28800, TIMEFRAME_H12: 43200, TIMEFRAME_D1: 86400, TIMEFRAME_W1: 7 * 86400,
+    TIMEFRAME_MN1: 30 * 86400
+}
+
+# Same dtype as the structured arrays returned by copy_rates_from_pos
+RATES_DTYPE = numpy.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('tick_volume', '<u8'),
+    ('spread', '<i4'), ('real_volume', '<u8')
+])
+
+# Same dtype as the structured arrays returned by copy_ticks_from
+TICKS_DTYPE = numpy.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'), ('time_msc', '<i8'),
+    ('flags', '<u4'), ('volume_real', '<f8')
+])
+
+# Records returned by the fake terminal, with the fields the repo reads
+SymbolInfo = collections.namedtuple('SymbolInfo', [
+    'name', 'currency_base', 'currency_profit', 'currency_margin', 'trade_tick_size', 'trade_tick_value',
+    'trade_contract_size', 'point', 'digits', 'volume_min', 'volume_max', 'volume_step', 'trade_stops_level',
+    'trade_calc_mode', 'visible', 'bid', 'ask'
+])
+Tick = collections.namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc', 'flags', 'volume_real'])
+AccountInfo = collections.namedtuple('AccountInfo', [
+    'login', 'balance', 'equity', 'margin', 'margin_free', 'leverage', 'currency', 'server'
+])
+TradeOrder = collections.namedtuple('TradeOrder', [
+    'ticket', 'time_setup', 'type', 'magic', 'volume_initial', 'volume_current', 'price_open', 'sl', 'tp',
+    'price_current', 'symbol', 'comment'
+])
+TradePosition = collections.namedtuple('TradePosition', [
+    'ticket', 'time', 'type', 'magic', 'volume', 'price_open', 'sl', 'tp', 'price_current', 'profit', 'symbol',
+    'comment'
+])
+OrderCheckResult = collections.namedtuple('OrderCheckResult', [
+    'retcode', 'balance', 'equity', 'profit', 'margin', 'margin_free', 'margin_level', 'comment', 'request'
+])
+OrderSendResult = collections.namedtuple('OrderSendResult', [
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask', 'comment', 'request_id', 'retcode_external',
+    'request'
+])
+
+# Symbols known to every fake terminal: (currency_base, currency_profit, price, digits, contract size)
+DEFAULT_SYMBOLS = {
+    'EURUSD': ('EUR', 'USD', 1.08, 5, 100000.0),
+    'GBPUSD': ('GBP', 'USD', 1.27, 5, 100000.0),
+    'AUDUSD': ('AUD', 'USD', 0.66, 5, 100000.0),
+    'USDJPY': ('USD', 'JPY', 150.0, 3, 100000.0),
+    'USDCAD': ('USD', 'CAD', 1.36, 5, 100000.0),
+    'USDCHF': ('USD', 'CHF', 0.90, 5, 100000.0),
+    'XAUUSD': ('XAU', 'USD', 2300.0, 2, 100.0)
+}
+# Number of candles generated together. Prices are a random walk bridged between deterministic anchors at the end of
+# each block, so any candle can be generated without generating the history before it
+BLOCK_SIZE = 4096
+# Ticks generated in each M1 candle, evenly spaced. Bids run from the open to the low and high (high first on a bearish
+# candle) and on to the close, so M1 bars built from the ticks match the M1 candles
+TICKS_PER_CANDLE = 12
+# Position of the open, first extreme, second extreme and close among the ticks of a candle
+TICK_PATH = (0, 3, 7, 11)
+# 2024-01-01 00:00 server time
+DEFAULT_START_TIME = 1704067200
+
+
+# Class for a deterministic fake MetaTrader 5 terminal
+class FakeTerminal:
+    """
+    Deterministic fake MetaTrader 5 terminal. Candles are synthetic but always identical for the same seed, symbol,
+    timeframe and time. The clock only moves when advance is called, so a run can be replayed exactly. Pending orders
+    are held in memory, and each API call can be given a latency to mimic the terminal round trip
+    """
+
+    def __init__(self, symbols=None, seed=0, start_time=DEFAULT_START_TIME, balance=100000.0, currency="USD",
+                 latency=0.0):
+        """
+        :param symbols: list of symbol names. Defaults to None (DEFAULT_SYMBOLS). Names not in DEFAULT_SYMBOLS are
+        created as 5 digit USD quoted symbols
+        :param seed: integer of the price seed
+        :param start_time: integer of the server time in seconds
+        :param balance: float of the account balance
+        :param currency: string of the account currency
+        :param latency: float of seconds every API call sleeps for. See set_latency
+        """
+        self.seed = seed
+        self.time = start_time
+        self.balance = balance
+        self.currency = currency
+        self.latency = {}
+        self.default_latency = latency
+        self.symbols = {}
+        for symbol in symbols if symbols is not None else DEFAULT_SYMBOLS:
+            self.add_symbol(symbol)
+        self.orders = {}
+        self.positions = {}
+        self.next_ticket = 1
+        self.forced_retcodes = collections.deque()
+        self.lost_replies = 0
+        self.calls = collections.Counter()
+        self.blocks = collections.OrderedDict()
+
+    # Function to add a symbol
+    def add_symbol(self, name, currency_base=None, currency_profit="USD", price=1.0, digits=5, contract_size=100000.0,
+                   calc_mode=SYMBOL_CALC_MODE_FOREX):
+        """
+        Function to add a symbol to the terminal
+        :param name: string of the symbol
+        :return: SymbolInfo without a quote
+        """
+        if name in DEFAULT_SYMBOLS:
+            currency_base, currency_profit, price, digits, contract_size = DEFAULT_SYMBOLS[name]
+        tick_size = 10.0 ** -digits
+        self.symbols[name] = SymbolInfo(
+            name=name, currency_base=currency_base or name[:3], currency_profit=currency_profit,
+            currency_margin=currency_base or name[:3], trade_tick_size=tick_size,
+            trade_tick_value=tick_size * contract_size, trade_contract_size=contract_size, point=tick_size,
+            digits=digits, volume_min=0.01, volume_max=100.0, volume_step=0.01, trade_stops_level=0,
+            trade_calc_mode=calc_mode, visible=True, bid=price, ask=price
+        )
+        return self.symbols[name]
+
+    # Function to set the latency of API calls
+    def set_latency(self, seconds, functions=None):
+        """
+        Function to set how long API calls sleep for
+        :param seconds: float of seconds
+        :param functions: list of API function names (i.e. copy_rates_from_pos). Defaults to None (every call)
+        :return: None
+        """
+        if functions is None:
+            self.default_latency = seconds
+            self.latency.clear()
+        else:
+            for function in functions:
+                self.latency[function] = seconds
+
+    # Function to wait for the latency of an API call and count it
+    def call(self, function):
+        self.calls[function] += 1
+        seconds = self.latency.get(function, self.default_latency)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    # Function to open a position
+    def add_position(self, symbol, volume, position_type=POSITION_TYPE_BUY, price=None, comment=""):
+        """
+        Function to open a position directly, for example to test exposure limits. Pending orders are never filled
+        :param price: float of the open price. Defaults to None (the current quote)
+        :return: integer of the position ticket
+        """
+        if price is None:
+            bid, ask = self.get_quote(symbol)
+            price = ask if position_type == POSITION_TYPE_BUY else bid
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        self.positions[ticket] = TradePosition(
+            ticket=ticket, time=self.time, type=position_type, magic=0, volume=volume, price_open=price, sl=0.0,
+            tp=0.0, price_current=price, profit=0.0, symbol=symbol, comment=comment
+        )
+        return ticket
+
+    # Function to move the clock forward
+    def advance(self, seconds=60):
+        """
+        Function to move the server clock forward
+        :param seconds: integer of seconds. Defaults to one M1 candle
+        :return: integer of the new server time
+        """
+        self.time += seconds
+        return self.time
+
+    # Function to make the next trade requests return a given code
+    def force_retcodes(self, *retcodes):
+        """
+        Function to make the next order_check / order_send calls return the given codes, one per call, for example to
+        mimic a requote
+        :param retcodes: integers of return codes
+        :return: None
+        """
+        self.forced_retcodes.extend(retcodes)
+
+    # Function to lose the replies of the next trade requests
+    def lose_replies(self, count=1):
+        """
+        Function to make the next order_send calls carry out the request but return None, as when the reply from the
+        server is lost
+        :param count: integer of the number of replies lost
+        :return: None
+        """
+        self.lost_replies += count
+
+    # Function to get a block of prices
+    def get_block(self, symbol, timeframe, block):
+        """
+        Function to get the close prices of a block of candles, with the close before the block first
+        :return: numpy array of BLOCK_SIZE + 1 closes
+        """
+        key = (symbol, timeframe, block)
+        closes = self.blocks.get(key)
+        if closes is not None:
+            self.blocks.move_to_end(key)
+            return closes
+        price = self.symbols[symbol].bid
+        seconds = TIMEFRAME_SECONDS[timeframe]
+        salt = zlib.crc32(symbol.encode())
+        # Anchors follow a slow deterministic wave, the walk between them is seeded per block
+        phase = salt % 628 / 100
+        start = price * (1 + 0.05 * numpy.sin(block * 0.37 + phase))
+        end = price * (1 + 0.05 * numpy.sin((block + 1) * 0.37 + phase))
+        rng = numpy.random.default_rng([self.seed, salt, timeframe, block + (1 << 32)])
+        volatility = price * 0.0002 * numpy.sqrt(seconds / 60)
+        walk = numpy.concatenate(([0.0], numpy.cumsum(rng.normal(0, volatility, BLOCK_SIZE))))
+        # Bridge the walk so it ends on the next anchor
+        closes = start + walk - numpy.linspace(0, 1, BLOCK_SIZE + 1) * (walk[-1] - (end - start))
+        closes = numpy.round(closes, self.symbols[symbol].digits)
+        self.blocks[key] = closes
+        if len(self.blocks) > 256:
+            self.blocks.popitem(last=False)
+        return closes
+
+    # Function to generate candles
+    def get_rates(self, symbol, timeframe, first, last):
+        """
+        Function to generate the candles with index first to last (inclusive). Index i starts at i * timeframe length
+        :return: structured array of candles
+        """
+        count = max(last - first + 1, 0)
+        rates = numpy.zeros(count, dtype=RATES_DTYPE)
+        if count == 0:
+            return rates
+        indexes = numpy.arange(first, last + 1)
+        opens = numpy.empty(count)
+        closes = numpy.empty(count)
+        for block in range(first // BLOCK_SIZE, last // BLOCK_SIZE + 1):
+            block_closes = self.get_block(symbol, timeframe, block)
+            mask = indexes // BLOCK_SIZE == block
+            offsets = indexes[mask] - block * BLOCK_SIZE
+            opens[mask] = block_closes[offsets]
+            closes[mask] = block_closes[offsets + 1]
+        digits = self.symbols[symbol].digits
+        # Wicks are a deterministic fraction of the candle body plus one tick
+        wick = numpy.abs(closes - opens) * ((indexes * 7919) % 10 / 20) + 10.0 ** -digits
+        rates['time'] = indexes * TIMEFRAME_SECONDS[timeframe]
+        rates['open'] = opens
+        rates['close'] = closes
+        rates['high'] = numpy.round(numpy.maximum(opens, closes) + wick, digits)
+        rates['low'] = numpy.round(numpy.minimum(opens, closes) - wick, digits)
+        rates['tick_volume'] = (indexes * 2654435761) % 1000 + 1
+        rates['spread'] = (indexes * 40503) % 10 + 1
+        return rates
+
+    # Function to generate ticks
+    def get_ticks(self, symbol, from_msc, to_msc, count=None):
+        """
+        Function to generate the ticks from from_msc to to_msc (inclusive, in milliseconds), up to the current server
+        time, from the M1 candles they fall in
+        :param count: integer of the most ticks returned. Defaults to None (all)
+        :return: structured array of ticks
+        """
+        to_msc = min(to_msc, self.time * 1000)
+        if to_msc < from_msc:
+            return numpy.zeros(0, dtype=TICKS_DTYPE)
+        first = max(from_msc, 0) // 60000
+        last = to_msc // 60000
+        if count is not None:
+            last = min(last, first + count // TICKS_PER_CANDLE + 1)
+        rates = self.get_rates(symbol, TIMEFRAME_M1, first, last)
+        bullish = rates['close'] >= rates['open']
+        anchors = numpy.stack([
+            rates['open'],
+            numpy.where(bullish, rates['low'], rates['high']),
+            numpy.where(bullish, rates['high'], rates['low']),
+            rates['close']
+        ], axis=1)
+        # Interpolate each tick between the anchors either side of it
+        steps = numpy.arange(TICKS_PER_CANDLE)
+        path = numpy.array(TICK_PATH)
+        segment = numpy.clip(numpy.searchsorted(path, steps, side='right') - 1, 0, len(path) - 2)
+        fraction = (steps - path[segment]) / (path[segment + 1] - path[segment])
+        bids = anchors[:, segment] + (anchors[:, segment + 1] - anchors[:, segment]) * fraction
+        info = self.symbols[symbol]
+        ticks = numpy.zeros(bids.size, dtype=TICKS_DTYPE)
+        ticks['time_msc'] = (rates['time'][:, None] * 1000 + steps * (60000 // TICKS_PER_CANDLE)).ravel()
+        ticks['time'] = ticks['time_msc'] // 1000
+        ticks['bid'] = numpy.round(bids.ravel(), info.digits)
+        ticks['ask'] = numpy.round(ticks['bid'] + numpy.repeat(rates['spread'], TICKS_PER_CANDLE) * info.point,
+                                   info.digits)
+        ticks['flags'] = TICK_FLAG_BID | TICK_FLAG_ASK
+        ticks = ticks[(ticks['time_msc'] >= from_msc) & (ticks['time_msc'] <= to_msc)]
+        return ticks if count is None else ticks[:count]
+
+    # Function to get the current quote of a symbol
+    def get_quote(self, symbol):
+        """
+        Function to get the bid and ask from the forming M1 candle
+        :return: tuple of (bid, ask)
+        """
+        index = self.time // 60
+        rates = self.get_rates(symbol, TIMEFRAME_M1, index, index)
+        info = self.symbols[symbol]
+        bid = float(rates['close'][0])
+        return bid, round(bid + int(rates['spread'][0]) * info.point, info.digits)
+
+
+# Terminal used by the module level API
+terminal = FakeTerminal()
+
+
+# Function to replace the MetaTrader5 module with this fake
+def install(fake_terminal=None):
+    """
+    Function to register this module as MetaTrader5, so modules imported afterwards use the fake terminal. Call it
+    before importing mt5_lib
+    :param fake_terminal: FakeTerminal. Defaults to None (a new terminal with the default symbols)
+    :return: FakeTerminal in use
+    """
+    global terminal
+    terminal = fake_terminal or FakeTerminal()
+    sys.modules['MetaTrader5'] = sys.modules[__name__]
+    return terminal
+
+
+def initialize(path=None, login=None, password=None, server=None, timeout=None, portable=False):
+    terminal.call('initialize')
+    return True
+
+
+def login(login, password=None, server=None, timeout=None):
+    terminal.call('login')
+    return True
+
+
+def shutdown():
+    terminal.call('shutdown')
+    return True
+
+
+def last_error():
+    return 1, 'Success'
+
+
+def version():
+    return 500, 4424, '1 Jan 2024'
+
+
+def account_info():
+    terminal.call('account_info')
+    return AccountInfo(login=1, balance=terminal.balance, equity=terminal.balance, margin=0.0,
+                       margin_free=terminal.balance, leverage=100, currency=terminal.currency, server="Fake-Server")
+
+
+def symbols_get(group=None):
+    terminal.call('symbols_get')
+    return tuple(symbol_info(name) for name in terminal.symbols)
+
+
+def symbol_info(symbol):
+    terminal.call('symbol_info')
+    info = terminal.symbols.get(symbol)
+    if info is None:
+        return None
+    bid, ask = terminal.get_quote(symbol)
+    return info._replace(bid=bid, ask=ask)
+
+
+def symbol_info_tick(symbol):
+    terminal.call('symbol_info_tick')
+    if symbol not in terminal.symbols:
+        return None
+    bid, ask = terminal.get_quote(symbol)
+    return Tick(time=terminal.time, bid=bid, ask=ask, last=0.0, volume=0, time_msc=terminal.time * 1000, flags=6,
+                volume_real=0.0)
+
+
+def symbol_select(symbol, enable=True):
+    terminal.call('symbol_select')
+    return symbol in terminal.symbols
+
+
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    terminal.call('copy_rates_from_pos')
+    if symbol not in terminal.symbols or timeframe not in TIMEFRAME_SECONDS:
+        return None
+    # Position 0 is the candle still forming at the current server time
+    last = terminal.time // TIMEFRAME_SECONDS[timeframe] - start_pos
+    return terminal.get_rates(symbol, timeframe, max(last - count + 1, 0), last)
+
+
+# Function to convert a date argument to seconds
+def to_seconds(date):
+    """
+    Function to convert a date argument of the API (datetime, naive ones taken as UTC, or seconds) to seconds
+    :return: integer of seconds
+    """
+    if isinstance(date, datetime.datetime):
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return int(date.timestamp())
+    return int(date)
+
+
+def copy_rates_from(symbol, timeframe, date_from, count):
+    terminal.call('copy_rates_from')
+    if symbol not in terminal.symbols or timeframe not in TIMEFRAME_SECONDS:
+        return None
+    # Candles opening at or before date_from, up to the candle forming at the current server time
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    last = min(to_seconds(date_from), terminal.time) // seconds
+    return terminal.get_rates(symbol, timeframe, max(last - count + 1, 0), last)
+
+
+def copy_rates_range(symbol, timeframe, date_from, date_to):
+    terminal.call('copy_rates_range')
+    if symbol not in terminal.symbols or timeframe not in TIMEFRAME_SECONDS:
+        return None
+    # Candles opening between date_from and date_to (inclusive), up to the candle forming at the current server time
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    first = -(-max(to_seconds(date_from), 0) // seconds)
+    last = min(to_seconds(date_to), terminal.time) // seconds
+    return terminal.get_rates(symbol, timeframe, first, last)
+
+
+def copy_ticks_from(symbol, date_from, count, flags):
+    terminal.call('copy_ticks_from')
+    if symbol not in terminal.symbols:
+        return None
+    return terminal.get_ticks(symbol, to_seconds(date_from) * 1000, terminal.time * 1000, count=count)
+
+
+def copy_ticks_range(symbol, date_from, date_to, flags):
+    terminal.call('copy_ticks_range')
+    if symbol not in terminal.symbols:
+        return None
+    return terminal.get_ticks(symbol, to_seconds(date_from) * 1000, to_seconds(date_to) * 1000)
+
+
+def orders_get(symbol=None, group=None, ticket=None):
+    terminal.call('orders_get')
+    orders = terminal.orders.values()
+    if ticket is not None:
+        return tuple(order for order in orders if order.ticket == ticket)
+    if symbol is not None:
+        return tuple(order for order in orders if order.symbol == symbol)
+    return tuple(orders)
+
+
+def positions_get(symbol=None, group=None, ticket=None):
+    terminal.call('positions_get')
+    positions = terminal.positions.values()
+    if ticket is not None:
+        return tuple(position for position in positions if position.ticket == ticket)
+    if symbol is not None:
+        return tuple(position for position in positions if position.symbol == symbol)
+    return tuple(positions)
+
+
+def positions_total():
+    terminal.call('positions_total')
+    return len(terminal.positions)
+
+
+def orders_total():
+    return len(terminal.orders)
+
+
+# Function to validate a trade request
+def check_request(request):
+    """
+    Function to validate a trade request the way the terminal does for the requests this repo sends
+    :return: integer of the return code. 0 if valid
+    """
+    if terminal.forced_retcodes:
+        return terminal.forced_retcodes.popleft()
+    if request.get('action') == TRADE_ACTION_REMOVE:
+        return 0 if request.get('order') in terminal.orders else TRADE_RETCODE_INVALID
+    info = terminal.symbols.get(request.get('symbol'))
+    if info is None:
+        return TRADE_RETCODE_INVALID
+    volume = request.get('volume', 0)
+    steps = round(volume / info.volume_step, 6)
+    if not info.volume_min <= volume <= info.volume_max or steps != int(steps):
+        return TRADE_RETCODE_INVALID_VOLUME
+    bid, ask = terminal.get_quote(info.name)
+    price = request.get('price', 0)
+    order_type = request.get('type')
+    if price <= 0 or (order_type == ORDER_TYPE_BUY_STOP and price <= ask) \
+            or (order_type == ORDER_TYPE_SELL_STOP and price >= bid):
+        return TRADE_RETCODE_INVALID_PRICE
+    stop_loss = request.get('sl', 0)
+    take_profit = request.get('tp', 0)
+    if order_type == ORDER_TYPE_BUY_STOP \
+            and ((stop_loss and stop_loss >= price) or (take_profit and take_profit <= price)):
+        return TRADE_RETCODE_INVALID_STOPS
+    if order_type == ORDER_TYPE_SELL_STOP \
+            and ((stop_loss and stop_loss <= price) or (take_profit and take_profit >= price)):
+        return TRADE_RETCODE_INVALID_STOPS
+    return 0
+
+
+def order_check(request):
+    terminal.call('order_check')
+    retcode = check_request(request)
+    return OrderCheckResult(retcode=retcode, balance=terminal.balance, equity=terminal.balance, profit=0.0,
+                            margin=0.0, margin_free=terminal.balance, margin_level=0.0,
+                            comment="Done" if retcode == 0 else "Invalid request", request=request)
+
+
+def order_send(request):
+    terminal.call('order_send')
+    retcode = check_request(request)
+    order = 0
+    if retcode == 0:
+        retcode = TRADE_RETCODE_DONE
+        if request.get('action') == TRADE_ACTION_REMOVE:
+            order = request['order']
+            terminal.orders.pop(order, None)
+        else:
+            order = terminal.next_ticket
+            terminal.next_ticket += 1
+            terminal.orders[order] = TradeOrder(
+                ticket=order, time_setup=terminal.time, type=request.get('type'), magic=request.get('magic', 0),
+                volume_initial=request.get('volume'), volume_current=request.get('volume'),
+                price_open=request.get('price'), sl=request.get('sl', 0.0), tp=request.get('tp', 0.0),
+                price_current=request.get('price'), symbol=request.get('symbol'), comment=request.get('comment', "")
+            )
+    bid, ask = terminal.get_quote(request['symbol']) if request.get('symbol') in terminal.symbols else (0.0, 0.0)
+    if terminal.lost_replies > 0:
+        terminal.lost_replies -= 1
+        return None
+    comment = "Request executed" if retcode == TRADE_RETCODE_DONE else "Invalid request"
+    return OrderSendResult(retcode=retcode, deal=0, order=order, volume=request.get('volume', 0.0),
+                           price=request.get('price', 0.0), bid=bid, ask=ask, comment=comment, request_id=0,
+                           retcode_external=0, request=request)
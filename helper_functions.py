@@ -1,3 +1,6 @@
+import numpy as np
+
+
 # Function to calculate FOREX lot size on MT5
 def calc_lot_size(balance, risk_amount, stop_loss, stop_price, symbol):
     """
@@ -13,10 +16,6 @@ def calc_lot_size(balance, risk_amount, stop_loss, stop_price, symbol):
     # Calculate the amount to risk
     amount_to_risk = balance * risk_amount
 
-    # Make sure symbol has any denotation of raw removed
-    symbol_name = symbol.split(".")
-    symbol_name = symbol_name[0]
-
     # Branch based on lot size
     if symbol == "USDJPY":
         # USDJPY pip size is 0.01
@@ -60,3 +59,86 @@ def calc_lot_size(balance, risk_amount, stop_loss, stop_price, symbol):
     if lot_size >= 10:
         lot_size = 9.99
     return lot_size
+
+
+# Function to calculate the profit of a FOREX trade on MT5
+def calc_profit(lot_size, entry_price, exit_price, symbol):
+    """
+    Function to calculate the profit (in the account currency) of a closed FOREX trade, using the same pip values as
+    calc_lot_size. Positive for a winning trade, negative for a losing trade.
+    :param lot_size: float of the lot size. Positive for a BUY, negative for a SELL
+    :param entry_price: float of the entry price
+    :param exit_price: float of the exit price
+    :param symbol: string of the symbol
+    :return: float of the profit
+    """
+    # Branch based on symbol, matching calc_lot_size
+    if symbol == "USDJPY":
+        pip_size = 0.01
+        # Pip value per lot, converted with the exit price as the USD is the counter currency
+        pip_value = 1000 / exit_price
+    elif symbol == "USDCAD":
+        pip_size = 0.0001
+        pip_value = 10 / exit_price
+    else:
+        pip_size = 0.0001
+        pip_value = 10
+    # Calculate the pips gained (or lost)
+    pips = (exit_price - entry_price) / pip_size
+    return lot_size * pips * pip_value
+
+
+# Largest lot size the bot will send, whatever the broker allows. You can modify this
+MAX_LOT_SIZE = 9.99
+# Contract size assumed by calc_lot_size
+FOREX_CONTRACT_SIZE = 100000
+
+
+# Function to get the conversion rate assumed by calc_lot_size
+def calc_forex_quote_to_account(symbol, stop_price):
+    """
+    Function to get the rate from the quote currency to the account currency which calc_lot_size assumes, so
+    calc_lot_sizes with FOREX_CONTRACT_SIZE gives the same lot sizes for many trades at once
+    :param symbol: string of the symbol
+    :param stop_price: array of stop_price (entry) prices
+    :return: numpy array of rates
+    """
+    stop_price = np.asarray(stop_price, dtype=np.float64)
+    if symbol == "USDJPY" or symbol == "USDCAD":
+        # The USD is the base currency, converted with the stop price
+        return 1 / stop_price
+    return np.ones_like(stop_price)
+
+
+# Function to calculate lot sizes for many trades at once, on any symbol
+def calc_lot_sizes(balance, risk_amount, stop_loss, stop_price, contract_size, quote_to_account, volume_step=0.01,
+                   volume_min=0.01, volume_max=MAX_LOT_SIZE):
+    """
+    Function to calculate lot sizes for arrays of trades in one numpy call. Works for any symbol from its metadata:
+    the loss of one lot at the stop_loss is the stop distance times the contract size, in the quote (profit) currency,
+    converted into the account currency with quote_to_account. All arguments broadcast against each other.
+    :param balance: float (or array) of the balance being risked
+    :param risk_amount: float (or array) of the amount to risk (expressed as decimal)
+    :param stop_loss: array of stop_loss prices
+    :param stop_price: array of stop_price (entry) prices
+    :param contract_size: float (or array) of the contract size (trade_contract_size on MT5)
+    :param quote_to_account: float (or array) of the rate from the quote currency to the account currency
+    :param volume_step: float (or array) of the lot step
+    :param volume_min: float (or array) of the smallest lot. Trades which would size below it get 0.00
+    :param volume_max: float (or array) of the largest lot. Capped at MAX_LOT_SIZE
+    :return: numpy array of lot sizes
+    """
+    # Calculate the amount to risk
+    amount_to_risk = np.asarray(balance, dtype=np.float64) * risk_amount
+    # Calculate the loss of one lot if the stop_loss is hit, in the account currency
+    stop_distance = np.abs(np.asarray(stop_price, dtype=np.float64) - np.asarray(stop_loss, dtype=np.float64))
+    loss_per_lot = stop_distance * contract_size * quote_to_account
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw_lot_size = np.where(loss_per_lot > 0, amount_to_risk / loss_per_lot, 0.00)
+    # Round to the lot step of the symbol
+    lot_size = np.round(np.round(raw_lot_size / volume_step) * volume_step, 8)
+    # Keep within the volume limits
+    lot_size = np.minimum(lot_size, np.minimum(volume_max, MAX_LOT_SIZE))
+    lot_size = np.where(lot_size < volume_min, 0.00, lot_size)
+    # Unknown conversion rates give no trade
+    return np.nan_to_num(lot_size, nan=0.00)
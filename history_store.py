@@ -0,0 +1,175 @@
+import os
+
+import numpy
+import pandas
+import yaml
+
+HISTORY_FOLDER = "history"
+SCHEMA_FILENAME = "schema.yaml"
+
+
+# Function to get the folder of a stored history
+def get_history_path(symbol, timeframe, history_folder=HISTORY_FOLDER):
+    """
+    Function to get the folder where the candles of a symbol and timeframe are stored. Each field returned by
+    copy_rates_from_pos is stored in its own append-only binary file in this folder
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param history_folder: string of the root folder of the history store
+    :return: string of the folder path
+    """
+    return os.path.join(history_folder, symbol, timeframe)
+
+
+# Function to read the schema of a stored history
+def read_schema(history_path):
+    """
+    Function to read the schema (field names and dtypes) of a stored history
+    :param history_path: string of the folder of the stored history
+    :return: numpy dtype of the stored candles, None if nothing is stored
+    """
+    schema_filepath = os.path.join(history_path, SCHEMA_FILENAME)
+    if not os.path.exists(schema_filepath):
+        return None
+    with open(schema_filepath, mode='r') as schema_file:
+        schema = yaml.safe_load(schema_file)
+    return numpy.dtype([(field['name'], field['dtype']) for field in schema['fields']])
+
+
+# Function to write the schema of a stored history
+def write_schema(history_path, dtype):
+    """
+    Function to write the schema (field names and dtypes) of a stored history
+    :param history_path: string of the folder of the stored history
+    :param dtype: numpy structured dtype of the candles
+    :return: None
+    """
+    schema = {'fields': [{'name': name, 'dtype': dtype[name].str} for name in dtype.names]}
+    with open(os.path.join(history_path, SCHEMA_FILENAME), mode='w') as schema_file:
+        yaml.safe_dump(schema, schema_file)
+
+
+# Function to get the files of the columns of a stored history
+def get_column_filepaths(history_path, dtype):
+    """
+    Function to get the file of each column of a stored history
+    :param history_path: string of the folder of the stored history
+    :param dtype: numpy dtype of the stored candles
+    :return: dictionary of field name -> string of the file path
+    """
+    return {name: os.path.join(history_path, f"{name}.bin") for name in dtype.names}
+
+
+# Function to count the complete rows of a stored history
+def count_rows(column_filepaths, dtype):
+    """
+    Function to count the rows stored in every column, i.e. the length of the shortest column
+    :param column_filepaths: dictionary of field name -> string of the file path
+    :param dtype: numpy dtype of the stored candles
+    :return: integer of the number of rows
+    """
+    return min(
+        os.path.getsize(filepath) // dtype[name].itemsize if os.path.exists(filepath) else 0
+        for name, filepath in column_filepaths.items()
+    )
+
+
+# Function to drop the rows of an interrupted append
+def truncate_columns(history_path, dtype):
+    """
+    Function to truncate every column file to the number of complete rows. An append interrupted part-way leaves some
+    columns longer than 'time', and appending after those rows would pair values with the wrong candles from then on
+    :param history_path: string of the folder of the stored history
+    :param dtype: numpy dtype of the stored candles
+    :return: integer of the number of rows kept
+    """
+    column_filepaths = get_column_filepaths(history_path=history_path, dtype=dtype)
+    number_of_rows = count_rows(column_filepaths=column_filepaths, dtype=dtype)
+    for name, filepath in column_filepaths.items():
+        size = number_of_rows * dtype[name].itemsize
+        if os.path.exists(filepath) and os.path.getsize(filepath) != size:
+            print(f"Dropping {os.path.getsize(filepath) - size} bytes of an interrupted append from {filepath}")
+            os.truncate(filepath, size)
+    return number_of_rows
+
+
+# Function to open a stored history as memory mapped columns
+def open_history(symbol, timeframe, history_folder=HISTORY_FOLDER):
+    """
+    Function to open the stored candles of a symbol and timeframe. Columns are memory mapped read only, so opening a
+    multi-year history does not read it into memory
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param history_folder: string of the root folder of the history store
+    :return: dictionary of field name -> numpy array (memmap). Empty dictionary if nothing is stored
+    """
+    history_path = get_history_path(symbol=symbol, timeframe=timeframe, history_folder=history_folder)
+    dtype = read_schema(history_path=history_path)
+    if dtype is None:
+        return {}
+    # Work out the number of complete rows. 'time' is written last, so a partially written append is ignored
+    column_filepaths = get_column_filepaths(history_path=history_path, dtype=dtype)
+    number_of_rows = count_rows(column_filepaths=column_filepaths, dtype=dtype)
+    columns = {}
+    for name, filepath in column_filepaths.items():
+        if number_of_rows == 0:
+            columns[name] = numpy.empty(0, dtype=dtype[name])
+        else:
+            columns[name] = numpy.memmap(filepath, dtype=dtype[name], mode='r', shape=(number_of_rows,))
+    return columns
+
+
+# Function to append candles to the history store
+def append_candles(symbol, timeframe, candles, history_folder=HISTORY_FOLDER):
+    """
+    Function to append candles to the history store. Only candles newer than the most recent stored candle are written
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param candles: structured array as returned by copy_rates_from_pos, or a dataframe of candlesticks
+    :param history_folder: string of the root folder of the history store
+    :return: integer of the number of candles written
+    """
+    if isinstance(candles, pandas.DataFrame):
+        candles = candles.drop(columns='human_time', errors='ignore').to_records(index=False)
+    if candles is None or len(candles) == 0:
+        return 0
+    history_path = get_history_path(symbol=symbol, timeframe=timeframe, history_folder=history_folder)
+    os.makedirs(history_path, exist_ok=True)
+    dtype = read_schema(history_path=history_path)
+    if dtype is None:
+        dtype = numpy.dtype([(name, candles.dtype[name]) for name in candles.dtype.names])
+        write_schema(history_path=history_path, dtype=dtype)
+    # Line every column up with 'time' before appending after it
+    truncate_columns(history_path=history_path, dtype=dtype)
+    # Skip candles which are already stored
+    stored_time = open_history(symbol=symbol, timeframe=timeframe, history_folder=history_folder).get('time')
+    if stored_time is not None and len(stored_time) > 0:
+        candles = candles[candles['time'] > stored_time[-1]]
+    if len(candles) == 0:
+        return 0
+    # Append each column to its own file. 'time' goes last so readers never see a partially written row
+    for name in sorted(dtype.names, key=lambda field: field == 'time'):
+        with open(os.path.join(history_path, f"{name}.bin"), mode='ab') as column_file:
+            numpy.ascontiguousarray(candles[name], dtype=dtype[name]).tofile(column_file)
+    return len(candles)
+
+
+# Function to read candles from the history store
+def read_candles(symbol, timeframe, number_of_candles=None, history_folder=HISTORY_FOLDER):
+    """
+    Function to read the most recent stored candles as a dataframe, in the same format as mt5_lib.get_candlesticks
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param number_of_candles: integer of the number of candles. Defaults to None (all stored candles)
+    :param history_folder: string of the root folder of the history store
+    :return: dataframe of the candlesticks. Empty if nothing is stored
+    """
+    columns = open_history(symbol=symbol, timeframe=timeframe, history_folder=history_folder)
+    if not columns:
+        return pandas.DataFrame()
+    if number_of_candles is not None:
+        columns = {name: column[-number_of_candles:] for name, column in columns.items()}
+    # Only the requested rows are copied out of the memory mapped files
+    dataframe = pandas.DataFrame({name: numpy.array(column) for name, column in columns.items()})
+    dataframe['human_time'] = pandas.to_datetime(dataframe['time'], unit='s')
+    return dataframe
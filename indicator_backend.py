@@ -0,0 +1,280 @@
+import numpy as np
+
+# TA-Lib is optional. Without it, every indicator falls back to the numpy implementation
+try:
+    import talib
+except ImportError:
+    talib = None
+
+# Name of the backend in use: "talib" or "numpy"
+backend = "talib" if talib is not None else "numpy"
+# Largest factor the cumulative weights of calc_linear_filter may grow by within one block. Larger blocks mean fewer
+# carries between blocks, at the cost of more rounding in each cumulative sum
+FILTER_GROWTH = 1e6
+
+
+# Function to choose the indicator backend
+def set_backend(name):
+    """
+    Function to choose the indicator backend
+    :param name: string. "talib" for the TA-Lib C routines, "numpy" for the pure numpy implementation
+    :return: None
+    """
+    global backend
+    if name == "talib" and talib is None:
+        raise ImportError("TA-Lib is not installed")
+    if name not in ("talib", "numpy"):
+        raise ValueError(f"Unknown indicator backend: {name}")
+    backend = name
+
+
+# Function to convert an input to the array type TA-Lib expects
+def as_float_array(values):
+    """
+    Function to convert a series, list or array into a contiguous float64 numpy array
+    :param values: array-like of values
+    :return: numpy array
+    """
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+# Function to calculate a Simple Moving Average (SMA)
+def sma(close, period=30):
+    """
+    Function to calculate a Simple Moving Average. Same output as talib.SMA: NaN for the first period - 1 values
+    :param close: array of close prices
+    :param period: integer of the SMA size
+    :return: numpy array
+    """
+    close = as_float_array(close)
+    if backend == "talib":
+        return talib.SMA(close, timeperiod=period)
+    output = np.full(len(close), np.nan)
+    if len(close) >= period:
+        output[period - 1:] = np.lib.stride_tricks.sliding_window_view(close, period).mean(axis=1)
+    return output
+
+
+# Function to calculate an Exponential Moving Average (EMA)
+def ema(close, period=30):
+    """
+    Function to calculate an Exponential Moving Average. Same output as talib.EMA: seeded with the SMA of the first
+    period values at index period - 1, NaN before it. Note this differs from indicator_lib.calc_ema, which seeds at
+    index period and fills 0.00 before it
+    :param close: array of close prices
+    :param period: integer of the EMA size
+    :return: numpy array
+    """
+    close = as_float_array(close)
+    if backend == "talib":
+        return talib.EMA(close, timeperiod=period)
+    return calc_ema_from(close=close, period=period, seed_index=period - 1)
+
+
+# Function to evaluate a first order linear recurrence
+def calc_linear_filter(values, decay, gain=1.00, initial=0.00, out=None):
+    """
+    Function to evaluate y[i] = decay * y[i - 1] + gain * values[i], with y[-1] = initial, without a loop over the
+    values. This is the recurrence behind EMA and Wilder smoothing. Within a block, y is a cumulative sum of values
+    weighted by decay ** -i, rescaled by decay ** i. Blocks are kept short enough for the weights to stay within
+    FILTER_GROWTH, and the value carried from each block into the next is added afterwards. Matches the loop to within
+    floating point rounding
+    :param values: numpy array of values
+    :param decay: float between 0 and 1 (exclusive of 1)
+    :param gain: float multiplying each value
+    :param initial: float of the value before the first one
+    :param out: numpy array to write the result into. Defaults to None (a new array). May be values itself
+    :return: numpy array of y
+    """
+    values = as_float_array(values)
+    out = np.multiply(values, gain, out=out)
+    number_of_values = len(out)
+    if number_of_values == 0 or decay == 0:
+        return out
+    if not 0 < decay < 1:
+        raise ValueError(f"Decay must be between 0 and 1. {decay}")
+    block = int(min(number_of_values, max(1, np.log(FILTER_GROWTH) // -np.log(decay))))
+    powers = decay ** np.arange(1, block + 1)
+    full_blocks = number_of_values // block
+    # Filter each block on its own, starting from 0. rows is a view of out, so the blocks are filtered in place
+    rows = out[:full_blocks * block].reshape(full_blocks, block)
+    rows /= powers
+    np.cumsum(rows, axis=1, out=rows)
+    rows *= powers
+    tail = out[full_blocks * block:]
+    if len(tail) > 0:
+        tail /= powers[:len(tail)]
+        np.cumsum(tail, out=tail)
+        tail *= powers[:len(tail)]
+    # Value at the end of each block: its own end plus what is carried in from the blocks before it. The carry shrinks
+    # by decay ** block per block, so only the few blocks it is still visible after are added
+    block_decay = powers[-1]
+    ends = rows[:, -1].copy()
+    carried = ends.copy()
+    shift = 1
+    while shift < full_blocks and block_decay ** shift > np.finfo(np.float64).eps:
+        carried[shift:] += block_decay ** shift * ends[:-shift]
+        shift += 1
+    if initial != 0:
+        carried += block_decay ** np.arange(1, full_blocks + 1) * initial
+    # Add the value carried into each block, decaying along the block
+    starts = np.concatenate(([initial], carried))
+    rows += np.multiply.outer(starts[:full_blocks], powers)
+    if len(tail) > 0:
+        tail += starts[full_blocks] * powers[:len(tail)]
+    return out
+
+
+# Function to calculate an EMA seeded at a given index
+def calc_ema_from(close, period, seed_index):
+    """
+    Function to calculate an EMA following the TA-Lib recurrence, seeded at seed_index with the SMA of the period
+    values ending there
+    :param close: numpy array of values
+    :param period: integer of the EMA size
+    :param seed_index: integer of the index of the first output
+    :return: numpy array, NaN before seed_index
+    """
+    output = np.full(len(close), np.nan)
+    if seed_index >= len(close) or seed_index < period - 1:
+        return output
+    multiplier = 2 / (period + 1)
+    output[seed_index] = np.mean(close[seed_index - period + 1:seed_index + 1])
+    calc_linear_filter(close[seed_index + 1:], decay=1 - multiplier, gain=multiplier, initial=output[seed_index],
+                       out=output[seed_index + 1:])
+    return output
+
+
+# Function to apply Wilder smoothing
+def calc_wilder_average(values, period):
+    """
+    Function to apply Wilder smoothing, seeded with the mean of the first period values: average = (average *
+    (period - 1) + value) / period
+    :param values: numpy array of values
+    :param period: integer of the smoothing size
+    :return: numpy array of len(values) - period + 1 averages, the first being the seed
+    """
+    output = np.empty(len(values) - period + 1)
+    output[0] = np.mean(values[:period])
+    calc_linear_filter(values[period:], decay=(period - 1) / period, gain=1 / period, initial=output[0],
+                       out=output[1:])
+    return output
+
+
+# Function to calculate the Relative Strength Index (RSI)
+def rsi(close, period=14):
+    """
+    Function to calculate Wilder's Relative Strength Index. Same output as talib.RSI: NaN for the first period values
+    :param close: array of close prices
+    :param period: integer of the RSI size
+    :return: numpy array
+    """
+    close = as_float_array(close)
+    if backend == "talib":
+        return talib.RSI(close, timeperiod=period)
+    output = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return output
+    differences = np.diff(close)
+    average_gain = calc_wilder_average(np.maximum(differences, 0.00), period)
+    average_loss = calc_wilder_average(np.maximum(-differences, 0.00), period)
+    output[period:] = rsi_value(average_gain, average_loss)
+    return output
+
+
+# Function to calculate RSI values
+def rsi_value(average_gain, average_loss):
+    """
+    Function to calculate RSI values from the average gains and losses
+    :param average_gain: numpy array of the average gains
+    :param average_loss: numpy array of the average losses
+    :return: numpy array of the RSI. 0.00 where there was no movement
+    """
+    total = average_gain + average_loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total == 0, 0.00, 100 * (average_gain / total))
+
+
+# Function to calculate the Average True Range (ATR)
+def atr(high, low, close, period=14):
+    """
+    Function to calculate Wilder's Average True Range. Same output as talib.ATR: NaN for the first period values
+    :param high: array of high prices
+    :param low: array of low prices
+    :param close: array of close prices
+    :param period: integer of the ATR size
+    :return: numpy array
+    """
+    high = as_float_array(high)
+    low = as_float_array(low)
+    close = as_float_array(close)
+    if backend == "talib":
+        return talib.ATR(high, low, close, timeperiod=period)
+    output = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return output
+    # True range from the second candle onwards
+    previous_close = close[:-1]
+    true_range = np.maximum.reduce([
+        high[1:] - low[1:],
+        np.abs(high[1:] - previous_close),
+        np.abs(low[1:] - previous_close)
+    ])
+    if period <= 1:
+        output[1:] = true_range
+        return output
+    # Seed with the SMA of the true range, then Wilder smoothing
+    output[period:] = calc_wilder_average(true_range, period)
+    return output
+
+
+# Function to calculate the Moving Average Convergence/Divergence (MACD)
+def macd(close, fast_period=12, slow_period=26, signal_period=9):
+    """
+    Function to calculate the MACD. Same output as talib.MACD: the fast EMA is seeded at the same index as the slow EMA,
+    and all three outputs are NaN until the signal line starts
+    :param close: array of close prices
+    :param fast_period: integer of the fast EMA size
+    :param slow_period: integer of the slow EMA size
+    :param signal_period: integer of the signal EMA size
+    :return: tuple of numpy arrays (macd, signal, histogram)
+    """
+    close = as_float_array(close)
+    if backend == "talib":
+        return talib.MACD(close, fastperiod=fast_period, slowperiod=slow_period, signalperiod=signal_period)
+    if slow_period < fast_period:
+        fast_period, slow_period = slow_period, fast_period
+    macd_line = np.full(len(close), np.nan)
+    signal_line = np.full(len(close), np.nan)
+    start = slow_period - 1
+    if start < len(close):
+        fast_ema = calc_ema_from(close=close, period=fast_period, seed_index=start)
+        slow_ema = calc_ema_from(close=close, period=slow_period, seed_index=start)
+        macd_line = fast_ema - slow_ema
+        signal_line[start:] = calc_ema_from(close=macd_line[start:], period=signal_period,
+                                            seed_index=signal_period - 1)
+    # Align every output to the start of the signal line
+    macd_line[np.isnan(signal_line)] = np.nan
+    return macd_line, signal_line, macd_line - signal_line
+
+
+# Function to calculate Bollinger Bands
+def bollinger_bands(close, period=5, deviations_up=2.0, deviations_down=2.0):
+    """
+    Function to calculate Bollinger Bands around a Simple Moving Average, using the population standard deviation
+    (ddof=0) of each window. Same output as talib.BBANDS with matype=0: NaN for the first period - 1 values
+    :param close: array of close prices
+    :param period: integer of the SMA size
+    :param deviations_up: float of standard deviations for the upper band
+    :param deviations_down: float of standard deviations for the lower band
+    :return: tuple of numpy arrays (upper, middle, lower)
+    """
+    close = as_float_array(close)
+    if backend == "talib":
+        return talib.BBANDS(close, timeperiod=period, nbdevup=deviations_up, nbdevdn=deviations_down, matype=0)
+    middle = sma(close, period)
+    deviation = np.full(len(close), np.nan)
+    if len(close) >= period:
+        # Deviations from the mean of each window, rather than E[x^2] - E[x]^2 which loses precision to cancellation
+        deviation[period - 1:] = np.lib.stride_tricks.sliding_window_view(close, period).std(axis=1, ddof=0)
+    return middle + deviations_up * deviation, middle, middle - deviations_down * deviation
@@ -1,38 +1,70 @@
 import pandas
 import numpy as np
 
+import indicator_backend
+
 
 # Define a function to calculate an EMA of any size
 def calc_ema(dataframe, ema_size):
     """
-    Function to calculate a dataframe of any size. Does not use TA-Lib, so slows down for dataframes greater
-    than about 5000 (depending on computer architecture)
+    Function to calculate an EMA of any size. Works directly on the numpy close buffer (see calc_ema_values) rather
+    than walking the dataframe row by row
     :param dataframe: dataframe of raw candlestick sizes
     :param ema_size: integer of the size of EMA you want
     :return: dataframe with EMA attached
     """
-    # Create the name of the column to be added
-    ema_name = "ema_" + str(ema_size)
-    # Create the multiplier
-    multiplier = 2 / (ema_size + 1)
-    # Calculate the initial value. This will be a Simple Moving Average (SMA)
-    initial_mean = dataframe['close'].head(ema_size).mean()
-    # Iterate through the dataframe and add the values
-    for i in range(len(dataframe)):
-        # If i is the size of the EMA, this value will be the initial mean
-        if i == ema_size:
-            dataframe.loc[i, ema_name] = initial_mean
-        # If i is > ema_size, calculate the EMA
-        elif i > ema_size:
-            ema_value = dataframe.loc[i, 'close'] * multiplier + dataframe.loc[i - 1, ema_name] * (1 - multiplier)
-            dataframe.loc[i, ema_name] = ema_value
-        # If i is < ema_size, set value to be 0.00
-        else:
-            dataframe.loc[i, ema_name] = 0.00
+    return calc_emas(dataframe=dataframe, ema_sizes=[ema_size])
+
+
+# Function to calculate several EMAs in a single pass over the dataframe
+def calc_emas(dataframe, ema_sizes):
+    """
+    Function to calculate several EMAs in one pass over the close prices. Columns are named ema_<size>
+    :param dataframe: dataframe of raw candlestick sizes
+    :param ema_sizes: list of integers of the EMA sizes you want
+    :return: dataframe with EMAs attached
+    """
+    # Calculate all EMAs from the numpy close buffer
+    ema_values = calc_ema_values(close_values=dataframe['close'].to_numpy(), ema_sizes=ema_sizes)
+    # Attach each EMA as a column
+    for ema_size, values in ema_values.items():
+        dataframe["ema_" + str(ema_size)] = values
     # Return completed dataframe to the user
     return dataframe
 
 
+# Function to calculate EMAs from an array of close prices
+def calc_ema_values(close_values, ema_sizes, out=None):
+    """
+    Function to calculate one or more EMAs from an array of close prices. The initial value at index ema_size is a
+    Simple Moving Average (SMA) of the first ema_size closes, values before it are 0.00. The recurrence is evaluated
+    without a loop over the candles (see indicator_backend.calc_linear_filter) and matches the original row-by-row loop
+    to within floating point rounding. When out is given, every value is written straight into its arrays
+    :param close_values: numpy array (or list) of close prices
+    :param ema_sizes: list of integers of the EMA sizes you want
+    :param out: dictionary of ema_size -> numpy array to write the values into. Defaults to None (new arrays)
+    :return: dictionary of ema_size -> numpy array of EMA values
+    """
+    close_values = np.asarray(close_values, dtype=np.float64)
+    number_of_values = len(close_values)
+    if out is None:
+        out = {ema_size: np.empty(number_of_values, dtype=np.float64) for ema_size in dict.fromkeys(ema_sizes)}
+    for ema_size in dict.fromkeys(ema_sizes):
+        output = out[ema_size]
+        # Values before the seed stay at 0.00
+        output[:min(ema_size, number_of_values)] = 0.00
+        if ema_size >= number_of_values:
+            continue
+        # Calculate the initial value. This will be a Simple Moving Average (SMA)
+        output[ema_size] = close_values[:ema_size].mean()
+        # Create the multiplier
+        multiplier = 2 / (ema_size + 1)
+        indicator_backend.calc_linear_filter(close_values[ema_size + 1:], decay=1 - multiplier, gain=multiplier,
+                                             initial=output[ema_size], out=output[ema_size + 1:])
+    # Return the EMA arrays
+    return out
+
+
 # Function to calculate an EMA cross event
 def calc_ema_cross(dataframe, ema_one, ema_two):
     """
@@ -62,6 +94,39 @@ def calc_ema_cross(dataframe, ema_one, ema_two):
     # Return dataframe
     return dataframe
 
+# Function to calculate EMAs into a candle frame
+def calc_frame_emas(frame, ema_sizes):
+    """
+    Function to calculate several EMAs into the preallocated columns of a CandleFrame. Same values as calc_emas,
+    columns are named ema_<size>
+    :param frame: CandleFrame of candles
+    :param ema_sizes: list of integers of the EMA sizes you want
+    :return: CandleFrame with EMAs written in place
+    """
+    out = {ema_size: frame.column("ema_" + str(ema_size)) for ema_size in ema_sizes}
+    calc_ema_values(close_values=frame['close'], ema_sizes=ema_sizes, out=out)
+    return frame
+
+
+# Function to calculate an EMA cross event into a candle frame
+def calc_frame_ema_cross(frame, ema_one, ema_two):
+    """
+    Function to calculate an EMA cross event into the preallocated ema_cross column of a CandleFrame. Same events as
+    calc_ema_cross. Rather than dropping the first row, it is kept and is never a cross
+    :param frame: CandleFrame with EMA columns in the format ema_<value>
+    :param ema_one: integer of EMA 1
+    :param ema_two: integer of EMA 2
+    :return: CandleFrame with ema_cross written in place
+    """
+    position = np.greater(frame["ema_" + str(ema_one)], frame["ema_" + str(ema_two)],
+                          out=frame.column('position', dtype=bool))
+    ema_cross = frame.column('ema_cross', dtype=bool)
+    if len(ema_cross) > 0:
+        ema_cross[0] = False
+        np.not_equal(position[1:], position[:-1], out=ema_cross[1:])
+    return frame
+
+
 # Function to calculate a generic crossover event
 def calc_crossover(dataframe, column_one, column_two):
     """
@@ -85,3 +150,181 @@ def calc_crossover(dataframe, column_one, column_two):
     dataframe = dataframe.drop(columns='pre_position')
     # Return dataframe
     return dataframe
+
+
+# Function to calculate a Simple Moving Average (SMA)
+def calc_sma(dataframe, sma_size):
+    """
+    Function to calculate an SMA through the indicator backend. Column is named sma_<size>
+    :param dataframe: dataframe of raw candlestick sizes
+    :param sma_size: integer of the size of SMA you want
+    :return: dataframe with SMA attached
+    """
+    dataframe["sma_" + str(sma_size)] = indicator_backend.sma(dataframe['close'].to_numpy(), period=sma_size)
+    return dataframe
+
+
+# Function to calculate a Relative Strength Index (RSI)
+def calc_rsi(dataframe, rsi_size=14):
+    """
+    Function to calculate an RSI through the indicator backend. Column is named rsi_<size>
+    :param dataframe: dataframe of raw candlestick sizes
+    :param rsi_size: integer of the size of RSI you want. Defaults to 14
+    :return: dataframe with RSI attached
+    """
+    dataframe["rsi_" + str(rsi_size)] = indicator_backend.rsi(dataframe['close'].to_numpy(), period=rsi_size)
+    return dataframe
+
+
+# Function to calculate an Average True Range (ATR)
+def calc_atr(dataframe, atr_size=14):
+    """
+    Function to calculate an ATR through the indicator backend. Column is named atr_<size>
+    :param dataframe: dataframe of raw candlestick sizes
+    :param atr_size: integer of the size of ATR you want. Defaults to 14
+    :return: dataframe with ATR attached
+    """
+    dataframe["atr_" + str(atr_size)] = indicator_backend.atr(
+        dataframe['high'].to_numpy(),
+        dataframe['low'].to_numpy(),
+        dataframe['close'].to_numpy(),
+        period=atr_size
+    )
+    return dataframe
+
+
+# Function to calculate the MACD
+def calc_macd(dataframe, fast_size=12, slow_size=26, signal_size=9):
+    """
+    Function to calculate the MACD through the indicator backend. Columns are named macd, macd_signal and macd_histogram
+    :param dataframe: dataframe of raw candlestick sizes
+    :param fast_size: integer of the fast EMA size. Defaults to 12
+    :param slow_size: integer of the slow EMA size. Defaults to 26
+    :param signal_size: integer of the signal EMA size. Defaults to 9
+    :return: dataframe with MACD attached
+    """
+    macd, signal, histogram = indicator_backend.macd(
+        dataframe['close'].to_numpy(),
+        fast_period=fast_size,
+        slow_period=slow_size,
+        signal_period=signal_size
+    )
+    dataframe['macd'] = macd
+    dataframe['macd_signal'] = signal
+    dataframe['macd_histogram'] = histogram
+    return dataframe
+
+
+# Function to calculate Bollinger Bands
+def calc_bollinger_bands(dataframe, bollinger_size=20, deviations=2.0):
+    """
+    Function to calculate Bollinger Bands through the indicator backend. Columns are named bollinger_upper,
+    bollinger_middle and bollinger_lower
+    :param dataframe: dataframe of raw candlestick sizes
+    :param bollinger_size: integer of the SMA size. Defaults to 20
+    :param deviations: float of standard deviations for both bands. Defaults to 2.0
+    :return: dataframe with Bollinger Bands attached
+    """
+    upper, middle, lower = indicator_backend.bollinger_bands(
+        dataframe['close'].to_numpy(),
+        period=bollinger_size,
+        deviations_up=deviations,
+        deviations_down=deviations
+    )
+    dataframe['bollinger_upper'] = upper
+    dataframe['bollinger_middle'] = middle
+    dataframe['bollinger_lower'] = lower
+    return dataframe
+
+
+# Class to hold the incremental state of an EMA cross indicator
+class EmaCrossState:
+    """
+    Incremental EMA cross indicator. Seeded once from a dataframe of candles, then updated one candle at a time so each
+    new candle costs the same no matter how much history was used for seeding. EMA values follow calc_ema_values, the
+    ema_cross flag follows calc_ema_cross
+    """
+
+    def __init__(self, ema_one, ema_two):
+        """
+        :param ema_one: integer of EMA 1
+        :param ema_two: integer of EMA 2
+        """
+        self.ema_one = ema_one
+        self.ema_two = ema_two
+        self.ema_sizes = list(dict.fromkeys([ema_one, ema_two]))
+        # Most recent and previous candle, with EMA values and the ema_cross flag attached
+        self.latest = None
+        self.previous = None
+        # Closes kept until every EMA has been seeded with its SMA
+        self.seed_closes = []
+
+    # Function to seed the state from a dataframe of candles
+    def seed(self, dataframe):
+        """
+        Function to seed the state from a dataframe of candles. Any previous state is discarded
+        :param dataframe: dataframe of raw candlesticks, oldest first. Must have at least two rows
+        :return: Boolean. True if seeded, False if not enough candles
+        """
+        self.latest = None
+        self.previous = None
+        self.seed_closes = []
+        if len(dataframe) < 2:
+            return False
+        # Calculate the EMAs over the full history once
+        close_values = dataframe['close'].to_numpy()
+        ema_values = calc_ema_values(close_values=close_values, ema_sizes=self.ema_sizes)
+        # Keep the closes needed by any EMA which has not been seeded yet
+        max_ema_size = max(self.ema_sizes)
+        if len(dataframe) <= max_ema_size:
+            self.seed_closes = close_values[:max_ema_size].tolist()
+        # Keep the last two candles
+        records = dataframe.tail(2).to_dict('records')
+        for offset, record in zip((2, 1), records):
+            index = len(dataframe) - offset
+            record['index'] = index
+            for ema_size in self.ema_sizes:
+                record["ema_" + str(ema_size)] = float(ema_values[ema_size][index])
+            record['position'] = record["ema_" + str(self.ema_one)] > record["ema_" + str(self.ema_two)]
+        self.previous, self.latest = records
+        self.latest['ema_cross'] = self.latest['position'] != self.previous['position']
+        return True
+
+    # Function to update the state with a new candle
+    def update(self, candle, previous_time=None):
+        """
+        Function to update the state with the next candle. If previous_time is passed and does not match the time of
+        the latest candle held, a candle has been missed and the state must be re-seeded
+        :param candle: dictionary (or record) of the new candle with time, open, high, low and close
+        :param previous_time: time of the candle before the new candle, as reported by MT5
+        :return: Boolean. True if the state is in sync, False if a gap was found and the state needs re-seeding
+        """
+        if self.latest is None:
+            return False
+        # Candle already applied
+        if candle['time'] <= self.latest['time']:
+            return True
+        # Gap detected
+        if previous_time is not None and previous_time != self.latest['time']:
+            return False
+        close = float(candle['close'])
+        index = self.latest['index'] + 1
+        if index < max(self.ema_sizes):
+            self.seed_closes.append(close)
+        record = dict(candle)
+        record['index'] = index
+        for ema_size in self.ema_sizes:
+            ema_name = "ema_" + str(ema_size)
+            multiplier = 2 / (ema_size + 1)
+            if index == ema_size:
+                # Calculate the initial value. This will be a Simple Moving Average (SMA)
+                record[ema_name] = float(np.mean(self.seed_closes[:ema_size]))
+            elif index > ema_size:
+                record[ema_name] = close * multiplier + self.latest[ema_name] * (1 - multiplier)
+            else:
+                record[ema_name] = 0.00
+        record['position'] = record["ema_" + str(self.ema_one)] > record["ema_" + str(self.ema_two)]
+        record['ema_cross'] = record['position'] != self.latest['position']
+        self.previous = self.latest
+        self.latest = record
+        return True
@@ -1,11 +1,14 @@
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 import yaml
 
-import ema_cross_strategy
+import metrics
 import mt5_lib
+import portfolio_risk
+import strategy_lib
 
 
 # Function to import settings from settings.json
@@ -59,48 +62,245 @@ EMA_2_PERIOD = 10
 NUMBER_OF_CANDLES = 1000
 SETTINGS_FILEPATH = "settings.yaml"
 OUTPUT_FOLDER = "data"
+# Balance trades are sized on until the portfolio risk book has the account equity
 BALANCE = 100_000
 AMOUNT_TO_RISK = 0.01
+STREAMING = True
+MAX_WORKERS = 8
+# Extra (ema_one, ema_two) variants run through the strategy registry alongside the main strategy, sharing its candles
+# and indicators
+STRATEGY_VARIANTS = []
+# Event loop timings, in seconds
+CONFIRM_WINDOW = 5
+CONFIRM_INTERVAL = 0.02
+POLL_INTERVAL = 60
+MAX_BACKOFF = 15 * 60
+# Instrumentation. Set METRICS_PORT to serve per-stage latency histograms on http://127.0.0.1:<port>/metrics, and
+# METRICS_LOG to append every observation to a JSON lines file. Instrumentation is off when both are None
+METRICS_PORT = None
+METRICS_LOG = None
 
 
 # Function to run the strategy
-def run_strategy(project_settings, comment):
+def run_strategy(project_settings, comment, max_workers=MAX_WORKERS, symbols=None):
     """
     Function to run the strategy for the trading bot
     :param project_settings: JSON of project settings
+    :param comment: string of the comment used to tag orders of the main strategy, which is registered on first use
+    :param max_workers: integer of symbols processed concurrently. 1 processes symbols one after another
+    :param symbols: list of symbols to run. Defaults to None (all symbols in project settings)
     :return: Boolean. Strategy ran successfully with no errors=True. Else False.
     """
     # Extract the symbols to be traded
-    symbols = project_settings["mt5"]["symbols"]
+    if symbols is None:
+        symbols = project_settings["mt5"]["symbols"]
     # Extract the timeframe to be traded
     timeframe = project_settings["mt5"]["timeframe"]
+    # The main strategy runs through the strategy registry with any variants
+    if comment not in strategy_lib.strategy_registry:
+        strategy_lib.register_strategy(
+            strategy_lib.EmaCrossStrategy(ema_one=EMA_1_PERIOD, ema_two=EMA_2_PERIOD, comment=comment)
+        )
     # Strategy Risk Management
     # Get a list of open orders
     # orders = mt5_lib.get_all_open_orders()
     # # Iterate through the open orders and cancel
     # for order in orders:
     #     mt5_lib.cancel_order(order)
+    # Strategy Risk Management
+    # Cancel any open orders related to the symbols and strategy, from one snapshot of open orders
+    mt5_lib.cancel_filtered_orders_for_symbols(
+        symbols=symbols,
+        comments=list(strategy_lib.strategy_registry)
+    )
+    # Bring equity, positions and the remaining pending orders into the risk book, within its time budget
+    portfolio_risk.book.refresh()
     # Run through the strategy of the specified symbols
+    latencies = {}
+    success = True
+    if max_workers <= 1:
+        for symbol in symbols:
+            # An error on one symbol does not stop the others
+            try:
+                latencies[symbol] = run_symbol_strategy(symbol=symbol, timeframe=timeframe, comment=comment)
+            except Exception as e:
+                print(f"\nError running strategy on {symbol}: {e}")
+                success = False
+        print_cycle_latency(symbols=symbols, latencies=latencies)
+        metrics.flush_log()
+        return success
+    # Run the symbols concurrently. Calls into MT5 are serialized by mt5_lib, so the indicator math of one symbol
+    # overlaps the terminal I/O of another
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run_symbol_strategy, symbol=symbol, timeframe=timeframe, comment=comment): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            # An error on one symbol does not stop the others
+            try:
+                latencies[symbol] = future.result()
+            except Exception as e:
+                print(f"\nError running strategy on {symbol}: {e}")
+                success = False
+    print_cycle_latency(symbols=symbols, latencies=latencies)
+    metrics.flush_log()
+    return success
+
+
+# Function to report the latency of each symbol in a cycle
+def print_cycle_latency(symbols, latencies):
+    """
+    Function to print the time taken by each symbol in a cycle
+    :param symbols: list of symbols, in the order to print
+    :param latencies: dictionary of symbol -> seconds. Symbols which failed are missing
+    :return: None
+    """
+    print(f"\nCycle latency: " + ", ".join(
+        f"{symbol} {latencies[symbol] * 1000:.1f}ms" for symbol in symbols if symbol in latencies
+    ))
+
+
+# Function to run the strategy on a single symbol
+def run_symbol_strategy(symbol, timeframe, comment):
+    """
+    Function to run every registered strategy on a single symbol: look for and place trades. Open orders are cancelled
+    and the main strategy registered beforehand by run_strategy
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param comment: string of the comment of the main strategy
+    :return: float of the time taken in seconds
+    """
+    start_time = time.perf_counter()
+    balance = portfolio_risk.book.get_equity(default=BALANCE)
+    # Run every registered strategy, sharing one set of candles and indicators
+    outcomes = strategy_lib.run_strategies(symbol=symbol, timeframe=timeframe,
+                                           number_of_candles=NUMBER_OF_CANDLES,
+                                           balance=balance,
+                                           amount_to_risk=AMOUNT_TO_RISK,
+                                           streaming=STREAMING)
+    traded = False
+    for strategy_comment, outcome in outcomes.items():
+        if outcome:
+            traded = True
+            print(f"\nTrade Made on {symbol} by {strategy_comment}")
+    if not traded:
+        print(".", end="")
+    #     # print(f"No trade for {symbol}")
+    latency = time.perf_counter() - start_time
+    metrics.observe(stage="symbol_cycle", symbol=symbol, seconds=latency)
+    return latency
+
+
+# Function to find the symbols which have a new completed candle
+def get_symbols_with_new_candle(symbols, timeframe, previous_times):
+    """
+    Function to find the symbols whose last completed candle has changed. Uses the candle cache, so each check is a
+    small request to MT5
+    :param symbols: list of symbols to check
+    :param timeframe: string of the timeframe
+    :param previous_times: dictionary of symbol -> time of the last completed candle seen. Updated in place
+    :return: list of symbols with a new candle
+    """
+    new_symbols = []
     for symbol in symbols:
-        # Strategy Risk Management
-        # Cancel any open orders related to the symbol and strategy
-        mt5_lib.cancel_filtered_orders(
-            symbol=symbol,
-            comment=comment
-        )
-        data = ema_cross_strategy.ema_cross_strategy(symbol=symbol, timeframe=timeframe,
-                                                     number_of_candles=NUMBER_OF_CANDLES, ema_one=EMA_1_PERIOD,
-                                                     ema_two=EMA_2_PERIOD,
-                                                     balance=BALANCE,
-                                                     amount_to_risk=AMOUNT_TO_RISK,
-                                                     comment=comment)
-        if data:
-            print(f"\nTrade Made on {symbol}")
+        time_candle = mt5_lib.get_candlesticks(symbol, timeframe=timeframe, number_of_candles=1)
+        if time_candle.empty:
+            continue
+        candle_time = int(time_candle['time'].values[0])
+        if candle_time != previous_times.get(symbol):
+            previous_times[symbol] = candle_time
+            new_symbols.append(symbol)
+    return new_symbols
+
+
+# Function to work out how long to wait until the next candle closes
+def get_seconds_to_next_candle(timeframe, server_offset):
+    """
+    Function to work out how long to wait until the current candle closes
+    :param timeframe: string of the timeframe
+    :param server_offset: integer of seconds to add to the local time to get the MT5 server time
+    :return: float of seconds to wait
+    """
+    period = mt5_lib.get_timeframe_seconds(timeframe)
+    # Weekly and monthly candles are not aligned to a fixed period, so poll
+    if period is None:
+        return POLL_INTERVAL
+    server_now = time.time() + server_offset
+    return (server_now // period + 1) * period - server_now
+
+
+# Function to work out how long to wait while no new candles arrive
+def get_backoff_wait(wait, period, idle_candles):
+    """
+    Function to work out how long to wait while no new candles arrive. The wait grows by a doubling number of periods
+    for each idle candle, up to MAX_BACKOFF. The cap never cuts the wait short of the next candle close, which is
+    longer than MAX_BACKOFF on H1 and above
+    :param wait: float of seconds to the next candle close
+    :param period: integer of seconds per candle, None for weekly and monthly candles
+    :param idle_candles: integer of consecutive checks without a new candle
+    :return: float of seconds to wait
+    """
+    if idle_candles == 0:
+        return wait
+    backoff = wait + (period or POLL_INTERVAL) * (2 ** min(idle_candles, 10) - 1)
+    return min(backoff, max(MAX_BACKOFF, wait))
+
+
+# Function to run the strategy every time a candle closes
+def run_event_loop(project_settings, comment):
+    """
+    Function to run the strategy every time a candle closes. Sleeps until the next candle close, then confirms the new
+    candle per symbol and runs the strategy on each symbol as soon as its candle is confirmed. When no symbol gets a
+    new candle (markets closed), the wait is doubled each time, see get_backoff_wait
+    :param project_settings: JSON of project settings
+    :param comment: string of the comment used to tag orders of this strategy
+    :return: None
+    """
+    symbols = project_settings["mt5"]["symbols"]
+    timeframe = project_settings["mt5"]["timeframe"]
+    period = mt5_lib.get_timeframe_seconds(timeframe)
+    server_offset = mt5_lib.get_server_time_offset(symbols[0])
+    previous_times = {}
+    idle_candles = 0
+    first_pass = True
+    while True:
+        # Confirm the new candle on each symbol. A candle only appears with its first tick, so keep checking the
+        # symbols still pending for a short window
+        pending_symbols = list(symbols)
+        confirm_deadline = time.time() + CONFIRM_WINDOW
+        found = False
+        while pending_symbols:
+            new_symbols = get_symbols_with_new_candle(
+                symbols=pending_symbols,
+                timeframe=timeframe,
+                previous_times=previous_times
+            )
+            if new_symbols:
+                found = True
+                print(f"\n{previous_times[new_symbols[0]]}: **New candle** {', '.join(new_symbols)} ", end="")
+                run_strategy(project_settings=project_settings, comment=comment, symbols=new_symbols)
+                pending_symbols = [symbol for symbol in pending_symbols if symbol not in new_symbols]
+                # Refine the server clock offset from a candle which has just closed. Candles seen at startup or
+                # long after their close are skipped
+                if period is not None and not first_pass:
+                    offset = previous_times[new_symbols[0]] + period - time.time()
+                    rounded_offset = int(round(offset / 1800) * 1800)
+                    if abs(offset - rounded_offset) <= CONFIRM_WINDOW:
+                        server_offset = rounded_offset
+            if time.time() >= confirm_deadline:
+                break
+            time.sleep(CONFIRM_INTERVAL)
+        first_pass = False
+        # Back off while markets are closed
+        if found:
+            idle_candles = 0
         else:
-            print(".", end="")
-        #     # print(f"No trade for {symbol}")
-    # Return True. Previous code will throw a breaking error if anything goes wrong.
-    return True
+            idle_candles += 1
+            print(f"\nNo new candles - markets are probably closed")
+        wait = get_seconds_to_next_candle(timeframe=timeframe, server_offset=server_offset)
+        time.sleep(get_backoff_wait(wait=wait, period=period, idle_candles=idle_candles))
 
 
 # Main function
@@ -123,23 +323,9 @@ if __name__ == '__main__':
         print(f"\t{tick_symbol}")
     print("-" * 100)
     print()
-    current_time = 0
-    previous_time = 0
-    timeframe = project_settings["mt5"]["timeframe"]
     comment = f"EMA{EMA_1_PERIOD}-EMA{EMA_2_PERIOD} CROSS STRATEGY"
-    tick_symbol = symbols[0]
-    while True:
-        time_candle = mt5_lib.get_candlesticks(tick_symbol, timeframe=timeframe, number_of_candles=1)
-        if time_candle.empty:
-            print(f"No candles could be retrieved for {tick_symbol}- probably all exchanges are closed")
-            time.sleep(10)
-            continue
-        current_time = time_candle['time'].values
-        tick_title = f"{tick_symbol}@{time_candle['close'].values[0]:.5f}"
-        if current_time == previous_time:
-            print(".", end="")
-            time.sleep(1)
-            continue
-        print(f"\n{current_time}: **New candle** {tick_title} ", end="")
-        previous_time = current_time
-        run_strategy(project_settings=project_settings, comment=comment)
+    if METRICS_PORT is not None or METRICS_LOG is not None:
+        metrics.enable(port=METRICS_PORT, log_file=METRICS_LOG)
+    for ema_one, ema_two in STRATEGY_VARIANTS:
+        strategy_lib.register_strategy(strategy_lib.EmaCrossStrategy(ema_one=ema_one, ema_two=ema_two))
+    run_event_loop(project_settings=project_settings, comment=comment)
@@ -1,55 +1,91 @@
-import mt5_lib
+import numpy
 
-from helper_functions import calc_lot_size
+import metrics
+import mt5_lib
+import portfolio_risk
+from helper_functions import calc_lot_size, calc_lot_sizes
 
 
 # Function to make a trade
 def make_trade(balance, comment, amount_to_risk, symbol, take_profit, stop_loss, stop_price):
     """
     Function to make a trade once a price signal is retrieved.
-    :param balance: float of current balance / or static balance
+    :param balance: float of current balance / or static balance. Lot sizes are capped by the portfolio risk book
     :param amount_to_risk: float of the amount to risk (expressed as decimal)
     :param take_profit: float of take_profit price
     :param stop_loss: float of stop_loss price
     :param stop_price: float of stop_price
     :param symbol: string of the symbol being traded
-    :return: trade_outcome
+    :return: trade_outcome. OrderResult (truthy if the order was placed), or False if no order was sent
     """
-    # Format all values
+    # Format all values. Prices are rounded to the digits and tick size of the symbol by mt5_lib.place_order
     balance = float(balance)
     balance = round(balance, 2)
     take_profit = float(take_profit)
-    take_profit = round(take_profit, 4)
     stop_loss = float(stop_loss)
-    stop_loss = round(stop_loss, 4)
     stop_price = float(stop_price)
-    stop_price = round(stop_price, 4)
 
     # Pseudo code
-    # 1. Determine lot size
-    lot_size = calc_lot_size(
-        balance=balance,
-        risk_amount=amount_to_risk,
-        stop_loss=stop_loss,
-        stop_price=stop_price,
-        symbol=symbol
-    )
-    # 2. Send trade to MT5
+    # 1. Determine lot size from the symbol metadata
+    with metrics.timed("lot_sizing", symbol):
+        sizing_metadata = mt5_lib.get_sizing_metadata(symbols=[symbol])
+        if numpy.isnan(sizing_metadata['quote_to_account'][0]) and not mt5_lib.is_forex_symbol(symbol):
+            # The FOREX calculation would mis-size indices and metals by orders of magnitude
+            print(f"No rate to convert the quote currency of {symbol} into the account currency. No trade")
+            return False
+        if numpy.isnan(sizing_metadata['quote_to_account'][0]):
+            # No cross rate to convert the quote currency, fall back to the FOREX calculation
+            lot_size = calc_lot_size(
+                balance=balance,
+                risk_amount=amount_to_risk,
+                stop_loss=stop_loss,
+                stop_price=stop_price,
+                symbol=symbol
+            )
+        else:
+            lot_size = float(calc_lot_sizes(
+                balance=balance,
+                risk_amount=amount_to_risk,
+                stop_loss=[stop_loss],
+                stop_price=[stop_price],
+                **sizing_metadata
+            )[0])
+    if lot_size <= 0:
+        print(f"Lot size for {symbol} is below the minimum volume. No trade")
+        return False
+    # 2. Cap the lot size to the room left under the portfolio exposure limits
+    with metrics.timed("risk_check", symbol):
+        lot_size, reservation = portfolio_risk.book.cap_lot_size(
+            symbol=symbol,
+            lot_size=lot_size,
+            is_buy=stop_price > stop_loss,
+            price=stop_price,
+            sizing_metadata=sizing_metadata
+        )
+    if lot_size <= 0:
+        print(f"No room left under the exposure limits for {symbol}. No trade")
+        return False
+    # 3. Send trade to MT5
     # Determine trade type
     if stop_price > stop_loss:
         trade_type = "BUY_STOP"
     else:
         trade_type = "SELL_STOP"
-    # Send to MT5
-    trade_outcome = mt5_lib.place_order(
-        order_type=trade_type,
-        symbol=symbol,
-        volume=lot_size,
-        stop_loss=stop_loss,
-        stop_price=stop_price,
-        take_profit=take_profit,
-        comment=comment,
-        direct=False
-    )
+    # Send to MT5. The reservation is released if no order was placed, even if place_order raised
+    trade_outcome = False
+    try:
+        trade_outcome = mt5_lib.place_order(
+            order_type=trade_type,
+            symbol=symbol,
+            volume=lot_size,
+            stop_loss=stop_loss,
+            stop_price=stop_price,
+            take_profit=take_profit,
+            comment=comment,
+            direct=False,
+            fast_path=True
+        )
+    finally:
+        portfolio_risk.book.settle(key=reservation, trade_outcome=trade_outcome)
     # Return the trade outcome to user
     return trade_outcome
@@ -0,0 +1,269 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_NAME = "trading_bot_stage_seconds"
+EVENT_METRIC_NAME = "trading_bot_events_total"
+
+# Instrumentation is off until enable is called. While off, timed returns a shared no-op timer
+enabled = False
+# Histograms per (stage, symbol): [bucket counts, sum of seconds, count]
+histograms = {}
+# Event counters per (event, symbol)
+counters = {}
+histograms_lock = threading.Lock()
+# Observations waiting to be written to the structured log, and where to write them
+log_filepath = None
+pending_events = []
+server = None
+
+
+# Class for a timer which does nothing, used while instrumentation is off
+class NullTimer:
+    """
+    Timer which does nothing. A single instance is shared, so timing a stage while instrumentation is off costs one
+    flag check and no allocation
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+# Class to time a stage
+class StageTimer:
+    """
+    Context manager timing one stage of a cycle and recording it in the histogram of the stage and symbol
+    """
+
+    def __init__(self, stage, symbol):
+        """
+        :param stage: string of the stage (i.e. fetch, order_send)
+        :param symbol: string of the symbol. None for stages not tied to a symbol
+        """
+        self.stage = stage
+        self.symbol = symbol
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        observe(stage=self.stage, symbol=self.symbol, seconds=time.perf_counter() - self.start_time)
+        return False
+
+
+# Function to time a stage
+def timed(stage, symbol=None):
+    """
+    Function to time a stage with a with statement. I.e. with metrics.timed("fetch", symbol): ...
+    :param stage: string of the stage
+    :param symbol: string of the symbol. Defaults to None (not tied to a symbol)
+    :return: context manager
+    """
+    if not enabled:
+        return NULL_TIMER
+    return StageTimer(stage=stage, symbol=symbol)
+
+
+# Function to record the latency of a stage
+def observe(stage, symbol, seconds):
+    """
+    Function to record the latency of a stage in the histogram of the stage and symbol
+    :param stage: string of the stage
+    :param symbol: string of the symbol. None for stages not tied to a symbol
+    :param seconds: float of the latency in seconds
+    :return: None
+    """
+    if not enabled:
+        return
+    key = (stage, symbol or "")
+    with histograms_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = [[0] * len(BUCKETS), 0.0, 0]
+            histograms[key] = histogram
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += seconds
+        histogram[2] += 1
+        if log_filepath is not None:
+            pending_events.append({'time': time.time(), 'stage': stage, 'symbol': symbol, 'seconds': seconds})
+
+
+# Function to count an event
+def increment(event, symbol=None, value=1):
+    """
+    Function to count an event, such as an order retry
+    :param event: string of the event (i.e. order_retry_requote)
+    :param symbol: string of the symbol. None for events not tied to a symbol
+    :param value: integer to add. Defaults to 1
+    :return: None
+    """
+    if not enabled:
+        return
+    key = (event, symbol or "")
+    with histograms_lock:
+        counters[key] = counters.get(key, 0) + value
+        if log_filepath is not None:
+            pending_events.append({'time': time.time(), 'event': event, 'symbol': symbol, 'value': value})
+
+
+# Function to turn instrumentation on
+def enable(port=None, log_file=None, host="127.0.0.1"):
+    """
+    Function to turn instrumentation on
+    :param port: integer of the port of the Prometheus text endpoint. Defaults to None (no endpoint)
+    :param log_file: string of a file to append each observation to as a JSON line on flush_log. Defaults to None
+    :param host: string of the address the endpoint listens on. Defaults to localhost only
+    :return: None
+    """
+    global enabled, log_filepath
+    log_filepath = log_file
+    enabled = True
+    if port is not None:
+        start_server(port=port, host=host)
+
+
+# Function to turn instrumentation off
+def disable():
+    """
+    Function to turn instrumentation off. Recorded histograms are kept
+    :return: None
+    """
+    global enabled
+    enabled = False
+
+
+# Function to clear every recorded histogram
+def reset():
+    """
+    Function to clear every recorded histogram, counter and pending log event
+    :return: None
+    """
+    with histograms_lock:
+        histograms.clear()
+        counters.clear()
+        pending_events.clear()
+
+
+# Function to get a copy of the histograms
+def snapshot():
+    """
+    Function to get a copy of the recorded histograms
+    :return: dictionary of (stage, symbol) -> dictionary of buckets (non-cumulative counts), sum and count
+    """
+    with histograms_lock:
+        return {
+            key: {'buckets': list(histogram[0]), 'sum': histogram[1], 'count': histogram[2]}
+            for key, histogram in histograms.items()
+        }
+
+
+# Function to write pending observations to the structured log
+def flush_log():
+    """
+    Function to append the observations recorded since the last flush to the log file, one JSON object per line. Called
+    once per cycle so the file is not written from the hot path
+    :return: integer of the number of observations written
+    """
+    if log_filepath is None:
+        return 0
+    with histograms_lock:
+        events = list(pending_events)
+        pending_events.clear()
+    if events:
+        with open(log_filepath, mode='a') as log_file:
+            log_file.writelines(json.dumps(event) + "\n" for event in events)
+    return len(events)
+
+
+# Function to render the histograms in the Prometheus text format
+def render():
+    """
+    Function to render the recorded histograms and counters in the Prometheus text exposition format
+    :return: string
+    """
+    lines = [
+        f"# HELP {METRIC_NAME} Latency of each stage of a trading cycle, per symbol",
+        f"# TYPE {METRIC_NAME} histogram"
+    ]
+    for (stage, symbol), histogram in sorted(snapshot().items()):
+        labels = f'stage="{stage}",symbol="{symbol}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{METRIC_NAME}_sum{{{labels}}} {histogram["sum"]}')
+        lines.append(f'{METRIC_NAME}_count{{{labels}}} {histogram["count"]}')
+    with histograms_lock:
+        event_counts = sorted(counters.items())
+    if event_counts:
+        lines.append(f"# HELP {EVENT_METRIC_NAME} Number of events (i.e. order retries), per symbol")
+        lines.append(f"# TYPE {EVENT_METRIC_NAME} counter")
+        for (event, symbol), count in event_counts:
+            lines.append(f'{EVENT_METRIC_NAME}{{event="{event}",symbol="{symbol}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+# Class to serve the Prometheus text endpoint
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler serving the histograms on /metrics
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the console
+        pass
+
+
+# Function to start the Prometheus text endpoint
+def start_server(port, host="127.0.0.1"):
+    """
+    Function to serve the histograms on http://<host>:<port>/metrics from a daemon thread
+    :param port: integer of the port. 0 picks a free port
+    :param host: string of the address to listen on. Defaults to localhost only
+    :return: ThreadingHTTPServer. server.server_address holds the address in use
+    """
+    global server
+    if server is not None:
+        return server
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+# Function to stop the Prometheus text endpoint
+def stop_server():
+    """
+    Function to stop the Prometheus text endpoint
+    :return: None
+    """
+    global server
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        server = None
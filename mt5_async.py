@@ -0,0 +1,105 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import mt5_lib
+
+DEFAULT_TIMEOUT = 10
+
+
+# Class to give asyncio access to MetaTrader 5
+class AsyncMT5:
+    """
+    Asyncio front-end for mt5_lib. Every request runs on one dedicated executor thread which owns the terminal
+    connection, so coroutines never block on the terminal. Identical read requests which are in flight at the same time
+    are coalesced into a single terminal call, and each caller gets its own copy of any mutable result. Writes (orders
+    and cancellations) are never coalesced. Methods mirror the mt5_lib functions of the same name.
+    A request which times out is abandoned by the caller, but the blocking call still finishes on the terminal thread
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        """
+        :param timeout: float of the default timeout in seconds for each request. None waits forever
+        """
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mt5")
+        self.in_flight = {}
+
+    # Function to run a mt5_lib function on the terminal thread
+    async def call(self, function, *args, coalesce=False, timeout=None, **kwargs):
+        """
+        Function to run a mt5_lib function on the terminal thread
+        :param function: mt5_lib function
+        :param coalesce: Boolean. Defaults to False. When True, joins an identical request already in flight
+        :param timeout: float of the timeout in seconds. Defaults to None (the client timeout)
+        :return: outcome of the function
+        """
+        loop = asyncio.get_running_loop()
+        key = (function.__name__, args, tuple(sorted(kwargs.items()))) if coalesce else None
+        future = self.in_flight.get(key) if key is not None else None
+        if future is None:
+            future = loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+            if key is not None:
+                self.in_flight[key] = future
+                future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shield the shared request so one caller timing out does not cancel it for the others
+        return await asyncio.wait_for(asyncio.shield(future), timeout if timeout is not None else self.timeout)
+
+    async def start_mt5(self, project_settings):
+        return await self.call(mt5_lib.start_mt5, project_settings=project_settings)
+
+    async def enable_all_symbols(self, symbol_array):
+        return await self.call(mt5_lib.enable_all_symbols, symbol_array=symbol_array)
+
+    async def get_candlesticks(self, symbol, timeframe, number_of_candles, timeout=None):
+        dataframe = await self.call(mt5_lib.get_candlesticks, symbol=symbol, timeframe=timeframe,
+                                    number_of_candles=number_of_candles, coalesce=True, timeout=timeout)
+        # Coalesced callers each get their own dataframe, as the strategy adds columns in place
+        return dataframe.copy()
+
+    async def get_pip_size(self, symbol):
+        return await self.call(mt5_lib.get_pip_size, symbol=symbol, coalesce=True)
+
+    async def get_base_currency(self, symbol):
+        return await self.call(mt5_lib.get_base_currency, symbol=symbol, coalesce=True)
+
+    async def get_exchange_rate(self, symbol):
+        return await self.call(mt5_lib.get_exchange_rate, symbol=symbol, coalesce=True)
+
+    async def place_order(self, order_type, symbol, volume, stop_loss, take_profit, comment, direct=False,
+                          stop_price=0.00, fast_path=False, retry_budget=None, timeout=None):
+        return await self.call(mt5_lib.place_order, order_type=order_type, symbol=symbol, volume=volume,
+                               stop_loss=stop_loss, take_profit=take_profit, comment=comment, direct=direct,
+                               stop_price=stop_price, fast_path=fast_path, retry_budget=retry_budget,
+                               timeout=timeout)
+
+    async def cancel_order(self, order_number, timeout=None):
+        return await self.call(mt5_lib.cancel_order, order_number=order_number, timeout=timeout)
+
+    async def get_all_open_orders(self):
+        return await self.call(mt5_lib.get_all_open_orders, coalesce=True)
+
+    async def get_filtered_list_of_orders(self, symbol, comment):
+        orders = await self.call(mt5_lib.get_filtered_list_of_orders, symbol=symbol, comment=comment, coalesce=True)
+        return list(orders)
+
+    async def cancel_filtered_orders(self, symbol, comment, timeout=None):
+        return await self.call(mt5_lib.cancel_filtered_orders, symbol=symbol, comment=comment, timeout=timeout)
+
+    async def get_order_snapshot(self):
+        snapshot = await self.call(mt5_lib.get_order_snapshot, coalesce=True)
+        # Coalesced callers each get their own dictionary and lists
+        return {key: list(orders) for key, orders in snapshot.items()}
+
+    async def cancel_filtered_orders_for_symbols(self, symbols, comments, timeout=None):
+        return await self.call(mt5_lib.cancel_filtered_orders_for_symbols, symbols=symbols, comments=comments,
+                               timeout=timeout)
+
+    # Function to stop the terminal thread
+    def shutdown(self, wait=True):
+        """
+        Function to stop the terminal thread once queued requests have finished
+        :param wait: Boolean. Defaults to True. When True, blocks until the thread has stopped
+        :return: None
+        """
+        self.executor.shutdown(wait=wait)
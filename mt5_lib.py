@@ -1,8 +1,19 @@
+import collections
+import random
+import threading
+import time
+
 import MetaTrader5
+import numpy
 import pandas
 import datetime
 from dateutil.relativedelta import relativedelta
 
+import metrics
+
+# The MetaTrader5 module is not thread-safe. Every call into the terminal from the trading path holds this lock
+mt5_lock = threading.RLock()
+
 
 # Function to start MetaTrader 5
 def start_mt5(project_settings):
@@ -83,9 +94,10 @@ def enable_all_symbols(symbol_array):
     :param symbol_array: list of symbols.
     :return: Boolean. True if enabled, False if not.
     """
-    all_symbols = MetaTrader5.symbols_get()
-    print(f"Number of symbols supported: {len(all_symbols)}")
-    symbol_names = [symbol.name for symbol in all_symbols]
+    # Load every symbol once. The registry gives O(1) lookups by name
+    symbol_registry.load()
+    print(f"Number of symbols supported: {len(symbol_registry)}")
+    symbol_names = symbol_registry
 
     # Iterate through the list and enable
     for symbol in symbol_array:
@@ -97,34 +109,112 @@ def enable_all_symbols(symbol_array):
     return True
 
 
+# MetaTrader 5 constant of each timeframe string. D1, W1 and MN1 are aliases of daily, weekly and monthly
+TIMEFRAMES = {
+    'M1': MetaTrader5.TIMEFRAME_M1,
+    'M2': MetaTrader5.TIMEFRAME_M2,
+    'M3': MetaTrader5.TIMEFRAME_M3,
+    'M4': MetaTrader5.TIMEFRAME_M4,
+    'M5': MetaTrader5.TIMEFRAME_M5,
+    'M6': MetaTrader5.TIMEFRAME_M6,
+    'M10': MetaTrader5.TIMEFRAME_M10,
+    'M12': MetaTrader5.TIMEFRAME_M12,
+    'M15': MetaTrader5.TIMEFRAME_M15,
+    'M20': MetaTrader5.TIMEFRAME_M20,
+    'M30': MetaTrader5.TIMEFRAME_M30,
+    'H1': MetaTrader5.TIMEFRAME_H1,
+    'H2': MetaTrader5.TIMEFRAME_H2,
+    'H3': MetaTrader5.TIMEFRAME_H3,
+    'H4': MetaTrader5.TIMEFRAME_H4,
+    'H6': MetaTrader5.TIMEFRAME_H6,
+    'H8': MetaTrader5.TIMEFRAME_H8,
+    'H12': MetaTrader5.TIMEFRAME_H12,
+    'daily': MetaTrader5.TIMEFRAME_D1,
+    'D1': MetaTrader5.TIMEFRAME_D1,
+    'weekly': MetaTrader5.TIMEFRAME_W1,
+    'W1': MetaTrader5.TIMEFRAME_W1,
+    'monthly': MetaTrader5.TIMEFRAME_MN1,
+    'MN1': MetaTrader5.TIMEFRAME_MN1
+}
+
+
 # Function to convert a timeframe string into a MetaTrader 5 friendly format
 def set_query_timeframe(timeframe):
-    if timeframe == 'M1':
-        return MetaTrader5.TIMEFRAME_M1
-    elif timeframe == 'M15':
-        return MetaTrader5.TIMEFRAME_M15
-    elif timeframe == 'H1':
-        return MetaTrader5.TIMEFRAME_H1
-    elif timeframe == 'H4':
-        return MetaTrader5.TIMEFRAME_H4
-    elif timeframe == 'daily':
-        return MetaTrader5.TIMEFRAME_D1
-    elif timeframe == 'weekly':
-        return MetaTrader5.TIMEFRAME_W1
-    elif timeframe == 'monthly':
-        return MetaTrader5.TIMEFRAME_MN1
-    else:
-        raise ValueError
+    """
+    Function to convert a timeframe string into the MetaTrader 5 timeframe constant
+    :param timeframe: string of the timeframe (see TIMEFRAMES)
+    :return: MT5 timeframe constant
+    """
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    return TIMEFRAMES[timeframe]
+
+
+# Length of each timeframe in seconds. Weekly and monthly candles do not have a fixed alignment
+TIMEFRAME_SECONDS = {
+    'M1': 60,
+    'M2': 2 * 60,
+    'M3': 3 * 60,
+    'M4': 4 * 60,
+    'M5': 5 * 60,
+    'M6': 6 * 60,
+    'M10': 10 * 60,
+    'M12': 12 * 60,
+    'M15': 15 * 60,
+    'M20': 20 * 60,
+    'M30': 30 * 60,
+    'H1': 60 * 60,
+    'H2': 2 * 60 * 60,
+    'H3': 3 * 60 * 60,
+    'H4': 4 * 60 * 60,
+    'H6': 6 * 60 * 60,
+    'H8': 8 * 60 * 60,
+    'H12': 12 * 60 * 60,
+    'daily': 24 * 60 * 60,
+    'D1': 24 * 60 * 60
+}
+
+
+# Function to get the length of a timeframe in seconds
+def get_timeframe_seconds(timeframe):
+    """
+    Function to get the length of a timeframe in seconds
+    :param timeframe: string of the timeframe
+    :return: integer of seconds. None for timeframes without a fixed length (weekly, monthly)
+    """
+    return TIMEFRAME_SECONDS.get(timeframe)
+
+
+# Function to estimate the offset between the MT5 server clock and the local clock
+def get_server_time_offset(symbol):
+    """
+    Function to estimate the offset between the MT5 server clock (used for candle times) and the local clock, from the
+    time of the last tick. Rounded to 30 minutes, as server timezones are whole or half hours
+    :param symbol: string of the symbol
+    :return: integer of seconds to add to the local time to get the server time
+    """
+    with mt5_lock:
+        tick = MetaTrader5.symbol_info_tick(symbol)
+    if tick is None:
+        return 0
+    offset = int(round((tick.time - time.time()) / 1800) * 1800)
+    # A stale tick (market closed) gives a meaningless offset
+    if abs(offset) > 14 * 60 * 60:
+        return 0
+    return offset
 
 
 # Function to query historic candlestick data from MT5
-def get_candlesticks(symbol, timeframe, number_of_candles):
+def get_candlesticks(symbol, timeframe, number_of_candles, use_cache=True):
     """
     Function to retrieve a user-defined number of candles from MetaTrader 5. Initial upper range set to
     50,000 as more requires changes to MetaTrader 5 defaults.
     :param symbol: string of the symbol being retrieved
     :param timeframe: string of the timeframe being retrieved
-    :param number_of_candles: integer of number of candles to retrieve. Limited to 50,000
+    :param number_of_candles: integer of number of candles to retrieve. Limited to 50,000. Longer histories are paged
+    into the history store by backfill.py
+    :param use_cache: Boolean. Defaults to True. When True, candles already received are served from the candle cache
+    and only newer candles are requested from MT5
     :return: dataframe of the candlesticks
     """
     # Check that the number of candles is <= 50,000
@@ -132,8 +222,23 @@ def get_candlesticks(symbol, timeframe, number_of_candles):
         raise ValueError("No more than 50000 candles can be retrieved at this time")
     # Convert the timeframe into MT5 friendly format
     mt5_timeframe = set_query_timeframe(timeframe=timeframe)
+    if use_cache:
+        # Bring the cache up to date and take the most recent candles from it
+        with metrics.timed("fetch", symbol):
+            cache = update_candle_cache(
+                symbol=symbol,
+                timeframe=timeframe,
+                mt5_timeframe=mt5_timeframe,
+                number_of_candles=number_of_candles
+            )
+        candles, human_time = cache.tail(number_of_candles)
+        # Convert to a dataframe
+        dataframe = pandas.DataFrame(candles)
+        dataframe['human_time'] = human_time
+        return dataframe
     # Retrieve the data
-    candles = MetaTrader5.copy_rates_from_pos(symbol, mt5_timeframe, 1, number_of_candles)
+    with metrics.timed("fetch", symbol), mt5_lock:
+        candles = MetaTrader5.copy_rates_from_pos(symbol, mt5_timeframe, 1, number_of_candles)
     # Convert to a dataframe
     dataframe = pandas.DataFrame(candles)
     # Add a 'Human Time' column
@@ -141,6 +246,321 @@ def get_candlesticks(symbol, timeframe, number_of_candles):
     return dataframe
 
 
+# Function to query historic candlestick data from MT5 without building a dataframe
+def get_candle_array(symbol, timeframe, number_of_candles, use_cache=True):
+    """
+    Function to retrieve a user-defined number of candles from MetaTrader 5 as the structured array returned by MT5,
+    without building a dataframe. Limited to 50,000 candles, as get_candlesticks
+    :param symbol: string of the symbol being retrieved
+    :param timeframe: string of the timeframe being retrieved
+    :param number_of_candles: integer of number of candles to retrieve. Limited to 50,000
+    :param use_cache: Boolean. Defaults to True. When True, candles are served from the candle cache
+    :return: structured array of candles. With the cache this is a view on it, so copy it before the next call
+    """
+    if number_of_candles > 50000:
+        raise ValueError("No more than 50000 candles can be retrieved at this time")
+    mt5_timeframe = set_query_timeframe(timeframe=timeframe)
+    if use_cache:
+        with metrics.timed("fetch", symbol):
+            cache = update_candle_cache(
+                symbol=symbol,
+                timeframe=timeframe,
+                mt5_timeframe=mt5_timeframe,
+                number_of_candles=number_of_candles
+            )
+        candles, _ = cache.tail(number_of_candles)
+        return candles
+    with metrics.timed("fetch", symbol), mt5_lock:
+        return MetaTrader5.copy_rates_from_pos(symbol, mt5_timeframe, 1, number_of_candles)
+
+
+# Class to hold the candles already received for a symbol and timeframe
+class CandleCache:
+    """
+    Candles already received from MT5 for one symbol and timeframe, oldest first. Rows are kept in a preallocated
+    buffer of twice the window size. Once the buffer is full, the most recent max_candles rows are moved back to the
+    start, so memory stays bounded and appending costs O(1) on average
+    """
+
+    def __init__(self, max_candles):
+        """
+        :param max_candles: integer of the maximum number of candles kept
+        """
+        self.max_candles = max_candles
+        self.candles = None
+        self.human_time = None
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    # Function to get the time of the most recent cached candle
+    def last_time(self):
+        """
+        Function to get the time of the most recent cached candle
+        :return: integer of the candle time, None if the cache is empty
+        """
+        if len(self) == 0:
+            return None
+        return self.candles['time'][self.end - 1]
+
+    # Function to get the most recent cached candles
+    def tail(self, number_of_candles):
+        """
+        Function to get the most recent cached candles
+        :param number_of_candles: integer of the number of candles
+        :return: tuple of (structured array of candles, array of human times). Both are views on the cache
+        """
+        if self.candles is None:
+            return numpy.empty(0), numpy.empty(0, dtype='datetime64[ns]')
+        start = max(self.start, self.end - number_of_candles)
+        return self.candles[start:self.end], self.human_time[start:self.end]
+
+    # Function to replace the cached candles
+    def replace(self, candles):
+        """
+        Function to replace the content of the cache with a fresh set of candles
+        :param candles: structured array of candles as returned by MT5
+        :return: None
+        """
+        self.max_candles = max(self.max_candles, len(candles))
+        self.candles = numpy.empty(self.max_candles * 2, dtype=candles.dtype)
+        self.human_time = numpy.empty(self.max_candles * 2, dtype='datetime64[ns]')
+        self.start = 0
+        self.end = 0
+        self.append(candles)
+
+    # Function to append new candles to the cache
+    def append(self, candles):
+        """
+        Function to append candles newer than the most recent cached candle. The oldest candles are evicted once more
+        than max_candles are held
+        :param candles: structured array of candles as returned by MT5
+        :return: None
+        """
+        if len(candles) == 0:
+            return
+        candles = candles[-self.max_candles:]
+        # Move the most recent candles back to the start of the buffer if there is no room left
+        if self.end + len(candles) > len(self.candles):
+            keep = min(len(self), self.max_candles - len(candles))
+            self.candles[:keep] = self.candles[self.end - keep:self.end]
+            self.human_time[:keep] = self.human_time[self.end - keep:self.end]
+            self.start = 0
+            self.end = keep
+        self.candles[self.end:self.end + len(candles)] = candles
+        self.human_time[self.end:self.end + len(candles)] = pandas.to_datetime(candles['time'], unit='s')
+        self.end += len(candles)
+        self.start = max(self.start, self.end - self.max_candles)
+
+
+# Candle caches per (symbol, timeframe)
+candle_cache = {}
+
+
+# Function to bring the candle cache of a symbol up to date
+def update_candle_cache(symbol, timeframe, mt5_timeframe, number_of_candles):
+    """
+    Function to bring the candle cache of a symbol and timeframe up to date. Only candles newer than the most recent
+    cached candle are requested from MT5, starting with a small window which grows until it overlaps the cache. If the
+    overlapping candle no longer matches the cache, history has been rewritten and the cache is refilled
+    :param symbol: string of the symbol being retrieved
+    :param timeframe: string of the timeframe being retrieved
+    :param mt5_timeframe: MT5 timeframe constant
+    :param number_of_candles: integer of the number of candles needed from the cache
+    :return: CandleCache
+    """
+    key = (symbol, timeframe)
+    cache = candle_cache.get(key)
+    if cache is None:
+        cache = CandleCache(max_candles=number_of_candles)
+        candle_cache[key] = cache
+    # A full fetch is needed if the cache is empty or holds too few candles
+    if len(cache) == 0 or number_of_candles > cache.max_candles:
+        with mt5_lock:
+            candles = MetaTrader5.copy_rates_from_pos(symbol, mt5_timeframe, 1, number_of_candles)
+        if candles is not None:
+            cache.replace(candles)
+        return cache
+    last_time = cache.last_time()
+    fetch_size = 2
+    while True:
+        with mt5_lock:
+            candles = MetaTrader5.copy_rates_from_pos(symbol, mt5_timeframe, 1, fetch_size)
+        # Keep the cache as is if MT5 returns nothing
+        if candles is None or len(candles) == 0:
+            return cache
+        # The window overlaps the cache, so every newer candle has been received
+        if candles['time'][0] <= last_time:
+            overlap = numpy.flatnonzero(candles['time'] == last_time)
+            if len(overlap) == 0:
+                # History has been rewritten
+                break
+            overlap_size = min(overlap[-1] + 1, len(cache))
+            cached_candles, _ = cache.tail(overlap_size)
+            if not numpy.array_equal(candles[overlap[-1] + 1 - overlap_size:overlap[-1] + 1], cached_candles):
+                # History has been rewritten
+                break
+            cache.append(candles[overlap[-1] + 1:])
+            return cache
+        # The gap is larger than the window. Grow it, up to a full fetch
+        if fetch_size >= number_of_candles:
+            break
+        fetch_size = min(fetch_size * 8, number_of_candles)
+    # Refill the cache
+    with mt5_lock:
+        candles = MetaTrader5.copy_rates_from_pos(symbol, mt5_timeframe, 1, max(number_of_candles, len(cache)))
+    if candles is not None:
+        cache.replace(candles)
+    return cache
+
+
+# Function to invalidate the candle cache
+def invalidate_candle_cache(symbol=None, timeframe=None):
+    """
+    Function to invalidate the candle cache, for example when history has been rewritten by the broker. The next call
+    to get_candlesticks refetches the full window
+    :param symbol: string of the symbol to invalidate. Defaults to None (all symbols)
+    :param timeframe: string of the timeframe to invalidate. Defaults to None (all timeframes)
+    :return: None
+    """
+    for key in list(candle_cache.keys()):
+        if (symbol is None or key[0] == symbol) and (timeframe is None or key[1] == timeframe):
+            del candle_cache[key]
+
+
+# Class to hold the metadata of every symbol
+class SymbolRegistry:
+    """
+    Symbol metadata loaded once from MT5. Static fields (tick size, contract size, currencies, volume limits, ...) are
+    served from memory, indexed by name, and also kept as numpy arrays for vectorized lookups over many symbols.
+    Volatile fields (bid, ask) are refreshed from MT5 once they are older than the TTL
+    """
+
+    # Numeric fields kept as numpy arrays
+    ARRAY_FIELDS = ['trade_tick_size', 'trade_tick_value', 'trade_contract_size', 'point', 'digits', 'volume_min',
+                    'volume_max', 'volume_step', 'trade_stops_level']
+
+    def __init__(self, quote_ttl=1.0):
+        """
+        :param quote_ttl: float of seconds before bid/ask are refreshed
+        """
+        self.quote_ttl = quote_ttl
+        # Guards index and arrays, as symbols are added lazily from the worker threads of run_strategy
+        self.lock = threading.Lock()
+        self.symbols = {}
+        self.index = {}
+        self.arrays = {field: numpy.empty(0) for field in self.ARRAY_FIELDS}
+        self.quotes = {}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+    # Function to load every symbol from MT5
+    def load(self):
+        """
+        Function to load the metadata of every symbol from MT5 in a single call. Replaces anything already loaded
+        :return: None
+        """
+        with mt5_lock:
+            all_symbols = MetaTrader5.symbols_get()
+        all_symbols = all_symbols or ()
+        symbols = {symbol.name: symbol for symbol in all_symbols}
+        arrays = {
+            field: numpy.array([getattr(symbol, field) for symbol in symbols.values()], dtype=numpy.float64)
+            for field in self.ARRAY_FIELDS
+        }
+        with self.lock:
+            self.symbols = symbols
+            self.index = {name: i for i, name in enumerate(symbols)}
+            self.arrays = arrays
+            self.quotes = {}
+
+    # Function to add a symbol which was not loaded
+    def add(self, symbol):
+        """
+        Function to fetch and add a single symbol, for example one listed by the broker after load()
+        :param symbol: string of the symbol
+        :return: symbol info, None if MT5 does not know the symbol
+        """
+        with mt5_lock:
+            symbol_info = MetaTrader5.symbol_info(symbol)
+        if symbol_info is None:
+            return None
+        with self.lock:
+            if symbol not in self.index:
+                self.index[symbol] = len(self.index)
+                for field in self.ARRAY_FIELDS:
+                    self.arrays[field] = numpy.append(self.arrays[field], float(getattr(symbol_info, field)))
+            else:
+                for field in self.ARRAY_FIELDS:
+                    self.arrays[field][self.index[symbol]] = getattr(symbol_info, field)
+            self.symbols[symbol] = symbol_info
+        return symbol_info
+
+    # Function to get the static metadata of a symbol
+    def get_info(self, symbol):
+        """
+        Function to get the metadata of a symbol. Only fetched from MT5 if it has not been loaded
+        :param symbol: string of the symbol
+        :return: symbol info. Use get_quote() for current bid/ask
+        """
+        symbol_info = self.symbols.get(symbol)
+        if symbol_info is None:
+            symbol_info = self.add(symbol)
+        return symbol_info
+
+    # Function to get a numeric field for several symbols
+    def get_field(self, symbols, field):
+        """
+        Function to get a numeric field for a list of symbols as a numpy array
+        :param symbols: list of symbols
+        :param field: string of the field, one of ARRAY_FIELDS
+        :return: numpy array of the field, in the order of symbols. NaN for symbols MT5 does not know
+        """
+        for symbol in symbols:
+            if symbol not in self.index:
+                self.add(symbol)
+        with self.lock:
+            if all(symbol in self.index for symbol in symbols):
+                return self.arrays[field][[self.index[symbol] for symbol in symbols]]
+            values = numpy.full(len(symbols), numpy.nan)
+            rows = [row for row, symbol in enumerate(symbols) if symbol in self.index]
+            values[rows] = self.arrays[field][[self.index[symbols[row]] for row in rows]]
+        return values
+
+    # Function to get the current bid and ask of a symbol
+    def get_quote(self, symbol, refresh=False):
+        """
+        Function to get the current bid and ask of a symbol. Refreshed from MT5 when older than the TTL
+        :param symbol: string of the symbol
+        :param refresh: Boolean. Defaults to False. When True, always fetches a fresh tick from MT5
+        :return: tuple of (bid, ask). (NaN, NaN) if MT5 has neither a tick nor metadata for the symbol
+        """
+        quote = self.quotes.get(symbol)
+        now = time.monotonic()
+        if refresh or quote is None or now - quote[0] > self.quote_ttl:
+            with mt5_lock:
+                tick = MetaTrader5.symbol_info_tick(symbol)
+            if tick is None:
+                # Fall back to the loaded metadata
+                symbol_info = self.get_info(symbol)
+                if symbol_info is None:
+                    return float('nan'), float('nan')
+                return symbol_info.bid, symbol_info.ask
+            quote = (now, tick.bid, tick.ask)
+            self.quotes[symbol] = quote
+        return quote[1], quote[2]
+
+
+# Symbol metadata shared by the whole bot
+symbol_registry = SymbolRegistry()
+
+
 # Function to retrieve the pip_size of a symbol from MT5
 def get_pip_size(symbol):
     """
@@ -149,7 +569,7 @@ def get_pip_size(symbol):
     :return: float of the pip size
     """
     # Get the symbol information
-    symbol_info = MetaTrader5.symbol_info(symbol)
+    symbol_info = symbol_registry.get_info(symbol)
     tick_size = symbol_info.trade_tick_size
     pip_size = tick_size * 10
     # Return the pip size
@@ -164,7 +584,7 @@ def get_base_currency(symbol):
     :return: string of the base currency
     """
     # Get the symbol information
-    symbol_info = MetaTrader5.symbol_info(symbol)
+    symbol_info = symbol_registry.get_info(symbol)
     # Return the base currency
     return symbol_info.currency_base
 
@@ -174,20 +594,334 @@ def get_exchange_rate(symbol):
     """
     Function to retrieve the exchange rate of a symbol from MetaTrader 5
     :param symbol: string of the symbol to be queried
-    :return: float of the exchange rate
+    :return: float of the exchange rate. NaN if there is no quote for the symbol
     """
-    # Get the symbol information
-    symbol_info = MetaTrader5.symbol_info(symbol)
+    # Get the current quote
+    bid, ask = symbol_registry.get_quote(symbol)
     # Return the exchange rate
-    return symbol_info.bid
+    return bid
+
+
+# Calculation modes of FOREX symbols
+FOREX_CALC_MODES = (MetaTrader5.SYMBOL_CALC_MODE_FOREX, MetaTrader5.SYMBOL_CALC_MODE_FOREX_NO_LEVERAGE)
+
+
+# Function to check whether a symbol is a FOREX pair
+def is_forex_symbol(symbol):
+    """
+    Function to check whether a symbol is a FOREX pair, from its calculation mode in MetaTrader 5. Symbols MT5 does not
+    know (i.e. when backtesting offline) are judged by name: six letters, ignoring any suffix (i.e. '.a' for raw)
+    :param symbol: string of the symbol to be queried
+    :return: Boolean. True for a FOREX pair
+    """
+    symbol_info = symbol_registry.get_info(symbol)
+    if symbol_info is None:
+        name = symbol.split(".")[0]
+        return len(name) == 6 and name.isalpha()
+    return symbol_info.trade_calc_mode in FOREX_CALC_MODES
+
 
+# Currency of the trading account, set by get_account_currency()
+account_currency = None
+
+
+# Function to retrieve the currency of the trading account
+def get_account_currency():
+    """
+    Function to retrieve the currency of the trading account from MetaTrader 5. Retrieved once, then served from memory
+    :return: string of the account currency. None if the terminal returned no account information (retried next call)
+    """
+    global account_currency
+    if account_currency is None:
+        with mt5_lock:
+            account_info = MetaTrader5.account_info()
+        if account_info is None:
+            print(f"Unable to retrieve the account currency. Error: {MetaTrader5.last_error()}")
+            return None
+        account_currency = account_info.currency
+    return account_currency
+
+
+# Function to retrieve the rate converting a currency into the account currency
+def get_conversion_rate(currency, account_currency, symbol_suffix=""):
+    """
+    Function to find the rate converting an amount in currency into the account currency, from the current quote of
+    the cross rate symbol (e.g. JPY -> USD uses 1 / USDJPY)
+    :param currency: string of the currency to convert from
+    :param account_currency: string of the account currency
+    :param symbol_suffix: string of any denotation the broker adds to symbol names (i.e. '.a' for raw)
+    :return: float of the rate. NaN if no cross rate symbol exists
+    """
+    if currency == account_currency:
+        return 1.00
+    for suffix in dict.fromkeys([symbol_suffix, ""]):
+        direct_symbol = f"{currency}{account_currency}{suffix}"
+        if direct_symbol in symbol_registry:
+            bid, ask = symbol_registry.get_quote(direct_symbol)
+            return bid
+        inverse_symbol = f"{account_currency}{currency}{suffix}"
+        if inverse_symbol in symbol_registry:
+            bid, ask = symbol_registry.get_quote(inverse_symbol)
+            return 1 / bid if bid > 0 else float('nan')
+    return float('nan')
+
+
+# Function to retrieve the metadata needed to size trades
+def get_sizing_metadata(symbols, account_currency=None):
+    """
+    Function to retrieve the metadata needed by helper_functions.calc_lot_sizes for a list of symbols
+    :param symbols: list of symbols
+    :param account_currency: string of the account currency. Defaults to None (retrieved from MT5)
+    :return: dictionary of numpy arrays: contract_size, quote_to_account, volume_step, volume_min, volume_max. Symbols
+    MT5 does not know get NaN in every array, and quote_to_account is NaN for every symbol if the account currency is
+    unknown
+    """
+    if account_currency is None:
+        account_currency = get_account_currency()
+    quote_to_account = []
+    for symbol in symbols:
+        symbol_info = symbol_registry.get_info(symbol)
+        if symbol_info is None or account_currency is None:
+            quote_to_account.append(float('nan'))
+            continue
+        symbol_suffix = symbol[len(symbol.split(".")[0]):]
+        quote_to_account.append(get_conversion_rate(
+            currency=symbol_info.currency_profit,
+            account_currency=account_currency,
+            symbol_suffix=symbol_suffix
+        ))
+    return {
+        'contract_size': symbol_registry.get_field(symbols, 'trade_contract_size'),
+        'quote_to_account': numpy.array(quote_to_account, dtype=numpy.float64),
+        'volume_step': symbol_registry.get_field(symbols, 'volume_step'),
+        'volume_min': symbol_registry.get_field(symbols, 'volume_min'),
+        'volume_max': symbol_registry.get_field(symbols, 'volume_max')
+    }
+
+
+# MT5 return codes used by the order functions
+RETCODE_CHECK_OK = 0
+RETCODE_DONE = 10009
+RETCODE_INVALID_VOLUME = 10014
+RETCODE_INVALID_PRICE = 10015
+RETCODE_INVALID_STOPS = 10016
+RETCODE_CLIENT_DISABLES_AT = 10027
+RETCODE_REQUOTE = 10004
+RETCODE_REQUEST_ERROR = 10011
+RETCODE_TIMEOUT = 10012
+RETCODE_PRICE_CHANGED = 10020
+RETCODE_PRICE_OFF = 10021
+RETCODE_TOO_MANY_REQUESTS = 10024
+RETCODE_CONNECTION = 10031
+# Return codes an order is retried on. The price ones are resent at a price from a fresh tick, the others as they were.
+# A missing result (terminal busy or not responding) is retried as well
+REPRICE_RETCODES = {
+    RETCODE_REQUOTE: "requote",
+    RETCODE_INVALID_PRICE: "invalid_price",
+    RETCODE_PRICE_CHANGED: "price_changed",
+    RETCODE_PRICE_OFF: "off_quotes"
+}
+TRANSIENT_RETCODES = {
+    None: "no_response",
+    RETCODE_REQUEST_ERROR: "request_error",
+    RETCODE_TIMEOUT: "timeout",
+    RETCODE_TOO_MANY_REQUESTS: "too_many_requests",
+    RETCODE_CONNECTION: "no_connection"
+}
+# Outcomes of a send which may have reached the server anyway. The order is only resent once it is not found open
+UNCONFIRMED_RETCODES = (None, RETCODE_TIMEOUT)
+# Seconds an order (or a batch of cancellations) may spend retrying, the first backoff, and the furthest in ticks a
+# stop price may be moved by repricing
+ORDER_RETRY_BUDGET = 0.5
+RETRY_BACKOFF = 0.02
+MAX_REPRICE_TICKS = 20
+# The fast path only trusts the local price check when the stop price is at least this many ticks past the stops
+# level. Closer than that, the cached quote may be stale, so the terminal checks the order
+FAST_PATH_MARGIN_TICKS = 10
+
+
+# Outcome of an order request
+class OrderResult(collections.namedtuple('OrderResult', [
+    'retcode', 'order', 'symbol', 'volume', 'price', 'stop_loss', 'take_profit', 'comment', 'checked', 'message',
+    'attempts'
+], defaults=(1,))):
+    """
+    Outcome of an order request. Truthy when the order was placed. checked is True when the terminal ran order_check.
+    attempts is the number of times the request was sent. Prices are the ones of the last attempt
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return self.retcode == RETCODE_DONE
+
+
+# Function to round a price to the tick size of a symbol
+def normalize_price(price, symbol_info):
+    """
+    Function to round a price to the tick size and digits of a symbol
+    :param price: float of the price
+    :param symbol_info: symbol info from the symbol registry. None rounds to 4 decimal places
+    :return: float of the price
+    """
+    price = float(price)
+    if symbol_info is None:
+        return round(price, 4)
+    tick_size = symbol_info.trade_tick_size or symbol_info.point
+    if tick_size > 0:
+        price = round(price / tick_size) * tick_size
+    return round(price, symbol_info.digits)
+
+
+# Function to round many prices to the tick size of a symbol
+def normalize_prices(prices, symbol_info):
+    """
+    Function to round an array of prices to the tick size and digits of a symbol. Same rounding as normalize_price
+    :param prices: numpy array of prices
+    :param symbol_info: symbol info from the symbol registry. None rounds to 4 decimal places
+    :return: numpy array of the prices
+    """
+    prices = numpy.asarray(prices, dtype=numpy.float64)
+    if symbol_info is None:
+        return numpy.round(prices, 4)
+    tick_size = symbol_info.trade_tick_size or symbol_info.point
+    if tick_size > 0:
+        prices = numpy.round(prices / tick_size) * tick_size
+    return numpy.round(prices, symbol_info.digits)
+
+
+# Function to round a volume to the volume step of a symbol
+def normalize_volume(volume, symbol_info):
+    """
+    Function to round a volume to the volume step of a symbol
+    :param volume: float of the volume
+    :param symbol_info: symbol info from the symbol registry. None rounds to 2 decimal places
+    :return: float of the volume
+    """
+    volume = float(volume)
+    if symbol_info is None or symbol_info.volume_step <= 0:
+        return round(volume, 2)
+    return round(round(volume / symbol_info.volume_step) * symbol_info.volume_step, 8)
+
+
+# Function to validate an order request against the cached symbol constraints
+def validate_order(request):
+    """
+    Function to validate a pending order request locally, against the symbol constraints held by the symbol registry
+    and the latest quote: volume limits and step, stops level, and the side of the market the stop price is on
+    :param request: dictionary of the order request
+    :return: tuple of (retcode, message, conclusive). retcode is 0 when the request is valid. conclusive is False when
+    the terminal should still check the request
+    """
+    symbol = request['symbol']
+    symbol_info = symbol_registry.get_info(symbol)
+    if symbol_info is None:
+        return RETCODE_CHECK_OK, f"{symbol} is not in the symbol registry", False
+    # Volume
+    volume = request['volume']
+    steps = volume / symbol_info.volume_step if symbol_info.volume_step > 0 else 0
+    if volume < symbol_info.volume_min or volume > symbol_info.volume_max or abs(steps - round(steps)) > 1e-6:
+        return RETCODE_INVALID_VOLUME, f"Volume {volume} is outside {symbol_info.volume_min} - " \
+                                       f"{symbol_info.volume_max} or not a multiple of {symbol_info.volume_step}", True
+    # Stop loss and take profit must be on the right side of the stop price, past the stops level
+    price = request['price']
+    stops_distance = symbol_info.trade_stops_level * symbol_info.point
+    stop_loss = request['sl']
+    take_profit = request['tp']
+    if request['type'] == MetaTrader5.ORDER_TYPE_BUY_STOP:
+        direction = 1
+    else:
+        direction = -1
+    if (stop_loss > 0 and (price - stop_loss) * direction < stops_distance) \
+            or (take_profit > 0 and (take_profit - price) * direction < stops_distance):
+        return RETCODE_INVALID_STOPS, f"Stop loss {stop_loss} or take profit {take_profit} is within " \
+                                      f"{stops_distance} of the stop price {price}", True
+    # A buy stop must be above the ask and a sell stop below the bid, past the stops level
+    bid, ask = symbol_registry.get_quote(symbol)
+    if numpy.isnan(bid) or numpy.isnan(ask):
+        # No quote to check against, leave it to the terminal
+        return RETCODE_CHECK_OK, f"No quote for {symbol}", False
+    distance = price - ask if direction == 1 else bid - price
+    if distance < stops_distance:
+        # Stale quotes are possible, so only report the price as invalid once the terminal agrees
+        return RETCODE_CHECK_OK, f"Stop price {price} is within {stops_distance} of the market", False
+    margin = FAST_PATH_MARGIN_TICKS * (symbol_info.trade_tick_size or symbol_info.point)
+    return RETCODE_CHECK_OK, "", distance >= stops_distance + margin
+
+
+# Function to classify an MT5 return code
+def classify_retcode(retcode):
+    """
+    Function to classify the return code of an order request
+    :param retcode: integer of the MT5 return code. None if the terminal returned no result
+    :return: string. done, reprice (resend at a fresh price), retry (resend as is) or fatal
+    """
+    if retcode == RETCODE_DONE:
+        return "done"
+    if retcode in REPRICE_RETCODES:
+        return "reprice"
+    if retcode in TRANSIENT_RETCODES:
+        return "retry"
+    return "fatal"
+
+
+# Function to get the wait before the next retry
+def get_retry_delay(attempt, backoff=RETRY_BACKOFF):
+    """
+    Function to get the wait before the next retry. The wait doubles with each attempt and is jittered between half
+    and all of it, so bots hitting the same busy server do not retry in lockstep
+    :param attempt: integer of the number of attempts made so far
+    :param backoff: float of the first wait in seconds
+    :return: float of seconds
+    """
+    delay = backoff * 2 ** (attempt - 1)
+    return random.uniform(delay / 2, delay)
+
+
+# Function to move the price of a pending order back past the market
+def reprice_request(request, max_reprice_ticks=MAX_REPRICE_TICKS):
+    """
+    Function to move the stop price of a pending order request past a fresh quote and the stops level, after the
+    market moved through it. The stop loss and take profit move by the same amount, so the risk the volume was sized
+    for is unchanged
+    :param request: dictionary of the order request
+    :param max_reprice_ticks: integer of the furthest the stop price may move, in ticks
+    :return: dictionary of the repriced request. None if there is no quote or the price would move more than
+    max_reprice_ticks
+    """
+    symbol = request['symbol']
+    symbol_info = symbol_registry.get_info(symbol)
+    if symbol_info is None:
+        return None
+    tick_size = symbol_info.trade_tick_size or symbol_info.point
+    stops_distance = symbol_info.trade_stops_level * symbol_info.point
+    bid, ask = symbol_registry.get_quote(symbol, refresh=True)
+    if numpy.isnan(bid) or numpy.isnan(ask):
+        return None
+    price = request['price']
+    if request['type'] == MetaTrader5.ORDER_TYPE_BUY_STOP:
+        new_price = max(price, ask + stops_distance + tick_size)
+    else:
+        new_price = min(price, bid - stops_distance - tick_size)
+    new_price = normalize_price(new_price, symbol_info)
+    shift = new_price - price
+    if abs(shift) > max_reprice_ticks * tick_size:
+        return None
+    repriced = dict(request)
+    repriced['price'] = new_price
+    if request['sl'] > 0:
+        repriced['sl'] = normalize_price(request['sl'] + shift, symbol_info)
+    if request['tp'] > 0:
+        repriced['tp'] = normalize_price(request['tp'] + shift, symbol_info)
+    return repriced
 
 
 # Function to place an order on MT5
-def place_order(order_type, symbol, volume, stop_loss, take_profit, comment, direct=False, stop_price=0.00):
+def place_order(order_type, symbol, volume, stop_loss, take_profit, comment, direct=False, stop_price=0.00,
+                fast_path=False, retry_budget=None):
     """
     Function to place a trade on MetaTrader 5. Function checks the order first, as recommended by most traders. If it
-    passes the check, proceeds to place order
+    passes the check, proceeds to place order. Prices are rounded to the tick size of the symbol and the volume to its
+    volume step
     :param order_type: String. Options are SELL_STOP, BUY_STOP
     :param symbol: String of the symbol to be traded
     :param volume: String or Float of the volume to be purchased
@@ -196,21 +930,20 @@ def place_order(order_type, symbol, volume, stop_loss, take_profit, comment, dir
     :param comment: String of a comment.
     :param direct: Boolean. Defaults to False. When true, bypasses the trade check
     :param stop_price: String or Float of the Stop Price
-    :return: Trade Outcome
+    :param fast_path: Boolean. Defaults to False. When True, the order is validated locally against the cached symbol
+    constraints first. The terminal check is skipped when the local validation is conclusive
+    :param retry_budget: float of seconds the order may spend being retried. Defaults to None (ORDER_RETRY_BUDGET)
+    :return: OrderResult. Truthy if the order was placed
     """
-    # Massage the volume, stop_loss, take_profit and stop_prices
-    # Volume can only be up to 2 decimal places on MT5
-    volume = float(volume)
-    volume = round(volume, 2)
-    # Stop Loss should be a float, no more than 4 decimal places
-    stop_loss = float(stop_loss)
-    stop_loss = round(stop_loss, 4)
-    # Take Profit should be a float, no more than 4 decimal places
-    take_profit = float(take_profit)
-    take_profit = round(take_profit, 4)
-    # Stop Price should be a float, no more than 4 decimal places
-    stop_price = float(stop_price)
-    stop_price = round(stop_price, 4)
+    if retry_budget is None:
+        retry_budget = ORDER_RETRY_BUDGET
+    deadline = time.monotonic() + retry_budget
+    # Round the volume and prices to what the symbol accepts
+    symbol_info = symbol_registry.get_info(symbol)
+    volume = normalize_volume(volume, symbol_info)
+    stop_loss = normalize_price(stop_loss, symbol_info)
+    take_profit = normalize_price(take_profit, symbol_info)
+    stop_price = normalize_price(stop_price, symbol_info)
     # Set up the order request dictionary. This will be sent to MT5
     request = {
         "symbol": symbol,
@@ -247,46 +980,164 @@ def place_order(order_type, symbol, volume, stop_loss, take_profit, comment, dir
         # This function can be expanded to accept all different types of values for buying/selling
         raise ValueError(f"Incorrect value for Order Type: {order_type}")
 
-    # If direct is True, go straight to adding the order
-    if direct is True:
-        # Send the order to MT5
-        order_result = MetaTrader5.order_send(request)
-        # Notify based on the return outcomes
-        if order_result[0] == 10009:
-            print(f"Order for {symbol} successful")
-            return order_result[2]
-        # Notify the user if AutoTrading has been left on in MetaTrader 5
-        elif order_result[0] == 10027:
-            print("Turn off Algo Trading on MT5 Terminal")
-            raise Exception("Turn off Algo Trading on MT5 Terminal")
-        else:
-            # General catch all statement
-            print(f"Error placing order. Error Code {order_result[0]}, Error Details: {order_result}")
-            raise Exception("An error occurred placing an order")
+    # Validate locally, and skip the terminal check when the outcome is certain
+    if fast_path and not direct:
+        with metrics.timed("validate_order", symbol):
+            retcode, message, conclusive = validate_order(request)
+        if retcode != RETCODE_CHECK_OK:
+            print(f"Order for {symbol} rejected. {message}")
+            return make_order_result(request=request, retcode=retcode, checked=False, message=message)
+        direct = conclusive
     # If direct turned off, check the order first
-    else:
+    if not direct:
         # Check the order
-        result = MetaTrader5.order_check(request)
-        # If check passes, place an order
-        if result[0] == 0:
-            print(f"Order check for {symbol} successful. Placing the order") #<- This can be commented out.
-            # Place the order (little bit of recursion)
-            place_order(
-                order_type=order_type,
-                symbol=symbol,
-                volume=volume,
-                stop_price=stop_price,
-                stop_loss=stop_loss,
-                take_profit=take_profit,
-                comment=comment,
-                direct=True
-            )
-        # Let the user know if an invalid price has been passed
-        elif result[0] == 100015:
-            print(f"Invalid price passed for {symbol}")
+        with metrics.timed("order_check", symbol), mt5_lock:
+            result = MetaTrader5.order_check(request)
+        retcode = result[0] if result is not None else None
+        # If the market has moved through the stop price, move the price back past it
+        if retcode in REPRICE_RETCODES:
+            print(f"Invalid price passed for {symbol}. Repricing from a fresh quote")
+            repriced = reprice_request(request=request)
+            if repriced is None:
+                print(f"Price of {symbol} has moved more than {MAX_REPRICE_TICKS} ticks. Order not placed")
+                return make_order_result(request=request, retcode=retcode, checked=True, message=str(result))
+            metrics.increment(f"order_retry_{REPRICE_RETCODES[retcode]}", symbol)
+            request = repriced
         # Let user know if any other errors occurred
-        else:
+        elif retcode != RETCODE_CHECK_OK:
             print(f"Order check failed. Details: {result}")
+            return make_order_result(request=request, retcode=retcode, checked=True, message=str(result))
+        else:
+            print(f"Order check for {symbol} successful. Placing the order") #<- This can be commented out.
+    # Send the order to MT5
+    return send_order(request=request, checked=not direct, deadline=deadline)
+
+
+# Function to send an order request to MT5
+def send_order(request, checked=False, deadline=None):
+    """
+    Function to send an order request to MetaTrader 5. Requotes and prices the market has moved through are resent
+    at a price from a fresh tick, and transient errors (timeouts, too many requests, no connection) are resent as they
+    were, with a jittered backoff, until the order is placed or the deadline passes. After a timeout or no response,
+    the first send may still have placed the order, so it is only resent once no matching order is found open
+    :param request: dictionary of the order request
+    :param checked: Boolean. True if the terminal checked the request first
+    :param deadline: float of the time.monotonic() after which no more attempts are made. Defaults to None
+    (ORDER_RETRY_BUDGET from now)
+    :return: OrderResult. Truthy if the order was placed
+    """
+    symbol = request['symbol']
+    if deadline is None:
+        deadline = time.monotonic() + ORDER_RETRY_BUDGET
+    start_time = time.perf_counter()
+    attempt = 0
+    unconfirmed = False
+    try:
+        while True:
+            attempt += 1
+            placed = find_placed_order(request=request) if unconfirmed else 0
+            if placed:
+                print(f"Order for {symbol} was placed by an earlier attempt")
+                return make_order_result(request=request, retcode=RETCODE_DONE, order=placed, checked=checked,
+                                         attempts=attempt - 1)
+            if placed is None:
+                # Open orders could not be listed, so a resend could duplicate the order. Look again after the backoff
+                order_result = None
+            else:
+                with metrics.timed("order_send", symbol), mt5_lock:
+                    order_result = MetaTrader5.order_send(request)
+            retcode = order_result[0] if order_result is not None else None
+            unconfirmed = retcode in UNCONFIRMED_RETCODES
+            outcome = classify_retcode(retcode)
+            # Notify based on the return outcomes
+            if outcome == "done":
+                print(f"Order for {symbol} successful")
+                return make_order_result(request=request, retcode=retcode, order=order_result[2], checked=checked,
+                                         attempts=attempt)
+            # Notify the user if AutoTrading has been left on in MetaTrader 5
+            elif retcode == RETCODE_CLIENT_DISABLES_AT:
+                print("Turn off Algo Trading on MT5 Terminal")
+                raise Exception("Turn off Algo Trading on MT5 Terminal")
+            elif outcome == "fatal":
+                # General catch all statement
+                print(f"Error placing order. Error Code {retcode}, Error Details: {order_result}")
+                return make_order_result(request=request, retcode=retcode, checked=checked,
+                                         message=str(order_result), attempts=attempt)
+            # Retry if the wait still leaves time before the deadline
+            reason = REPRICE_RETCODES.get(retcode) or TRANSIENT_RETCODES[retcode]
+            delay = get_retry_delay(attempt=attempt)
+            if time.monotonic() + delay >= deadline:
+                placed = find_placed_order(request=request) if unconfirmed else 0
+                if placed:
+                    print(f"Order for {symbol} was placed by an earlier attempt")
+                    return make_order_result(request=request, retcode=RETCODE_DONE, order=placed, checked=checked,
+                                             attempts=attempt)
+                print(f"Order for {symbol} not placed after {attempt} attempts. Last error: {reason}")
+                metrics.increment("order_retry_exhausted", symbol)
+                return make_order_result(request=request, retcode=retcode, checked=checked,
+                                         message=str(order_result), attempts=attempt)
+            metrics.increment(f"order_retry_{reason}", symbol)
+            time.sleep(delay)
+            if outcome == "reprice":
+                repriced = reprice_request(request=request)
+                if repriced is None:
+                    print(f"Price of {symbol} has moved more than {MAX_REPRICE_TICKS} ticks. Order not placed")
+                    return make_order_result(request=request, retcode=retcode, checked=checked,
+                                             message=str(order_result), attempts=attempt)
+                request = repriced
+    finally:
+        # Time spent on orders which needed more than one attempt
+        if attempt > 1:
+            metrics.observe(stage="order_retry", symbol=symbol, seconds=time.perf_counter() - start_time)
+
+
+# Function to find an order placed by a send which got no answer
+def find_placed_order(request):
+    """
+    Function to look for an open order matching a pending order request (same symbol, comment, type and price), after
+    a send which timed out or got no response, as the server may have placed the order anyway
+    :param request: dictionary of the order request
+    :return: integer of the order ticket. 0 if no matching order is open, None if open orders could not be listed
+    """
+    symbol_info = symbol_registry.get_info(request['symbol'])
+    tolerance = (symbol_info.trade_tick_size or symbol_info.point) / 2 if symbol_info is not None else 1e-9
+    with mt5_lock:
+        open_orders = MetaTrader5.orders_get(symbol=request['symbol'])
+    if open_orders is None:
+        return None
+    for order in open_orders:
+        if order.comment == request['comment'] and order.type == request['type'] \
+                and abs(order.price_open - request['price']) <= tolerance:
+            return order.ticket
+    return 0
+
+
+# Function to build the result of an order request
+def make_order_result(request, retcode, order=0, checked=False, message="", attempts=1):
+    """
+    Function to build the OrderResult of an order request
+    :param request: dictionary of the order request
+    :param retcode: integer of the MT5 return code
+    :param order: integer of the order ticket. 0 if no order was placed
+    :param checked: Boolean. True if the terminal checked the request
+    :param message: string of details on a failure
+    :param attempts: integer of the number of times the request was sent
+    :return: OrderResult
+    """
+    return OrderResult(
+        retcode=retcode,
+        order=order,
+        symbol=request['symbol'],
+        volume=request['volume'],
+        price=request.get('price', 0.00),
+        stop_loss=request['sl'],
+        take_profit=request['tp'],
+        comment=request['comment'],
+        checked=checked,
+        message=message,
+        attempts=attempts
+    )
+
 
 # Function to Cancel an order on MT5
 def cancel_order(order_number):
@@ -295,26 +1146,11 @@ def cancel_order(order_number):
     :param order_number: int representing the order number from MT5
     :return: Boolean. True = cancelled. False == Not Cancelled.
     """
-    # Create the request
-    request = {
-        "action": MetaTrader5.TRADE_ACTION_REMOVE,
-        "order": order_number,
-        "comment": "order removed"
-    }
-    # Attempt to send the order to MT5
-    try:
-        order_result = MetaTrader5.order_send(request)
-        if order_result[0] == 10009:
-            print(f"Order {order_number} successfully cancelled")
-            return True
-        # You can put custom error handling if needed
-        else:
-            print(f"Order {order_number} unable to be cancelled")
-            return False
-    except Exception as e:
-        # This represents an issue with MetaTrader 5 terminal, so stop
-        print(f"Error cancelling order {order_number}. Error: {e}")
-        raise Exception
+    # Transient errors are retried the same way as for a batch
+    cancelled = cancel_orders(order_numbers=[order_number])[order_number]
+    if cancelled:
+        print(f"Order {order_number} successfully cancelled")
+    return cancelled
 
 
 # Function to retrieve all currently open orders on MetaTrader 5
@@ -323,60 +1159,149 @@ def get_all_open_orders():
     Function to retrieve all open orders from MetaTrader 5
     :return: list of open orders
     """
-    return MetaTrader5.orders_get()
+    with mt5_lock:
+        return MetaTrader5.orders_get()
 
 
 # Function to retrieve a filtered list of open orders from MT5
-def get_filtered_list_of_orders(symbol, comment):
+def get_filtered_list_of_orders(symbol, comment, snapshot=None):
     """
     Function to retrieve a filtered list of open orders from MT5. Filtering is performed
     on symbol and comment
     :param symbol: string of the symbol being traded
     :param comment: string of the comment
+    :param snapshot: order snapshot from get_order_snapshot(). Defaults to None (query MT5 for the symbol)
     :return: (filtered) list of orders
     """
+    if snapshot is not None:
+        return [order.ticket for order in snapshot.get((symbol, comment), [])]
     # Retrieve a list of open orders, filtered by symbol
-    open_orders_by_symbol = MetaTrader5.orders_get(symbol)
+    with mt5_lock:
+        open_orders_by_symbol = MetaTrader5.orders_get(symbol)
     # Check if any orders were retrieved (there may be none)
     if open_orders_by_symbol is None or len(open_orders_by_symbol) == 0:
         return []
+    # Filter orders by comment and return the order numbers
+    return [order.ticket for order in open_orders_by_symbol if order.comment == comment]
 
-    # Convert the retrieved orders into a dataframe
-    open_orders_dataframe = pandas.DataFrame(
-        list(open_orders_by_symbol),
-        columns=open_orders_by_symbol[0]._asdict().keys()
-    )
-    # From the open orders dataframe, filter orders by comment
-    open_orders_dataframe = open_orders_dataframe[open_orders_dataframe['comment'] == comment]
-    # Create a list to store the open order numbers
-    open_orders = []
-    # Iterate through the dataframe and add order numbers to the list
-    for order in open_orders_dataframe['ticket']:
-        open_orders.append(order)
-    # Return the open orders
-    return open_orders
+
+# Lightweight record of an open order
+OpenOrder = collections.namedtuple(
+    'OpenOrder', ['ticket', 'symbol', 'comment', 'type', 'volume', 'price_open', 'sl', 'tp']
+)
+
+
+# Function to take a snapshot of every open order
+def get_order_snapshot():
+    """
+    Function to retrieve every open order from MT5 in a single call, indexed by (symbol, comment)
+    :return: dictionary of (symbol, comment) -> list of OpenOrder
+    """
+    with mt5_lock:
+        open_orders = MetaTrader5.orders_get()
+    snapshot = {}
+    for order in open_orders or ():
+        snapshot.setdefault((order.symbol, order.comment), []).append(OpenOrder(
+            ticket=order.ticket,
+            symbol=order.symbol,
+            comment=order.comment,
+            type=order.type,
+            volume=order.volume_current,
+            price_open=order.price_open,
+            sl=order.sl,
+            tp=order.tp
+        ))
+    return snapshot
+
+
+# Function to cancel several orders in one go
+def cancel_orders(order_numbers, retry_budget=None):
+    """
+    Function to cancel a list of orders. Removal requests are sent back to back while holding the terminal once, and
+    a failure on one order does not stop the others. Orders which failed with a transient error (timeout, too many
+    requests, no connection) are sent again after a jittered backoff, until the retry budget runs out
+    :param order_numbers: list of ints representing order numbers from MT5
+    :param retry_budget: float of seconds the batch may spend being retried. Defaults to None (ORDER_RETRY_BUDGET)
+    :return: dictionary of order number -> Boolean. True = cancelled. False == Not Cancelled.
+    """
+    if retry_budget is None:
+        retry_budget = ORDER_RETRY_BUDGET
+    deadline = time.monotonic() + retry_budget
+    outcomes = {}
+    pending = list(order_numbers)
+    attempt = 0
+    while pending:
+        attempt += 1
+        retries = []
+        with mt5_lock:
+            for order_number in pending:
+                request = {
+                    "action": MetaTrader5.TRADE_ACTION_REMOVE,
+                    "order": order_number,
+                    "comment": "order removed"
+                }
+                try:
+                    with metrics.timed("cancel"):
+                        order_result = MetaTrader5.order_send(request)
+                except Exception as e:
+                    print(f"Error cancelling order {order_number}. Error: {e}")
+                    outcomes[order_number] = False
+                    continue
+                retcode = order_result[0] if order_result is not None else None
+                outcomes[order_number] = retcode == RETCODE_DONE
+                if classify_retcode(retcode) == "retry":
+                    retries.append(order_number)
+        # Retry if the wait still leaves time before the deadline
+        if not retries:
+            break
+        delay = get_retry_delay(attempt=attempt)
+        if time.monotonic() + delay >= deadline:
+            metrics.increment("cancel_retry_exhausted", value=len(retries))
+            break
+        metrics.increment("cancel_retry", value=len(retries))
+        time.sleep(delay)
+        pending = retries
+    for order_number, cancelled in outcomes.items():
+        if not cancelled:
+            print(f"Order {order_number} unable to be cancelled")
+    return outcomes
+
+
+# Function to cancel the orders of several symbols from one snapshot
+def cancel_filtered_orders_for_symbols(symbols, comments):
+    """
+    Function to cancel the orders of every symbol tagged with any of the comments, using one snapshot of open orders
+    and one batch of removal requests
+    :param symbols: list of symbols
+    :param comments: list of comment strings (one per strategy)
+    :return: dictionary of order number -> Boolean. True = cancelled. False == Not Cancelled.
+    """
+    snapshot = get_order_snapshot()
+    order_numbers = []
+    for symbol in symbols:
+        for comment in comments:
+            order_numbers.extend(get_filtered_list_of_orders(symbol=symbol, comment=comment, snapshot=snapshot))
+    return cancel_orders(order_numbers=order_numbers)
 
 
 # Function to cancel orders based upon filters
-def cancel_filtered_orders(symbol, comment):
+def cancel_filtered_orders(symbol, comment, snapshot=None):
     """
     Function to cancel a list of filtered orders. Based upon two filters: symbol and comment string.
     :param symbol: string of symbol
     :param comment: string of the comment
+    :param snapshot: order snapshot from get_order_snapshot(). Defaults to None (query MT5 for the symbol)
     :return: Boolean. True = orders cancelled, False = issue with cancellation
     """
     # Retreive a list of the orders based upon the filter
     orders = get_filtered_list_of_orders(
         symbol=symbol,
-        comment=comment
+        comment=comment,
+        snapshot=snapshot
     )
     if len(orders) > 0:
-        # Iterate through and cancel
-        for order in orders:
-            cancel_outcome = cancel_order(order)
-            if cancel_outcome is not True:
-                return False
-        # At conclusion of iteration, return true
-        return True
+        # Cancel every order, reporting a failure if any could not be cancelled
+        outcomes = cancel_orders(order_numbers=orders)
+        return all(outcomes.values())
     else:
-        return True
\ No newline at end of file
+        return True
@@ -0,0 +1,220 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas
+
+import backtest
+import ema_cross_strategy
+import history_store
+import indicator_lib
+
+CANDLE_COLUMNS = ['time', 'open', 'high', 'low', 'close']
+RESULT_KEY = ['symbol', 'ema_one', 'ema_two', 'risk']
+
+# Per worker process: shared memory specs, attached candle arrays and computed EMAs
+worker_shared_candles = {}
+worker_attached_candles = {}
+worker_ema_cache = {}
+
+
+# Function to copy the candles of each symbol into shared memory
+def share_candles(symbols, timeframe, number_of_candles=None):
+    """
+    Function to load the candles of each symbol once from the history store and copy them into shared memory, so
+    worker processes can read them without pickling
+    :param symbols: list of symbols
+    :param timeframe: string of the timeframe
+    :param number_of_candles: integer of the number of stored candles to use. Defaults to None (all)
+    :return: tuple of (dictionary of symbol -> (shared memory name, number of candles), list of SharedMemory blocks)
+    """
+    dtype = np.dtype([(column, np.float64) for column in CANDLE_COLUMNS])
+    specs = {}
+    blocks = []
+    for symbol in symbols:
+        columns = history_store.open_history(symbol=symbol, timeframe=timeframe)
+        if not columns:
+            print(f"No stored candles for {symbol}. Skipping")
+            continue
+        number_of_rows = len(columns['time']) if number_of_candles is None \
+            else min(number_of_candles, len(columns['time']))
+        block = shared_memory.SharedMemory(create=True, size=max(number_of_rows * dtype.itemsize, 1))
+        candles = np.ndarray((number_of_rows,), dtype=dtype, buffer=block.buf)
+        for column in CANDLE_COLUMNS:
+            candles[column] = columns[column][len(columns[column]) - number_of_rows:]
+        specs[symbol] = (block.name, number_of_rows)
+        blocks.append(block)
+    return specs, blocks
+
+
+# Function to initialize a worker process
+def init_worker(shared_candles):
+    """
+    Function to initialize a worker process with the shared memory specs of each symbol
+    :param shared_candles: dictionary of symbol -> (shared memory name, number of candles)
+    :return: None
+    """
+    worker_shared_candles.update(shared_candles)
+
+
+# Function to get the candles of a symbol inside a worker process
+def get_worker_candles(symbol):
+    """
+    Function to attach to the shared candles of a symbol. The block is attached once per worker process
+    :param symbol: string of the symbol
+    :return: numpy structured array of candles (a view on shared memory)
+    """
+    if symbol not in worker_attached_candles:
+        name, number_of_rows = worker_shared_candles[symbol]
+        block = shared_memory.SharedMemory(name=name)
+        dtype = np.dtype([(column, np.float64) for column in CANDLE_COLUMNS])
+        worker_attached_candles[symbol] = (block, np.ndarray((number_of_rows,), dtype=dtype, buffer=block.buf))
+    return worker_attached_candles[symbol][1]
+
+
+# Function to get EMAs inside a worker process
+def get_worker_emas(symbol, candles, ema_sizes):
+    """
+    Function to get EMA arrays for a symbol, reusing any already computed by this worker. Missing periods are computed
+    together in a single pass
+    :param symbol: string of the symbol
+    :param candles: numpy structured array of candles
+    :param ema_sizes: list of EMA sizes
+    :return: dictionary of ema_size -> numpy array
+    """
+    missing = [ema_size for ema_size in ema_sizes if (symbol, ema_size) not in worker_ema_cache]
+    if missing:
+        ema_values = indicator_lib.calc_ema_values(close_values=candles['close'], ema_sizes=missing)
+        for ema_size, values in ema_values.items():
+            worker_ema_cache[(symbol, ema_size)] = values
+    return {ema_size: worker_ema_cache[(symbol, ema_size)] for ema_size in ema_sizes}
+
+
+# Function to evaluate a chunk of parameter combinations for one symbol
+def evaluate_combinations(symbol, ema_pairs, risks, balance):
+    """
+    Function to backtest a chunk of (ema_one, ema_two) pairs at every risk on one symbol. Runs in a worker process
+    :param symbol: string of the symbol
+    :param ema_pairs: list of (ema_one, ema_two) tuples
+    :param risks: list of floats of the amount to risk
+    :param balance: float of the (static) balance used for sizing
+    :return: list of result dictionaries
+    """
+    candles = get_worker_candles(symbol=symbol)
+    ema_sizes = sorted({ema_size for ema_pair in ema_pairs for ema_size in ema_pair})
+    ema_values = get_worker_emas(symbol=symbol, candles=candles, ema_sizes=ema_sizes)
+    results = []
+    for ema_one, ema_two in ema_pairs:
+        dataframe = pandas.DataFrame({column: candles[column] for column in CANDLE_COLUMNS})
+        dataframe["ema_" + str(ema_one)] = ema_values[ema_one]
+        dataframe["ema_" + str(ema_two)] = ema_values[ema_two]
+        dataframe = indicator_lib.calc_ema_cross(dataframe=dataframe, ema_one=ema_one, ema_two=ema_two)
+        dataframe = ema_cross_strategy.det_trade(dataframe=dataframe, ema_one=ema_one, ema_two=ema_two)
+        for risk in risks:
+            orders = backtest.make_orders_dataframe(
+                symbol=symbol,
+                orders=backtest.simulate_orders(dataframe=dataframe, symbol=symbol, balance=balance,
+                                                amount_to_risk=risk)
+            )
+            results.append({'symbol': symbol, 'ema_one': ema_one, 'ema_two': ema_two, 'risk': risk,
+                            **backtest.summarize_orders(orders=orders)})
+    return results
+
+
+# Function to read the results of a previous (possibly interrupted) sweep
+def read_results(results_filepath):
+    """
+    Function to read the results already written by a sweep
+    :param results_filepath: string of the results CSV
+    :return: dataframe of results. Empty if the file does not exist
+    """
+    if not os.path.exists(results_filepath):
+        return pandas.DataFrame(columns=RESULT_KEY)
+    return pandas.read_csv(results_filepath)
+
+
+# Function to rank the results of a sweep
+def rank_results(results):
+    """
+    Function to rank parameter combinations by total profit across all symbols
+    :param results: dataframe of results, one row per symbol and combination
+    :return: dataframe of ranked combinations
+    """
+    if results.empty:
+        return results
+    ranked = results.groupby(['ema_one', 'ema_two', 'risk'], as_index=False).agg(
+        symbols=('symbol', 'nunique'),
+        signals=('signals', 'sum'),
+        filled=('filled', 'sum'),
+        wins=('wins', 'sum'),
+        losses=('losses', 'sum'),
+        profit=('profit', 'sum'),
+        max_drawdown=('max_drawdown', 'max')
+    )
+    ranked = ranked.sort_values(by=['profit', 'max_drawdown'], ascending=[False, True], ignore_index=True)
+    ranked.insert(0, 'rank', ranked.index + 1)
+    return ranked
+
+
+# Function to sweep EMA periods and risk across symbols
+def run_sweep(symbols, timeframe, ema_ones, ema_twos, risks, balance, results_filepath, max_workers=None,
+              number_of_candles=None, chunk_size=8):
+    """
+    Function to backtest every (ema_one, ema_two, risk) combination across symbols using a process pool. Candles are
+    loaded once and shared with the workers through shared memory. Results are appended to results_filepath as each
+    chunk finishes, so an interrupted sweep resumes where it stopped when run again with the same file
+    :param symbols: list of symbols
+    :param timeframe: string of the timeframe
+    :param ema_ones: list of integers for ema_one
+    :param ema_twos: list of integers for ema_two. Only pairs with ema_one < ema_two are evaluated
+    :param risks: list of floats of the amount to risk
+    :param balance: float of the (static) balance used for sizing
+    :param results_filepath: string of the results CSV
+    :param max_workers: integer of worker processes. Defaults to None (number of CPUs)
+    :param number_of_candles: integer of the number of stored candles to use. Defaults to None (all)
+    :param chunk_size: integer of EMA pairs evaluated per task. Pairs in a chunk share their EMA computation
+    :return: dataframe of ranked combinations
+    """
+    ema_pairs = [(ema_one, ema_two) for ema_one, ema_two in itertools.product(ema_ones, ema_twos) if ema_one < ema_two]
+    # Skip combinations already in the results file
+    completed = set(read_results(results_filepath=results_filepath)[RESULT_KEY].itertuples(index=False, name=None))
+    specs, blocks = share_candles(symbols=symbols, timeframe=timeframe, number_of_candles=number_of_candles)
+    try:
+        tasks = []
+        for symbol in specs:
+            pending = [ema_pair for ema_pair in ema_pairs
+                       if any((symbol, *ema_pair, risk) not in completed for risk in risks)]
+            for i in range(0, len(pending), chunk_size):
+                tasks.append((symbol, pending[i:i + chunk_size]))
+        print(f"{len(tasks)} tasks to run, {len(completed)} results already completed")
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(specs,)) as executor:
+            futures = [executor.submit(evaluate_combinations, symbol, chunk, risks, balance) for symbol, chunk in tasks]
+            for future in as_completed(futures):
+                results = pandas.DataFrame(future.result())
+                results = results[[key not in completed
+                                   for key in results[RESULT_KEY].itertuples(index=False, name=None)]]
+                # Append as each task finishes so the sweep can be resumed
+                results.to_csv(results_filepath, mode='a', index=False, header=not os.path.exists(results_filepath))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return rank_results(results=read_results(results_filepath=results_filepath))
+
+
+# Main function
+if __name__ == '__main__':
+    import main
+    project_settings = main.get_project_settings(settings_filepath=main.SETTINGS_FILEPATH)
+    ranked_results = run_sweep(
+        symbols=project_settings["mt5"]["symbols"],
+        timeframe=project_settings["mt5"]["timeframe"],
+        ema_ones=[2, 5, 8, 10, 15, 20],
+        ema_twos=[10, 20, 30, 50, 100, 200],
+        risks=[0.005, 0.01, 0.02],
+        balance=main.BALANCE,
+        results_filepath=os.path.join(main.OUTPUT_FOLDER, "sweep_results.csv")
+    )
+    print(ranked_results.head(20))
@@ -0,0 +1,305 @@
+import threading
+import time
+
+import MetaTrader5
+import numpy
+
+import metrics
+import mt5_lib
+
+# Largest net exposure to any one currency, as a multiple of account equity
+MAX_CURRENCY_EXPOSURE = 3.0
+# Pending orders may still fill, so they count towards exposure at this weight
+PENDING_ORDER_WEIGHT = 1.0
+# Seconds the book may spend refreshing from MT5 each cycle. Whatever is not refreshed in time keeps its last state,
+# so a slow terminal never holds up entries
+REFRESH_BUDGET = 0.05
+
+
+# Function to calculate the net exposure per currency
+def calc_currency_exposure(base_index, quote_index, notional, number_of_currencies):
+    """
+    Function to calculate the net exposure per currency of many positions in one numpy call. A position is long its
+    base currency and short its quote currency by its notional value
+    :param base_index: numpy array of the index of the base currency of each position
+    :param quote_index: numpy array of the index of the quote currency of each position
+    :param notional: numpy array of the signed notional value of each position in the account currency. Positive for
+    a BUY, negative for a SELL
+    :param number_of_currencies: integer of the number of currencies
+    :return: numpy array of the net exposure per currency, in the account currency
+    """
+    return numpy.bincount(base_index, weights=notional, minlength=number_of_currencies) \
+        - numpy.bincount(quote_index, weights=notional, minlength=number_of_currencies)
+
+
+# Function to calculate how much of a trade fits under the exposure limit
+def calc_exposure_scale(exposure, delta, limit):
+    """
+    Function to calculate the largest fraction of a trade which keeps the net exposure of every currency it touches
+    within the limit. A trade reducing an exposure is never scaled down for that currency
+    :param exposure: numpy array of the current net exposure of each currency the trade touches
+    :param delta: numpy array of the change in exposure of each currency from the full trade
+    :param limit: float of the largest net exposure allowed for any currency
+    :return: float between 0 and 1
+    """
+    within = numpy.abs(exposure + delta) <= limit
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        scale = numpy.where(within | (delta == 0), 1.00, (numpy.sign(delta) * limit - exposure) / delta)
+    return float(numpy.clip(scale.min(initial=1.00), 0.00, 1.00))
+
+
+# Class to hold the live state of the account
+class PortfolioBook:
+    """
+    In-memory book of the account: equity, open positions and pending orders, each held as the exposure it adds to its
+    base and quote currency. Each refresh requests the account, positions and orders from MT5 and only applies what
+    changed since the last one. Orders sent during a cycle are reserved in the book as they are sized, so every
+    symbol of the cycle sees the exposure of the ones before it
+    """
+
+    def __init__(self, max_currency_exposure=MAX_CURRENCY_EXPOSURE, pending_order_weight=PENDING_ORDER_WEIGHT):
+        """
+        :param max_currency_exposure: float of the largest net exposure to any one currency, as a multiple of equity
+        :param pending_order_weight: float of the weight of pending orders in the exposure
+        """
+        self.max_currency_exposure = max_currency_exposure
+        self.pending_order_weight = pending_order_weight
+        self.lock = threading.Lock()
+        self.equity = None
+        self.account_currency = None
+        self.currencies = {}
+        self.exposure = numpy.zeros(0)
+        # (kind, ticket) -> (base index, quote index, signed notional, state of the record)
+        self.entries = {}
+        self.next_reservation = 0
+
+    # Function to get the index of a currency
+    def get_currency_index(self, currency):
+        """
+        Function to get the index of a currency in the exposure array, adding it the first time
+        :param currency: string of the currency
+        :return: integer of the index
+        """
+        index = self.currencies.get(currency)
+        if index is None:
+            index = len(self.currencies)
+            self.currencies[currency] = index
+            self.exposure = numpy.append(self.exposure, 0.00)
+        return index
+
+    # Function to value a trade
+    def make_entry(self, symbol, volume, price, sizing_metadata=None, weight=1.00):
+        """
+        Function to value a trade as the exposure it adds to its base and quote currency
+        :param symbol: string of the symbol
+        :param volume: float of the volume. Positive for a BUY, negative for a SELL
+        :param price: float of the price
+        :param sizing_metadata: dictionary from mt5_lib.get_sizing_metadata for the symbol. Defaults to None (fetched)
+        :param weight: float of the weight of the trade
+        :return: tuple of (base index, quote index, signed notional). Notional is 0 if it cannot be converted. None if
+        the symbol is unknown
+        """
+        symbol_info = mt5_lib.symbol_registry.get_info(symbol)
+        if symbol_info is None:
+            return None
+        if sizing_metadata is None:
+            sizing_metadata = mt5_lib.get_sizing_metadata(symbols=[symbol], account_currency=self.account_currency)
+        notional = volume * price * sizing_metadata['contract_size'][0] * sizing_metadata['quote_to_account'][0]
+        return (self.get_currency_index(symbol_info.currency_base),
+                self.get_currency_index(symbol_info.currency_profit),
+                float(numpy.nan_to_num(notional * weight)))
+
+    # Function to add an entry to the book
+    def set_entry(self, key, entry, state=None):
+        """
+        Function to add an entry to the book, replacing any entry with the same key, and update the exposure
+        :param key: tuple of (kind, ticket)
+        :param entry: tuple of (base index, quote index, signed notional) from make_entry
+        :param state: state of the record the entry was made from, to spot changes on refresh
+        :return: None
+        """
+        self.remove_entry(key)
+        base_index, quote_index, notional = entry
+        self.exposure[base_index] += notional
+        self.exposure[quote_index] -= notional
+        self.entries[key] = (base_index, quote_index, notional, state)
+
+    # Function to remove an entry from the book
+    def remove_entry(self, key):
+        """
+        Function to remove an entry from the book and update the exposure
+        :param key: tuple of (kind, ticket)
+        :return: None
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.exposure[entry[0]] -= entry[2]
+            self.exposure[entry[1]] += entry[2]
+
+    # Function to apply the records of MT5 to the book
+    def apply_records(self, kind, records, weight):
+        """
+        Function to bring the entries of one kind in line with the records from MT5. Only records which are new or
+        changed are valued again, and entries with no record left are removed
+        :param kind: string. position or order
+        :param records: tuple of positions or orders from MT5
+        :param weight: float of the weight of this kind of record
+        :return: None
+        """
+        current = {}
+        for record in records or ():
+            if kind == "position":
+                # Position types are BUY (0) and SELL (1)
+                volume = record.volume if record.type == 0 else -record.volume
+            else:
+                # Buy order types (BUY, BUY_LIMIT, BUY_STOP, BUY_STOP_LIMIT) are even
+                volume = record.volume_current if record.type % 2 == 0 else -record.volume_current
+            current[(kind, record.ticket)] = (record.symbol, volume, record.price_open)
+        for key in [key for key in self.entries if key[0] == kind and key not in current]:
+            self.remove_entry(key)
+        for key, state in current.items():
+            entry = self.entries.get(key)
+            if entry is None or entry[3] != state:
+                symbol, volume, price = state
+                new_entry = self.make_entry(symbol=symbol, volume=volume, price=price, weight=weight)
+                # Records of symbols which cannot be resolved (i.e. delisted or renamed) are left out of the book
+                if new_entry is None:
+                    self.remove_entry(key)
+                    continue
+                self.set_entry(key=key, entry=new_entry, state=state)
+
+    # Function to refresh the book from MT5
+    def refresh(self, budget=REFRESH_BUDGET):
+        """
+        Function to refresh equity, positions and pending orders from MT5, within a time budget. Requests not started
+        before the budget runs out are skipped until the next refresh. Reservations from the previous cycle are
+        dropped first, whether or not the refresh completes, so they never pile up across cycles
+        :param budget: float of seconds
+        :return: Boolean. True if everything was refreshed
+        """
+        deadline = time.monotonic() + budget
+        with metrics.timed("risk_refresh"), self.lock:
+            for key in [key for key in self.entries if key[0] == "reserved"]:
+                self.remove_entry(key)
+            if self.account_currency is None:
+                self.account_currency = mt5_lib.get_account_currency()
+            steps = [
+                ("account", MetaTrader5.account_info),
+                ("position", MetaTrader5.positions_get),
+                ("order", MetaTrader5.orders_get)
+            ]
+            for kind, request in steps:
+                if time.monotonic() >= deadline:
+                    print(f"Risk book refresh over its {budget}s budget. Skipped {kind} and after")
+                    metrics.increment("risk_refresh_skipped")
+                    return False
+                with mt5_lib.mt5_lock:
+                    records = request()
+                if kind == "account":
+                    if records is not None:
+                        self.equity = records.equity
+                elif records is not None:
+                    self.apply_records(kind=kind, records=records,
+                                       weight=1.00 if kind == "position" else self.pending_order_weight)
+            # Rebuild the exposure from every entry, so rounding from incremental updates does not build up
+            self.exposure = self.calc_exposure()
+        return True
+
+    # Function to calculate the exposure of every entry
+    def calc_exposure(self):
+        """
+        Function to calculate the net exposure per currency from every entry in the book
+        :return: numpy array of the net exposure per currency, in the account currency
+        """
+        if not self.entries:
+            return numpy.zeros(len(self.currencies))
+        base_index, quote_index, notional, _ = zip(*self.entries.values())
+        return calc_currency_exposure(
+            base_index=numpy.array(base_index, dtype=numpy.int64),
+            quote_index=numpy.array(quote_index, dtype=numpy.int64),
+            notional=numpy.array(notional, dtype=numpy.float64),
+            number_of_currencies=len(self.currencies)
+        )
+
+    # Function to cap the lot size of a trade
+    def cap_lot_size(self, symbol, lot_size, is_buy, price, sizing_metadata=None):
+        """
+        Function to scale down the lot size of a trade so no currency goes past its exposure limit, and reserve what
+        is left in the book until the trade is settled. Trades are passed through unchanged until the book has been
+        refreshed, or if they cannot be valued in the account currency
+        :param symbol: string of the symbol
+        :param lot_size: float of the lot size from calc_lot_size
+        :param is_buy: Boolean. True for a BUY_STOP
+        :param price: float of the stop_price
+        :param sizing_metadata: dictionary from mt5_lib.get_sizing_metadata for the symbol. Defaults to None (fetched)
+        :return: tuple of (float of the lot size, reservation key for settle). The key is None if nothing was reserved
+        """
+        if lot_size <= 0:
+            return lot_size, None
+        with self.lock:
+            if not self.equity:
+                return lot_size, None
+            if sizing_metadata is None:
+                sizing_metadata = mt5_lib.get_sizing_metadata(symbols=[symbol], account_currency=self.account_currency)
+            volume = lot_size if is_buy else -lot_size
+            entry = self.make_entry(symbol=symbol, volume=volume, price=price, sizing_metadata=sizing_metadata)
+            if entry is None or entry[2] == 0:
+                return lot_size, None
+            base_index, quote_index, notional = entry
+            scale = calc_exposure_scale(
+                exposure=self.exposure[[base_index, quote_index]],
+                delta=numpy.array([notional, -notional]),
+                limit=self.max_currency_exposure * self.equity
+            )
+            if scale < 1:
+                # Round down to the lot step, so the limit holds
+                volume_step = float(sizing_metadata['volume_step'][0]) or 0.01
+                capped = round(float(numpy.floor(lot_size * scale / volume_step + 1e-9)) * volume_step, 8)
+                if capped < sizing_metadata['volume_min'][0]:
+                    capped = 0.00
+                print(f"Lot size for {symbol} capped from {lot_size} to {capped} by the currency exposure limit")
+                metrics.increment("risk_capped", symbol)
+                notional = notional * capped / lot_size
+                lot_size = capped
+            if lot_size <= 0:
+                return lot_size, None
+            key = ("reserved", self.next_reservation)
+            self.next_reservation += 1
+            self.set_entry(key=key, entry=(base_index, quote_index, notional * self.pending_order_weight))
+            return lot_size, key
+
+    # Function to settle a reservation
+    def settle(self, key, trade_outcome):
+        """
+        Function to settle the reservation of a trade once it has been sent. The reservation is released if no order
+        was placed, and otherwise kept until the next refresh brings in the order
+        :param key: reservation key from cap_lot_size
+        :param trade_outcome: outcome of mt5_lib.place_order. Truthy if the order was placed
+        :return: None
+        """
+        if key is None or trade_outcome:
+            return
+        with self.lock:
+            self.remove_entry(key)
+
+    # Function to get the balance to size trades on
+    def get_equity(self, default):
+        """
+        Function to get the account equity from the last refresh
+        :param default: float returned if the book has not been refreshed
+        :return: float of the equity
+        """
+        return self.equity if self.equity else default
+
+    # Function to get the net exposure per currency
+    def get_exposure(self):
+        """
+        Function to get the net exposure per currency, including reserved trades
+        :return: dictionary of currency -> net exposure in the account currency
+        """
+        with self.lock:
+            return {currency: float(self.exposure[index]) for currency, index in self.currencies.items()}
+
+
+# Book shared by the whole bot
+book = PortfolioBook()
@@ -0,0 +1,294 @@
+import abc
+
+import numpy as np
+
+import ema_cross_strategy
+import indicator_lib
+import metrics
+from artifact_writer import artifact_writer
+from make_trade import make_trade
+
+
+# Class to describe one indicator in the computation graph
+class IndicatorNode:
+    """
+    One indicator in the computation graph. The node is identified by its name, which is also the column it adds to the
+    candle frame, so two strategies asking for the same name share a single computation
+    """
+
+    def __init__(self, name, function, dependencies=(), ema_size=None):
+        """
+        :param name: string of the node name and column name (i.e. ema_20)
+        :param function: function taking the candle frame and returning a numpy array for the column
+        :param dependencies: list of IndicatorNode which must be computed first
+        :param ema_size: integer of the EMA size for EMA nodes, which the graph computes together. None otherwise
+        """
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.ema_size = ema_size
+
+
+# Function to create an EMA node
+def ema_node(ema_size):
+    """
+    Function to create the node of an EMA. All EMA nodes of a graph are computed together in a single pass
+    :param ema_size: integer of the EMA size
+    :return: IndicatorNode named ema_<size>
+    """
+    return IndicatorNode(name="ema_" + str(ema_size), function=None, ema_size=ema_size)
+
+
+# Function to create an EMA cross node
+def ema_cross_node(ema_one, ema_two):
+    """
+    Function to create the node of an EMA cross event, following calc_ema_cross. The first row is never a cross, as
+    calc_ema_cross drops it
+    :param ema_one: integer of EMA 1
+    :param ema_two: integer of EMA 2
+    :return: IndicatorNode named ema_cross_<ema_one>_<ema_two>
+    """
+    ema_one_column = "ema_" + str(ema_one)
+    ema_two_column = "ema_" + str(ema_two)
+
+    def calc_cross(frame):
+        position = frame[ema_one_column] > frame[ema_two_column]
+        cross = np.zeros(len(position), dtype=bool)
+        cross[1:] = position[1:] != position[:-1]
+        return cross
+
+    return IndicatorNode(
+        name=f"ema_cross_{ema_one}_{ema_two}",
+        function=calc_cross,
+        dependencies=[ema_node(ema_one), ema_node(ema_two)]
+    )
+
+
+# Class to compute the indicators of several strategies once
+class IndicatorGraph:
+    """
+    Deduplicated computation graph of indicators. Nodes are added by every strategy running on a symbol, then computed
+    once each in dependency order
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    # Function to add a node and its dependencies
+    def add(self, node):
+        """
+        Function to add a node and its dependencies. Nodes already in the graph are not added again
+        :param node: IndicatorNode
+        :return: None
+        """
+        if node.name in self.nodes:
+            return
+        for dependency in node.dependencies:
+            self.add(dependency)
+        self.nodes[node.name] = node
+
+    # Function to compute every node of the graph
+    def compute(self, frame):
+        """
+        Function to compute every node of the graph into a column of the candle frame. EMA nodes are computed first,
+        together in one pass over the close prices. Other nodes are computed in the order they were added, which is
+        always after their dependencies
+        :param frame: CandleFrame of raw candles
+        :return: CandleFrame with indicator columns
+        """
+        ema_sizes = [node.ema_size for node in self.nodes.values() if node.ema_size is not None]
+        if ema_sizes:
+            frame = indicator_lib.calc_frame_emas(frame=frame, ema_sizes=ema_sizes)
+        for name, node in self.nodes.items():
+            if node.function is not None:
+                values = node.function(frame)
+                frame.column(name, dtype=values.dtype)[:] = values
+        return frame
+
+
+# Base class for a strategy
+class Strategy(abc.ABC):
+    """
+    Base class for a strategy. A strategy declares its indicators as graph nodes and decides on a trade from the most
+    recent candle once they are computed. Orders are tagged with the strategy comment
+    """
+
+    def __init__(self, comment):
+        """
+        :param comment: string of the comment used to tag orders of this strategy
+        """
+        self.comment = comment
+
+    # Function to declare the indicators of the strategy
+    @abc.abstractmethod
+    def indicators(self):
+        """
+        Function to declare the indicators the strategy needs
+        :return: list of IndicatorNode
+        """
+
+    # Function to determine the trade event of the most recent candle
+    @abc.abstractmethod
+    def det_trade_event(self, frame):
+        """
+        Function to determine the trade event of the most recent candle
+        :param frame: CandleFrame of candles with every indicator of the graph
+        :return: dictionary with ema_cross (signal), stop_price, stop_loss and take_profit
+        """
+
+    # Function to determine the trade event of the most recent candle from incremental state
+    def det_streaming_trade_event(self, symbol, timeframe, number_of_candles, candles):
+        """
+        Function to determine the trade event of the most recent candle by updating incremental indicator state
+        instead of recomputing the graph. Strategies without incremental state return None and run on the graph
+        :param symbol: string of the symbol
+        :param timeframe: string of the timeframe
+        :param number_of_candles: integer of the number of candles used to seed the state
+        :param candles: list of the two most recent candles as dictionaries
+        :return: dictionary with ema_cross (signal), stop_price, stop_loss and take_profit. None if not supported
+        """
+        return None
+
+
+# Class for the EMA Cross Strategy
+class EmaCrossStrategy(Strategy):
+    """
+    EMA Cross Strategy as a plug-in. Same rules as ema_cross_strategy.det_trade
+    """
+
+    def __init__(self, ema_one, ema_two, comment=None):
+        """
+        :param ema_one: integer of EMA 1
+        :param ema_two: integer of EMA 2
+        :param comment: string of the order comment. Defaults to None (EMA<ema_one>-EMA<ema_two> CROSS STRATEGY)
+        """
+        if ema_one == ema_two:
+            raise ValueError("EMA values are the same!")
+        super().__init__(comment=comment or f"EMA{ema_one}-EMA{ema_two} CROSS STRATEGY")
+        self.ema_one = ema_one
+        self.ema_two = ema_two
+
+    def indicators(self):
+        return [ema_cross_node(ema_one=self.ema_one, ema_two=self.ema_two)]
+
+    def det_trade_event(self, frame):
+        if len(frame) < 2:
+            return {'ema_cross': False, 'take_profit': 0.00, 'stop_price': 0.00, 'stop_loss': 0.00}
+        previous = frame.record(-2)
+        latest = frame.record(-1)
+        latest['ema_cross'] = bool(frame[f"ema_cross_{self.ema_one}_{self.ema_two}"][-1])
+        return ema_cross_strategy.det_trade_event(
+            latest=latest,
+            previous=previous,
+            ema_one=self.ema_one,
+            ema_two=self.ema_two
+        )
+
+    def det_streaming_trade_event(self, symbol, timeframe, number_of_candles, candles):
+        return ema_cross_strategy.get_streaming_trade_event(
+            symbol=symbol,
+            timeframe=timeframe,
+            number_of_candles=number_of_candles,
+            ema_one=self.ema_one,
+            ema_two=self.ema_two,
+            candles=candles
+        )
+
+
+# Registered strategies, run on every symbol each cycle
+strategy_registry = {}
+
+
+# Function to register a strategy
+def register_strategy(strategy):
+    """
+    Function to register a strategy so it runs on every symbol each cycle. Strategies are keyed by comment, so each
+    variant needs its own comment
+    :param strategy: Strategy
+    :return: None
+    """
+    if strategy.comment in strategy_registry:
+        raise ValueError(f"A strategy with comment {strategy.comment} is already registered")
+    strategy_registry[strategy.comment] = strategy
+
+
+# Function to run several strategies over one symbol
+def run_strategies(symbol, timeframe, number_of_candles, balance, amount_to_risk, strategies=None, streaming=False):
+    """
+    Function to run several strategies over one symbol. Candles are retrieved once into a reusable candle frame and the
+    indicators of all strategies are computed once through a shared graph. In streaming mode, strategies with
+    incremental state update it from the two most recent candles instead, and only the others use the graph
+    :param symbol: string of the symbol
+    :param timeframe: string of the timeframe
+    :param number_of_candles: integer of the number of candles to retrieve
+    :param balance: float of current balance / or static balance
+    :param amount_to_risk: float of the amount to risk (expressed as decimal)
+    :param strategies: list of Strategy. Defaults to None (every registered strategy)
+    :param streaming: Boolean. True to use incremental state where strategies support it. Defaults to False
+    :return: dictionary of comment -> trade outcome
+    """
+    if strategies is None:
+        strategies = list(strategy_registry.values())
+    trade_events = {}
+    if streaming:
+        # Retrieve the two most recent candles once for every strategy
+        candles = ema_cross_strategy.get_data(
+            symbol=symbol,
+            timeframe=timeframe,
+            number_of_candles=2
+        ).to_dict('records')
+        # Strategies time their own stages, as the state update can re-seed from history
+        for strategy in strategies:
+            trade_event = strategy.det_streaming_trade_event(
+                symbol=symbol,
+                timeframe=timeframe,
+                number_of_candles=number_of_candles,
+                candles=candles
+            )
+            if trade_event is not None:
+                trade_events[strategy.comment] = trade_event
+    graph_strategies = [strategy for strategy in strategies if strategy.comment not in trade_events]
+    frame = None
+    if graph_strategies:
+        # Build the shared graph
+        graph = IndicatorGraph()
+        for strategy in graph_strategies:
+            for node in strategy.indicators():
+                graph.add(node)
+        # Retrieve data and compute every indicator once. Retrieval is timed by mt5_lib as the fetch stage
+        frame = ema_cross_strategy.get_frame(
+            symbol=symbol,
+            timeframe=timeframe,
+            number_of_candles=number_of_candles,
+            key=(symbol, timeframe)
+        )
+        with metrics.timed("calc_indicators", symbol):
+            frame = graph.compute(frame=frame)
+        with metrics.timed("det_trade", symbol):
+            for strategy in graph_strategies:
+                trade_events[strategy.comment] = strategy.det_trade_event(frame=frame)
+    # Let each strategy place its trade
+    outcomes = {}
+    for strategy in strategies:
+        trade_event = trade_events[strategy.comment]
+        trade_outcome = False
+        if trade_event['ema_cross']:
+            if trade_event['take_profit'] > 0 and trade_event['stop_loss'] > 0 and trade_event['stop_price'] > 0:
+                print(f"{strategy.comment}: Signal found :-)")
+                trade_outcome = make_trade(
+                    balance=balance,
+                    comment=strategy.comment,
+                    amount_to_risk=amount_to_risk,
+                    symbol=symbol,
+                    take_profit=trade_event['take_profit'],
+                    stop_loss=trade_event['stop_loss'],
+                    stop_price=trade_event['stop_price'],
+                )
+            if strategy in graph_strategies:
+                # Hand a copy of the frame to the background writer, as the frame is reused next cycle
+                columns = {name: frame[name].copy() for name in frame.columns}
+            else:
+                columns = ema_cross_strategy.make_event_snapshot(trade_event=trade_event)
+            artifact_writer.submit(name=f"{symbol}-{strategy.comment}", columns=columns)
+        outcomes[strategy.comment] = trade_outcome
+    return outcomes
@@ -0,0 +1,46 @@
+import fake_mt5
+
+# The fake terminal must be installed before any module importing MetaTrader5
+fake_mt5.install()
+
+import pytest
+
+import artifact_writer
+import ema_cross_strategy
+import mt5_lib
+import portfolio_risk
+import strategy_lib
+
+
+# Fixture giving each test a fresh fake terminal
+@pytest.fixture
+def terminal():
+    """
+    Fixture installing a new fake terminal with the default symbols, and clearing every cache held between cycles so
+    tests do not see each other's candles, quotes or orders
+    :return: FakeTerminal
+    """
+    fake_terminal = fake_mt5.install()
+    mt5_lib.invalidate_candle_cache()
+    mt5_lib.account_currency = None
+    mt5_lib.enable_all_symbols(symbol_array=list(fake_terminal.symbols))
+    ema_cross_strategy.streaming_states.clear()
+    ema_cross_strategy.candle_frames.clear()
+    strategy_lib.strategy_registry.clear()
+    portfolio_risk.book = portfolio_risk.PortfolioBook()
+    return fake_terminal
+
+
+# Fixture keeping signal snapshots out of the repository
+@pytest.fixture(autouse=True)
+def artifact_folder(tmp_path, monkeypatch):
+    """
+    Fixture pointing the artifact writer at a temporary folder. The writer runs on its own thread, so it is flushed
+    before the folder is restored
+    :return: string of the artifact folder
+    """
+    folder = str(tmp_path / "artifacts")
+    monkeypatch.setattr(artifact_writer.artifact_writer, "folder", folder)
+    monkeypatch.setattr(artifact_writer.artifact_writer, "archive_filepath", None)
+    yield folder
+    artifact_writer.artifact_writer.flush()
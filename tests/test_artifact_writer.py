@@ -0,0 +1,29 @@
+import glob
+
+import pytest
+
+import artifact_writer
+import ema_cross_strategy
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_signal_writes_a_snapshot(terminal, monkeypatch, tmp_path, streaming):
+    writer = artifact_writer.ArtifactWriter(folder=str(tmp_path))
+    monkeypatch.setattr(ema_cross_strategy, "artifact_writer", writer)
+    monkeypatch.setattr(ema_cross_strategy, "make_trade", lambda **kwargs: False)
+    # Run cycles until the EMAs cross
+    for _ in range(200):
+        terminal.advance(60)
+        ema_cross_strategy.ema_cross_strategy(symbol="EURUSD", timeframe="M1", number_of_candles=300, ema_one=5,
+                                              ema_two=10, balance=100000, amount_to_risk=0.01, comment="TEST",
+                                              streaming=streaming)
+        if writer.sequence > 0 or writer.queue.unfinished_tasks > 0:
+            break
+    writer.close()
+    archives = glob.glob(str(tmp_path / "*.npz"))
+    assert len(archives) == 1
+    snapshots = artifact_writer.read_snapshots(archives[0])
+    assert len(snapshots) == 1
+    snapshot = next(iter(snapshots.values()))
+    assert snapshot['ema_cross'].iloc[-1]
+    assert {'time', 'close', 'ema_5', 'ema_10', 'stop_price', 'stop_loss', 'take_profit'} <= set(snapshot.columns)
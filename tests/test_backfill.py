@@ -0,0 +1,37 @@
+import numpy
+
+import backfill
+import fake_mt5
+import history_store
+
+
+def test_backfill_resumes_after_an_interruption(terminal, monkeypatch, tmp_path):
+    monkeypatch.setattr(backfill, "RETRY_WAIT", 0.0)
+    history_folder = str(tmp_path)
+    start = terminal.time - 5000 * 60
+    get_window = backfill.get_window
+    windows = []
+
+    # The terminal stops answering after two windows
+    def fail_after_two_windows(**kwargs):
+        windows.append(kwargs['window_start'])
+        if len(windows) > 2:
+            return None
+        return get_window(**kwargs)
+
+    monkeypatch.setattr(backfill, "get_window", fail_after_two_windows)
+    written = backfill.backfill_symbol(symbol="EURUSD", timeframe="M1", start=start, chunk_candles=1000,
+                                       history_folder=history_folder)
+    assert written == 2000
+    assert len(windows) == 3
+    # Run again: it carries on from the end of the store
+    monkeypatch.setattr(backfill, "get_window", get_window)
+    written = backfill.backfill_symbol(symbol="EURUSD", timeframe="M1", start=start, chunk_candles=1000,
+                                       history_folder=history_folder)
+    assert written == 3000
+    # The store holds every completed candle once, in order, as if the backfill had never stopped
+    stored = history_store.read_candles(symbol="EURUSD", timeframe="M1", history_folder=history_folder)
+    expected = terminal.get_rates("EURUSD", fake_mt5.TIMEFRAME_M1, start // 60, terminal.time // 60 - 1)
+    assert len(stored) == len(expected) == 5000
+    for name in ['time', 'open', 'high', 'low', 'close']:
+        numpy.testing.assert_array_equal(stored[name].to_numpy(), expected[name])
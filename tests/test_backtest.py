@@ -0,0 +1,46 @@
+import numpy as np
+import pandas
+import pytest
+
+import backtest
+import ema_cross_strategy
+import fake_mt5
+import mt5_lib
+from helper_functions import calc_lot_size
+
+
+@pytest.mark.parametrize("symbol", ["EURUSD", "USDJPY"])
+def test_prices_are_normalized_as_live_orders(terminal, symbol):
+    data = ema_cross_strategy.get_data(symbol=symbol, timeframe="M1", number_of_candles=2000)
+    orders = backtest.run_backtest(symbol=symbol, timeframe="M1", ema_one=5, ema_two=10, balance=100000,
+                                   amount_to_risk=0.01, data=data)
+    assert len(orders) > 0
+    symbol_info = mt5_lib.symbol_registry.get_info(symbol)
+    for column in ['stop_price', 'stop_loss', 'take_profit']:
+        expected = [mt5_lib.normalize_price(price, symbol_info) for price in orders[column]]
+        np.testing.assert_array_equal(orders[column].to_numpy(), expected)
+    # Prices keep every digit of the symbol, rather than 4 decimal places
+    if symbol_info.digits > 4:
+        assert (orders['stop_price'] != orders['stop_price'].round(4)).any()
+
+
+def test_caller_data_is_not_modified(terminal):
+    data = ema_cross_strategy.get_data(symbol="EURUSD", timeframe="M1", number_of_candles=500)
+    expected = data.copy()
+    backtest.run_backtest(symbol="EURUSD", timeframe="M1", ema_one=5, ema_two=10, balance=100000,
+                          amount_to_risk=0.01, data=data)
+    pandas.testing.assert_frame_equal(data, expected)
+
+
+@pytest.mark.parametrize("symbol", ["EURUSD", "USDJPY", "USDCAD"])
+def test_offline_lot_sizes_match_calc_lot_size(terminal, monkeypatch, symbol):
+    # Without account information there is no cross rate, as when backtesting offline
+    monkeypatch.setattr(fake_mt5, "account_info", lambda: None)
+    rng = np.random.default_rng(0)
+    stop_price = terminal.get_quote(symbol)[1] * rng.uniform(0.99, 1.01, 100)
+    stop_loss = stop_price * (1 - rng.uniform(0.0005, 0.01, 100))
+    lot_size = backtest.calc_order_lot_sizes(symbol=symbol, balance=100000, amount_to_risk=0.01,
+                                             stop_loss=stop_loss, stop_price=stop_price)
+    expected = [calc_lot_size(balance=100000, risk_amount=0.01, stop_loss=stop_loss[i], stop_price=stop_price[i],
+                              symbol=symbol) for i in range(100)]
+    np.testing.assert_allclose(lot_size, expected)
@@ -0,0 +1,46 @@
+import numpy
+
+import candle_aggregator
+import fake_mt5
+
+
+def test_aggregate_candles():
+    candles = numpy.zeros(4, dtype=fake_mt5.RATES_DTYPE)
+    candles['time'] = [0, 60, 120, 300]
+    candles['open'] = [1.0, 2.0, 3.0, 4.0]
+    candles['high'] = [1.5, 2.5, 3.5, 4.5]
+    candles['low'] = [0.5, 1.5, 0.1, 3.5]
+    candles['close'] = [2.0, 3.0, 4.0, 5.0]
+    candles['tick_volume'] = [1, 2, 3, 4]
+    candles['spread'] = [3, 1, 2, 5]
+    aggregated = candle_aggregator.aggregate_candles(candles=candles, seconds=300)
+    assert aggregated['time'].tolist() == [0, 300]
+    assert aggregated['open'].tolist() == [1.0, 4.0]
+    assert aggregated['high'].tolist() == [3.5, 4.5]
+    assert aggregated['low'].tolist() == [0.1, 3.5]
+    assert aggregated['close'].tolist() == [4.0, 5.0]
+    assert aggregated['tick_volume'].tolist() == [6, 4]
+    assert aggregated['spread'].tolist() == [1, 5]
+
+
+def test_new_candles_are_folded_from_one_base_request(terminal):
+    aggregator = candle_aggregator.TimeframeAggregator(symbol="EURUSD", timeframes=["M5", "M15"], number_of_candles=50)
+    assert aggregator.update()
+    seeded_times = {timeframe: aggregator.caches[timeframe].last_time() for timeframe in ["M5", "M15"]}
+    for _ in range(40):
+        terminal.advance(60)
+        requests = terminal.calls['copy_rates_from_pos']
+        assert aggregator.update()
+        # A single delta request for base candles, whatever the number of timeframes
+        assert terminal.calls['copy_rates_from_pos'] == requests + 1
+    # Completed base candles, without the one still forming
+    base_candles = fake_mt5.copy_rates_from_pos("EURUSD", fake_mt5.TIMEFRAME_M1, 1, 200)
+    for timeframe, seconds in [("M5", 300), ("M15", 900)]:
+        candles = aggregator.get_candlesticks(timeframe=timeframe, number_of_candles=50)
+        built = candles[candles['time'] > seeded_times[timeframe]]
+        expected = candle_aggregator.aggregate_candles(candles=base_candles, seconds=seconds)
+        expected = expected[(expected['time'] > seeded_times[timeframe])
+                            & (expected['time'] + seconds <= base_candles['time'][-1] + 60)]
+        assert len(built) >= 40 * 60 // seconds - 1
+        for column in ['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread']:
+            numpy.testing.assert_array_equal(built[column].to_numpy(), expected[column])
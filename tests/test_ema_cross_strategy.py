@@ -0,0 +1,71 @@
+import numpy
+import pytest
+
+import ema_cross_strategy
+import indicator_lib
+import mt5_lib
+
+
+@pytest.mark.parametrize("ema_one, ema_two", [(5, 10), (20, 8)])
+def test_det_trade_vectorized_matches_loop(terminal, ema_one, ema_two):
+    candles = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=2000, use_cache=False)
+    data = ema_cross_strategy.calc_indicators(dataframe=candles, ema_one=ema_one, ema_two=ema_two)
+    looped = ema_cross_strategy.det_trade(dataframe=data.copy(), ema_one=ema_one, ema_two=ema_two, vectorized=False)
+    vectorized = ema_cross_strategy.det_trade(dataframe=data.copy(), ema_one=ema_one, ema_two=ema_two)
+    # The crosses cover both GREEN (BUY) and RED (SELL) previous candles
+    rows = numpy.flatnonzero(looped['stop_price'].to_numpy() > 0)
+    green = looped['open'].to_numpy()[rows - 1] < looped['close'].to_numpy()[rows - 1]
+    assert green.any() and not green.all()
+    # The loop never reaches the last candle, which the vectorized version also covers
+    for column in ['take_profit', 'stop_price', 'stop_loss']:
+        numpy.testing.assert_allclose(vectorized[column].to_numpy()[:-1], looped[column].to_numpy()[:-1], rtol=0,
+                                      atol=1e-12)
+
+
+def test_det_trade_includes_last_candle(terminal):
+    candles = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=2000, use_cache=False)
+    data = ema_cross_strategy.calc_indicators(dataframe=candles, ema_one=5, ema_two=10)
+    data['ema_cross'] = False
+    data.loc[data.index[-1], 'ema_cross'] = True
+    vectorized = ema_cross_strategy.det_trade(dataframe=data.copy(), ema_one=5, ema_two=10)
+    previous = data.iloc[-2]
+    if previous['open'] < previous['close']:
+        stop_price = previous['high']
+    else:
+        stop_price = previous['low']
+    assert vectorized['stop_price'].iat[-1] == stop_price
+    assert vectorized['stop_loss'].iat[-1] == previous['ema_10']
+    assert vectorized['take_profit'].iat[-1] == pytest.approx(2 * stop_price - previous['ema_10'])
+
+
+def test_streaming_state_resyncs_after_a_missed_candle(terminal):
+    key = ("EURUSD", "M1", 5, 10)
+    terminal.advance(60)
+    ema_cross_strategy.get_streaming_trade_event(symbol="EURUSD", timeframe="M1", number_of_candles=300, ema_one=5,
+                                                 ema_two=10)
+    state = ema_cross_strategy.streaming_states[key]
+    # One candle at a time, the state is updated in place
+    terminal.advance(60)
+    ema_cross_strategy.get_streaming_trade_event(symbol="EURUSD", timeframe="M1", number_of_candles=300, ema_one=5,
+                                                 ema_two=10)
+    assert ema_cross_strategy.streaming_states[key] is state
+    # Skip a candle: the previous candle reported by MT5 is not the one the state holds
+    latest_time = state.latest['time']
+    terminal.advance(120)
+    candles = ema_cross_strategy.get_data(symbol="EURUSD", timeframe="M1", number_of_candles=2).to_dict('records')
+    assert state.update(candle=candles[1], previous_time=candles[0]['time']) is False
+    assert state.latest['time'] == latest_time
+    trade_event = ema_cross_strategy.get_streaming_trade_event(symbol="EURUSD", timeframe="M1",
+                                                               number_of_candles=300, ema_one=5, ema_two=10)
+    # Re-seeded from the full window, so the EMAs match calc_emas over it
+    assert ema_cross_strategy.streaming_states[key] is not state
+    data = indicator_lib.calc_emas(
+        dataframe=ema_cross_strategy.get_data(symbol="EURUSD", timeframe="M1", number_of_candles=300),
+        ema_sizes=[5, 10]
+    )
+    assert trade_event['time'] == data['time'].iat[-1]
+    for column in ['ema_5', 'ema_10']:
+        assert ema_cross_strategy.streaming_states[key].latest[column] == pytest.approx(data[column].iat[-1],
+                                                                                         rel=1e-12)
+        assert ema_cross_strategy.streaming_states[key].previous[column] == pytest.approx(data[column].iat[-2],
+                                                                                           rel=1e-12)
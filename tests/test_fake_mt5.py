@@ -0,0 +1,33 @@
+import numpy
+
+import fake_mt5
+import mt5_lib
+
+
+def test_candles_are_deterministic(terminal):
+    candles = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=500, use_cache=False)
+    last = terminal.time // 60 - 1
+    other = fake_mt5.FakeTerminal().get_rates("EURUSD", fake_mt5.TIMEFRAME_M1, last - 499, last)
+    assert len(candles) == 500
+    numpy.testing.assert_array_equal(candles['close'].values, other['close'])
+    assert (candles['high'] >= candles[['open', 'close']].max(axis=1)).all()
+    assert (candles['low'] <= candles[['open', 'close']].min(axis=1)).all()
+
+
+def test_cached_candles_match_a_full_fetch(terminal):
+    mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=200)
+    terminal.advance(5 * 60)
+    cached = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=200)
+    fetched = mt5_lib.get_candlesticks(symbol="EURUSD", timeframe="M1", number_of_candles=200, use_cache=False)
+    numpy.testing.assert_array_equal(cached['time'].values, fetched['time'].values)
+    numpy.testing.assert_array_equal(cached['close'].values, fetched['close'].values)
+
+
+def test_place_and_cancel_order(terminal):
+    bid, ask = terminal.get_quote("EURUSD")
+    outcome = mt5_lib.place_order(order_type="BUY_STOP", symbol="EURUSD", volume=0.1, stop_loss=ask - 0.005,
+                                  take_profit=ask + 0.01, comment="TEST", stop_price=ask + 0.002)
+    assert outcome
+    assert list(terminal.orders) == [outcome.order]
+    mt5_lib.cancel_filtered_orders(symbol="EURUSD", comment="TEST")
+    assert not terminal.orders
@@ -0,0 +1,28 @@
+import os
+
+import numpy
+
+import fake_mt5
+import history_store
+
+
+def test_append_after_an_interrupted_append(tmp_path):
+    terminal = fake_mt5.FakeTerminal()
+    candles = terminal.get_rates("EURUSD", fake_mt5.TIMEFRAME_M1, 1000, 1299)
+    history_folder = str(tmp_path)
+    assert history_store.append_candles("EURUSD", "M1", candles[:100], history_folder=history_folder) == 100
+    # Interrupt an append after some of the columns: 'time' is never written, one column only part of a row
+    history_path = history_store.get_history_path("EURUSD", "M1", history_folder=history_folder)
+    for name in ['close', 'high', 'low', 'open']:
+        with open(os.path.join(history_path, f"{name}.bin"), mode='ab') as column_file:
+            if name == 'low':
+                column_file.write(candles[name][100:125].tobytes() + b"\x00\x01\x02")
+            else:
+                candles[name][100:150].tofile(column_file)
+    assert len(history_store.read_candles("EURUSD", "M1", history_folder=history_folder)) == 100
+    # The next append resumes from the last complete row
+    assert history_store.append_candles("EURUSD", "M1", candles[100:], history_folder=history_folder) == 200
+    stored = history_store.open_history("EURUSD", "M1", history_folder=history_folder)
+    for name in candles.dtype.names:
+        assert len(stored[name]) == 300
+        numpy.testing.assert_array_equal(stored[name], candles[name])
@@ -0,0 +1,90 @@
+import numpy
+import pytest
+
+import fake_mt5
+import indicator_backend
+
+talib = pytest.importorskip("talib")
+
+PERIODS = [2, 5, 14, 30, 200]
+
+
+# Fixture giving candles and switching to the numpy backend
+@pytest.fixture
+def candles():
+    """
+    Fixture giving 20000 M1 candles from the fake terminal, with the numpy backend selected for the test
+    :return: structured array of candles
+    """
+    previous_backend = indicator_backend.backend
+    indicator_backend.set_backend("numpy")
+    yield fake_mt5.FakeTerminal().get_rates("EURUSD", fake_mt5.TIMEFRAME_M1, 100000, 119999)
+    indicator_backend.set_backend(previous_backend)
+
+
+# Function to compare a numpy output with TA-Lib
+def assert_matches(values, expected, tolerance):
+    """
+    Function to check two outputs have NaN in the same places and match within tolerance elsewhere
+    """
+    values = numpy.asarray(values)
+    expected = numpy.asarray(expected)
+    numpy.testing.assert_array_equal(numpy.isnan(values), numpy.isnan(expected))
+    numpy.testing.assert_allclose(values, expected, rtol=0, atol=tolerance, equal_nan=True)
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_sma(candles, period):
+    assert_matches(indicator_backend.sma(candles['close'], period), talib.SMA(candles['close'], period), 1e-12)
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_ema(candles, period):
+    assert_matches(indicator_backend.ema(candles['close'], period), talib.EMA(candles['close'], period), 1e-12)
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_rsi(candles, period):
+    assert_matches(indicator_backend.rsi(candles['close'], period), talib.RSI(candles['close'], period), 1e-9)
+
+
+@pytest.mark.parametrize("period", [1] + PERIODS)
+def test_atr(candles, period):
+    assert_matches(indicator_backend.atr(candles['high'], candles['low'], candles['close'], period),
+                   talib.ATR(candles['high'], candles['low'], candles['close'], period), 1e-12)
+
+
+@pytest.mark.parametrize("fast_period, slow_period, signal_period", [(12, 26, 9), (5, 35, 5)])
+def test_macd(candles, fast_period, slow_period, signal_period):
+    outputs = indicator_backend.macd(candles['close'], fast_period, slow_period, signal_period)
+    expected = talib.MACD(candles['close'], fast_period, slow_period, signal_period)
+    for values, expected_values in zip(outputs, expected):
+        assert_matches(values, expected_values, 1e-12)
+
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_bollinger_bands(candles, period):
+    outputs = indicator_backend.bollinger_bands(candles['close'], period, 2.0, 1.5)
+    expected = talib.BBANDS(candles['close'], period, 2.0, 1.5, 0)
+    for values, expected_values in zip(outputs, expected):
+        assert_matches(values, expected_values, 1e-12)
+
+
+def test_bollinger_bands_of_a_flat_series():
+    close = numpy.full(50, 1.23456)
+    upper, middle, lower = indicator_backend.bollinger_bands(close, 20)
+    numpy.testing.assert_array_equal(upper[19:], middle[19:])
+    numpy.testing.assert_array_equal(lower[19:], middle[19:])
+
+
+@pytest.mark.parametrize("decay", [1e-9, 0.3, 9 / 11, 199 / 201, 0.9999])
+@pytest.mark.parametrize("number_of_values", [1, 7, 1000, 20001])
+def test_linear_filter_matches_the_loop(decay, number_of_values):
+    values = 1 + numpy.cumsum(numpy.random.default_rng(0).normal(0, 1e-3, number_of_values))
+    expected = []
+    previous = 1.5
+    for value in values.tolist():
+        previous = decay * previous + (1 - decay) * value
+        expected.append(previous)
+    output = indicator_backend.calc_linear_filter(values, decay=decay, gain=1 - decay, initial=1.5)
+    numpy.testing.assert_allclose(output, expected, rtol=1e-12, atol=0)
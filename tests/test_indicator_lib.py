@@ -0,0 +1,60 @@
+import numpy
+import pytest
+
+import fake_mt5
+import indicator_lib
+from candle_frame import CandleFrame
+
+
+# Function to calculate an EMA with the original row by row loop
+def calc_ema_loop(close_values, ema_size):
+    output = [0.00] * len(close_values)
+    if ema_size < len(close_values):
+        output[ema_size] = float(numpy.mean(close_values[:ema_size]))
+        multiplier = 2 / (ema_size + 1)
+        for i in range(ema_size + 1, len(close_values)):
+            output[i] = close_values[i] * multiplier + output[i - 1] * (1 - multiplier)
+    return numpy.array(output)
+
+
+@pytest.fixture
+def candles():
+    return fake_mt5.FakeTerminal().get_rates("EURUSD", fake_mt5.TIMEFRAME_M1, 100000, 104999)
+
+
+@pytest.mark.parametrize("number_of_candles", [3, 10, 11, 5000])
+def test_calc_ema_values_matches_the_loop(candles, number_of_candles):
+    close_values = candles['close'][:number_of_candles]
+    ema_values = indicator_lib.calc_ema_values(close_values=close_values, ema_sizes=[5, 10, 200, 5])
+    assert list(ema_values) == [5, 10, 200]
+    for ema_size, values in ema_values.items():
+        numpy.testing.assert_allclose(values, calc_ema_loop(close_values.tolist(), ema_size), rtol=1e-12, atol=0)
+
+
+def test_calc_frame_emas_writes_into_the_frame(candles):
+    frame = CandleFrame(capacity=len(candles))
+    frame.load(candles)
+    indicator_lib.calc_frame_emas(frame=frame, ema_sizes=[5, 10])
+    buffers = {name: frame.columns[name] for name in ['ema_5', 'ema_10']}
+    # A second load with other candles reuses the same buffers and leaves no stale values
+    frame.load(candles[:3000])
+    indicator_lib.calc_frame_emas(frame=frame, ema_sizes=[5, 10])
+    for ema_size in [5, 10]:
+        assert frame.columns[f"ema_{ema_size}"] is buffers[f"ema_{ema_size}"]
+        numpy.testing.assert_allclose(frame[f"ema_{ema_size}"], calc_ema_loop(candles['close'][:3000].tolist(),
+                                                                              ema_size), rtol=1e-12, atol=0)
+
+
+def test_streaming_state_matches_batch(candles):
+    frame = CandleFrame(capacity=len(candles))
+    frame.load(candles)
+    indicator_lib.calc_frame_emas(frame=frame, ema_sizes=[5, 10])
+    indicator_lib.calc_frame_ema_cross(frame=frame, ema_one=5, ema_two=10)
+    dataframe = frame.to_dataframe(columns=['time', 'open', 'high', 'low', 'close'])
+    state = indicator_lib.EmaCrossState(ema_one=5, ema_two=10)
+    assert state.seed(dataframe=dataframe.iloc[:1000])
+    for record in dataframe.iloc[1000:].to_dict('records'):
+        assert state.update(candle=record)
+        index = state.latest['index']
+        assert state.latest['ema_cross'] == frame['ema_cross'][index]
+        assert state.latest['ema_10'] == pytest.approx(frame['ema_10'][index], rel=1e-12)
@@ -0,0 +1,39 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_error_on_one_symbol_does_not_stop_the_cycle(terminal, monkeypatch, tmp_path, max_workers):
+    # Keep any snapshot written by the strategy out of the repository
+    monkeypatch.chdir(tmp_path)
+    ran = []
+    run_symbol_strategy = main.run_symbol_strategy
+
+    def fail_on_gbpusd(symbol, timeframe, comment):
+        if symbol == "GBPUSD":
+            raise ValueError("no candles")
+        ran.append(symbol)
+        return run_symbol_strategy(symbol=symbol, timeframe=timeframe, comment=comment)
+
+    monkeypatch.setattr(main, "run_symbol_strategy", fail_on_gbpusd)
+    project_settings = {"mt5": {"symbols": ["EURUSD", "GBPUSD", "AUDUSD"], "timeframe": "M1"}}
+    assert main.run_strategy(project_settings=project_settings, comment="TEST", max_workers=max_workers) is False
+    assert sorted(ran) == ["AUDUSD", "EURUSD"]
+    assert main.run_strategy(project_settings={"mt5": {"symbols": ["EURUSD"], "timeframe": "M1"}},
+                             comment="TEST", max_workers=max_workers) is True
+
+
+def test_backoff_grows_while_idle_up_to_the_cap():
+    assert main.get_backoff_wait(wait=30, period=60, idle_candles=0) == 30
+    assert main.get_backoff_wait(wait=30, period=60, idle_candles=1) == 90
+    assert main.get_backoff_wait(wait=30, period=60, idle_candles=2) == 210
+    assert main.get_backoff_wait(wait=30, period=60, idle_candles=20) == main.MAX_BACKOFF
+
+
+@pytest.mark.parametrize("timeframe", ["H1", "H4", "D1"])
+def test_backoff_never_wakes_before_the_next_candle(timeframe):
+    period = main.mt5_lib.get_timeframe_seconds(timeframe)
+    for wait in [1, period / 2, period]:
+        for idle_candles in range(12):
+            assert main.get_backoff_wait(wait=wait, period=period, idle_candles=idle_candles) >= wait
@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+import backtest
+import fake_mt5
+from make_trade import make_trade
+
+
+@pytest.mark.parametrize("symbol, digits, price", [("EURUSD", 5, None), ("USDJPY", 3, None),
+                                                   ("PEPEUSD", 9, 0.000012345)])
+def test_prices_keep_the_digits_of_the_symbol(terminal, symbol, digits, price):
+    if price is not None:
+        terminal.add_symbol(symbol, currency_base="PEP", price=price, digits=digits, contract_size=1e9)
+    bid, ask = terminal.get_quote(symbol)
+    tick_size = 10.0 ** -digits
+    # Prices between ticks, as they come out of the indicators
+    stop_price = ask + 40.4 * tick_size
+    stop_loss = stop_price - 300.3 * tick_size
+    take_profit = stop_price + 300.6 * tick_size
+    outcome = make_trade(balance=100000, comment="TEST", amount_to_risk=0.01, symbol=symbol,
+                         take_profit=take_profit, stop_loss=stop_loss, stop_price=stop_price)
+    assert outcome
+    order = terminal.orders[outcome.order]
+    assert order.price_open == round(stop_price, digits)
+    assert order.sl == round(stop_loss, digits)
+    assert order.tp == round(take_profit, digits)
+
+
+def test_no_trade_on_a_non_forex_symbol_without_a_cross_rate(terminal):
+    # No HKD cross rate to convert into the USD account currency. The FOREX calculation would size 0.02 lots
+    terminal.add_symbol("HKIDX", currency_base="HKD", currency_profit="HKD", price=100.0, digits=2,
+                        contract_size=1.0, calc_mode=fake_mt5.SYMBOL_CALC_MODE_CFD)
+    bid, ask = terminal.get_quote("HKIDX")
+    stop_price = round(ask + 0.5, 2)
+    stop_loss = round(stop_price - 0.5, 2)
+    outcome = make_trade(balance=100000, comment="TEST", amount_to_risk=0.01, symbol="HKIDX",
+                         take_profit=stop_price + 1.0, stop_loss=stop_loss, stop_price=stop_price)
+    assert outcome is False
+    assert not terminal.orders
+    lot_size = backtest.calc_order_lot_sizes(symbol="HKIDX", balance=100000, amount_to_risk=0.01,
+                                             stop_loss=numpy.array([stop_loss]), stop_price=numpy.array([stop_price]))
+    numpy.testing.assert_array_equal(lot_size, [0.00])
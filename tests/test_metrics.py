@@ -0,0 +1,69 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def instrumentation(monkeypatch):
+    """
+    Fixture giving each test empty histograms, and restoring the instrumentation settings afterwards
+    :return: None
+    """
+    monkeypatch.setattr(metrics, "enabled", False)
+    monkeypatch.setattr(metrics, "log_filepath", None)
+    metrics.reset()
+    yield
+    metrics.stop_server()
+    metrics.reset()
+
+
+def test_nothing_is_recorded_while_disabled(instrumentation):
+    assert metrics.timed("fetch", "EURUSD") is metrics.NULL_TIMER
+    metrics.observe(stage="fetch", symbol="EURUSD", seconds=0.001)
+    metrics.increment("order_retry_requote", "EURUSD")
+    assert metrics.snapshot() == {}
+
+
+def test_render_and_log(instrumentation, tmp_path):
+    log_filepath = str(tmp_path / "metrics.jsonl")
+    metrics.enable(log_file=log_filepath)
+    for seconds in [0.0004, 0.002, 0.002, 20.0]:
+        metrics.observe(stage="fetch", symbol="EURUSD", seconds=seconds)
+    metrics.increment("order_retry_requote", "EURUSD", value=2)
+    with metrics.timed("risk_refresh"):
+        pass
+    text = metrics.render()
+    name = metrics.METRIC_NAME
+    # Buckets are cumulative, observations past the last bound only count in +Inf
+    assert f'{name}_bucket{{stage="fetch",symbol="EURUSD",le="0.0005"}} 1' in text
+    assert f'{name}_bucket{{stage="fetch",symbol="EURUSD",le="0.001"}} 1' in text
+    assert f'{name}_bucket{{stage="fetch",symbol="EURUSD",le="0.0025"}} 3' in text
+    assert f'{name}_bucket{{stage="fetch",symbol="EURUSD",le="10.0"}} 3' in text
+    assert f'{name}_bucket{{stage="fetch",symbol="EURUSD",le="+Inf"}} 4' in text
+    assert f'{name}_count{{stage="fetch",symbol="EURUSD"}} 4' in text
+    assert f'{name}_count{{stage="risk_refresh",symbol=""}} 1' in text
+    assert f'{metrics.EVENT_METRIC_NAME}{{event="order_retry_requote",symbol="EURUSD"}} 2' in text
+    # Observations are written to the log on flush only
+    assert metrics.flush_log() == 6
+    assert metrics.flush_log() == 0
+    with open(log_filepath) as log_file:
+        events = [json.loads(line) for line in log_file]
+    assert [event.get('stage', event.get('event')) for event in events] == \
+        ["fetch"] * 4 + ["order_retry_requote", "risk_refresh"]
+
+
+def test_endpoint(instrumentation):
+    metrics.enable(port=0)
+    metrics.observe(stage="order_send", symbol="EURUSD", seconds=0.01)
+    host, port = metrics.server.server_address[:2]
+    with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert response.read().decode("utf-8") == metrics.render()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://{host}:{port}/other", timeout=5)
+    assert error.value.code == 404
@@ -0,0 +1,37 @@
+import asyncio
+
+import mt5_lib
+from mt5_async import AsyncMT5
+
+
+# Function to run coroutines against a new client
+def run(coroutine_function):
+    async def main():
+        client = AsyncMT5()
+        try:
+            return await coroutine_function(client)
+        finally:
+            client.shutdown()
+    return asyncio.run(main())
+
+
+def test_coalesced_callers_get_their_own_snapshot(terminal):
+    bid, ask = terminal.get_quote("EURUSD")
+    mt5_lib.place_order(order_type="BUY_STOP", symbol="EURUSD", volume=0.1, stop_loss=ask - 0.005,
+                        take_profit=ask + 0.01, comment="TEST", stop_price=ask + 0.002, fast_path=True)
+    terminal.calls.clear()
+    first, second = run(lambda client: asyncio.gather(client.get_order_snapshot(), client.get_order_snapshot()))
+    assert terminal.calls['orders_get'] == 1
+    assert first == second and first is not second
+    first[("EURUSD", "TEST")].clear()
+    assert len(second[("EURUSD", "TEST")]) == 1
+
+
+def test_cancellations_are_not_coalesced(terminal):
+    terminal.calls.clear()
+    outcomes = run(lambda client: asyncio.gather(
+        client.cancel_filtered_orders(symbol="EURUSD", comment="TEST"),
+        client.cancel_filtered_orders(symbol="EURUSD", comment="TEST")
+    ))
+    assert outcomes == [True, True]
+    assert terminal.calls['orders_get'] == 2
@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+import fake_mt5
+import mt5_lib
+from helper_functions import calc_lot_size
+from make_trade import make_trade
+
+
+# Function to place a BUY_STOP well clear of the market
+def place_buy_stop(terminal, symbol="EURUSD", comment="TEST"):
+    bid, ask = terminal.get_quote(symbol)
+    return mt5_lib.place_order(order_type="BUY_STOP", symbol=symbol, volume=0.1, stop_loss=ask - 0.005,
+                               take_profit=ask + 0.01, comment=comment, stop_price=ask + 0.002, fast_path=True)
+
+
+def test_lost_reply_is_not_resent(terminal):
+    terminal.lose_replies(1)
+    outcome = place_buy_stop(terminal)
+    assert outcome
+    assert list(terminal.orders) == [outcome.order]
+    assert terminal.calls['order_send'] == 1
+
+
+def test_timeout_is_resent_when_no_order_was_placed(terminal):
+    terminal.force_retcodes(fake_mt5.TRADE_RETCODE_TIMEOUT)
+    outcome = place_buy_stop(terminal)
+    assert outcome
+    assert outcome.attempts == 2
+    assert list(terminal.orders) == [outcome.order]
+    assert terminal.calls['order_send'] == 2
+
+
+def test_lost_reply_does_not_match_other_orders(terminal):
+    other = place_buy_stop(terminal, comment="OTHER")
+    terminal.lose_replies(1)
+    outcome = place_buy_stop(terminal)
+    assert outcome and outcome.order != other.order
+    assert len(terminal.orders) == 2
+
+
+def test_sizing_metadata_without_account_information(terminal, monkeypatch):
+    monkeypatch.setattr(fake_mt5, "account_info", lambda: None)
+    assert mt5_lib.get_account_currency() is None
+    sizing_metadata = mt5_lib.get_sizing_metadata(symbols=["EURUSD"])
+    assert numpy.isnan(sizing_metadata['quote_to_account'][0])
+    assert sizing_metadata['contract_size'][0] == 100000.0
+
+
+def test_sizing_metadata_of_an_unknown_symbol(terminal):
+    sizing_metadata = mt5_lib.get_sizing_metadata(symbols=["EURUSD", "NOTASYMBOL"])
+    assert sizing_metadata['quote_to_account'][0] == 1.0
+    for values in sizing_metadata.values():
+        assert numpy.isnan(values[1])
+
+
+def test_make_trade_falls_back_without_account_information(terminal, monkeypatch):
+    monkeypatch.setattr(fake_mt5, "account_info", lambda: None)
+    bid, ask = terminal.get_quote("EURUSD")
+    outcome = make_trade(balance=100000, comment="TEST", amount_to_risk=0.01, symbol="EURUSD",
+                         take_profit=ask + 0.004, stop_loss=ask - 0.001, stop_price=ask + 0.001)
+    assert outcome
+    assert outcome.volume == calc_lot_size(balance=100000, risk_amount=0.01, stop_loss=ask - 0.001,
+                                           stop_price=ask + 0.001, symbol="EURUSD")
+
+
+def test_symbols_added_from_several_threads_keep_their_rows(terminal):
+    symbols = [f"SYM{i:03d}" for i in range(200)]
+    for i, symbol in enumerate(symbols):
+        terminal.add_symbol(symbol, digits=i % 6)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda symbol: mt5_lib.symbol_registry.get_field([symbol], "digits"), symbols))
+    digits = mt5_lib.symbol_registry.get_field(symbols, "digits")
+    numpy.testing.assert_array_equal(digits, [i % 6 for i in range(len(symbols))])
+
+
+def test_quote_of_an_unknown_symbol(terminal):
+    bid, ask = mt5_lib.symbol_registry.get_quote("UNKNOWN")
+    assert numpy.isnan(bid) and numpy.isnan(ask)
+    assert numpy.isnan(mt5_lib.get_exchange_rate("UNKNOWN"))
+
+
+def test_cancel_filtered_orders_reports_each_ticket(terminal):
+    tickets = {}
+    for symbol, comment in [("EURUSD", "A"), ("GBPUSD", "A"), ("AUDUSD", "A"), ("EURUSD", "B")]:
+        bid, ask = terminal.get_quote(symbol)
+        outcome = make_trade(balance=100000, comment=comment, amount_to_risk=0.01, symbol=symbol,
+                             take_profit=ask + 0.004, stop_loss=ask - 0.001, stop_price=ask + 0.001)
+        assert outcome
+        tickets[(symbol, comment)] = outcome.order
+    # The first removal is refused, the second times out and is sent again
+    terminal.force_retcodes(fake_mt5.TRADE_RETCODE_INVALID, fake_mt5.TRADE_RETCODE_TIMEOUT)
+    requests = terminal.calls['orders_get']
+    outcomes = mt5_lib.cancel_filtered_orders_for_symbols(symbols=["EURUSD", "GBPUSD"], comments=["A"])
+    # One snapshot of open orders for every symbol
+    assert terminal.calls['orders_get'] == requests + 1
+    assert outcomes == {tickets[("EURUSD", "A")]: False, tickets[("GBPUSD", "A")]: True}
+    assert set(terminal.orders) == {tickets[("EURUSD", "A")], tickets[("AUDUSD", "A")], tickets[("EURUSD", "B")]}
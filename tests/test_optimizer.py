@@ -0,0 +1,50 @@
+import pandas
+
+import fake_mt5
+import history_store
+import optimizer
+
+
+def test_rank_results():
+    results = pandas.DataFrame([
+        {'symbol': "EURUSD", 'ema_one': 5, 'ema_two': 10, 'risk': 0.01, 'signals': 4, 'filled': 2, 'wins': 1,
+         'losses': 1, 'profit': 50.0, 'max_drawdown': 30.0},
+        {'symbol': "GBPUSD", 'ema_one': 5, 'ema_two': 10, 'risk': 0.01, 'signals': 2, 'filled': 1, 'wins': 1,
+         'losses': 0, 'profit': 40.0, 'max_drawdown': 10.0},
+        {'symbol': "EURUSD", 'ema_one': 8, 'ema_two': 20, 'risk': 0.01, 'signals': 3, 'filled': 3, 'wins': 3,
+         'losses': 0, 'profit': 90.0, 'max_drawdown': 5.0},
+        {'symbol': "EURUSD", 'ema_one': 2, 'ema_two': 10, 'risk': 0.01, 'signals': 3, 'filled': 3, 'wins': 3,
+         'losses': 0, 'profit': 90.0, 'max_drawdown': 20.0},
+    ])
+    ranked = optimizer.rank_results(results=results)
+    # Profits are summed across symbols, ties go to the smaller drawdown
+    assert ranked[['rank', 'ema_one', 'ema_two']].values.tolist() == [[1, 8, 20], [2, 2, 10], [3, 5, 10]]
+    assert ranked.loc[2, ['symbols', 'signals', 'profit', 'max_drawdown']].tolist() == [2, 6, 90.0, 30.0]
+
+
+def test_sweep_resumes_from_the_results_file(terminal, tmp_path, monkeypatch, capsys):
+    # The history store is read from its default folder, relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    for symbol in ["EURUSD", "GBPUSD"]:
+        candles = terminal.get_rates(symbol, fake_mt5.TIMEFRAME_M1, 100000, 102999)
+        history_store.append_candles(symbol=symbol, timeframe="M1", candles=candles)
+    results_filepath = str(tmp_path / "results.csv")
+    sweep = dict(symbols=["EURUSD", "GBPUSD"], timeframe="M1", ema_ones=[5, 8], ema_twos=[10, 20],
+                 risks=[0.01, 0.02], balance=100000, max_workers=2, chunk_size=2)
+    ranked = optimizer.run_sweep(results_filepath=results_filepath, **sweep)
+    full = optimizer.read_results(results_filepath=results_filepath)
+    # 4 pairs with ema_one < ema_two, 2 risks, 2 symbols
+    assert len(full) == 16
+    assert len(ranked) == 8
+    # Interrupt the sweep: only the first results made it to the file
+    full.head(5).to_csv(results_filepath, index=False)
+    capsys.readouterr()
+    resumed = optimizer.run_sweep(results_filepath=results_filepath, **sweep)
+    assert "5 results already completed" in capsys.readouterr().out
+    results = optimizer.read_results(results_filepath=results_filepath)
+    assert len(results) == 16
+    assert not results.duplicated(subset=optimizer.RESULT_KEY).any()
+    key = optimizer.RESULT_KEY
+    pandas.testing.assert_frame_equal(results.sort_values(key, ignore_index=True),
+                                      full.sort_values(key, ignore_index=True))
+    pandas.testing.assert_frame_equal(resumed, ranked)
@@ -0,0 +1,68 @@
+import pytest
+
+import mt5_lib
+import portfolio_risk
+from make_trade import make_trade
+
+
+# Function to make a BUY_STOP trade on EURUSD
+def buy_eurusd(terminal, amount_to_risk=0.01, comment="TEST"):
+    bid, ask = terminal.get_quote("EURUSD")
+    return make_trade(balance=100000, comment=comment, amount_to_risk=amount_to_risk, symbol="EURUSD",
+                      take_profit=ask + 0.004, stop_loss=ask - 0.001, stop_price=ask + 0.001)
+
+
+def test_exposure_of_positions_and_orders(terminal):
+    terminal.add_position("EURUSD", 1.0)
+    terminal.add_position("USDJPY", 2.0)
+    assert portfolio_risk.book.refresh()
+    exposure = portfolio_risk.book.get_exposure()
+    # Valued in the account currency (USD) at the open price, with JPY converted at the current USDJPY bid
+    eur_notional = 1.0 * 100000 * terminal.positions[1].price_open
+    jpy_notional = 2.0 * 100000 * terminal.positions[2].price_open / terminal.get_quote("USDJPY")[0]
+    assert exposure['EUR'] == pytest.approx(eur_notional)
+    assert exposure['USD'] == pytest.approx(jpy_notional - eur_notional)
+    assert exposure['JPY'] == pytest.approx(-jpy_notional)
+
+
+def test_lot_size_is_capped_by_the_exposure_limit(terminal):
+    portfolio_risk.book.max_currency_exposure = 1.0
+    assert portfolio_risk.book.refresh()
+    outcome = buy_eurusd(terminal, amount_to_risk=0.05)
+    assert outcome
+    limit = portfolio_risk.book.equity / (100000 * terminal.orders[outcome.order].price_open)
+    assert 0 < outcome.volume <= limit
+    # Nothing is left for a second order in the same direction
+    assert buy_eurusd(terminal, amount_to_risk=0.05, comment="OTHER") is False
+
+
+def test_reservations_are_dropped_when_the_refresh_runs_out_of_time(terminal):
+    portfolio_risk.book.max_currency_exposure = 1.0
+    assert portfolio_risk.book.refresh()
+    # The order is rejected by the terminal, so only its reservation would be left behind
+    lot_size, key = portfolio_risk.book.cap_lot_size(symbol="EURUSD", lot_size=5.0, is_buy=True, price=1.08)
+    assert key is not None
+    assert not portfolio_risk.book.refresh(budget=0.0)
+    assert all(entry_key[0] != "reserved" for entry_key in portfolio_risk.book.entries)
+    assert portfolio_risk.book.get_exposure()['EUR'] == pytest.approx(0.0)
+
+
+def test_reservation_is_released_when_place_order_raises(terminal, monkeypatch):
+    assert portfolio_risk.book.refresh()
+
+    def fail(**kwargs):
+        raise Exception("Turn off Algo Trading on MT5 Terminal")
+
+    monkeypatch.setattr(mt5_lib, "place_order", fail)
+    with pytest.raises(Exception):
+        buy_eurusd(terminal)
+    assert not portfolio_risk.book.entries
+
+
+def test_position_on_an_unknown_symbol_is_left_out(terminal):
+    terminal.add_position("DELISTED", 1.0, price=1.0)
+    terminal.add_position("EURUSD", 1.0)
+    assert portfolio_risk.book.refresh()
+    exposure = portfolio_risk.book.get_exposure()
+    assert set(exposure) == {'EUR', 'USD'}
+    assert exposure['EUR'] == pytest.approx(100000 * terminal.positions[2].price_open)
@@ -0,0 +1,101 @@
+import pytest
+
+import ema_cross_strategy
+import indicator_lib
+import main
+import metrics
+import strategy_lib
+
+
+def test_strategy_must_implement_abstract_methods():
+    class NoIndicators(strategy_lib.Strategy):
+        def det_trade_event(self, frame):
+            return {}
+
+    with pytest.raises(TypeError):
+        NoIndicators(comment="TEST")
+
+
+def test_shared_indicators_are_computed_once(terminal, monkeypatch, tmp_path):
+    # Keep any snapshot written by the strategy out of the repository
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(strategy_lib, "make_trade", lambda **kwargs: False)
+    frames = []
+    ema_size_calls = []
+    get_frame = ema_cross_strategy.get_frame
+    calc_frame_emas = indicator_lib.calc_frame_emas
+
+    def count_frames(**kwargs):
+        frames.append(kwargs['key'])
+        return get_frame(**kwargs)
+
+    def count_emas(frame, ema_sizes):
+        ema_size_calls.append(list(ema_sizes))
+        return calc_frame_emas(frame=frame, ema_sizes=ema_sizes)
+
+    monkeypatch.setattr(ema_cross_strategy, "get_frame", count_frames)
+    monkeypatch.setattr(indicator_lib, "calc_frame_emas", count_emas)
+    strategies = [strategy_lib.EmaCrossStrategy(ema_one=5, ema_two=10),
+                  strategy_lib.EmaCrossStrategy(ema_one=5, ema_two=20)]
+    outcomes = strategy_lib.run_strategies(symbol="EURUSD", timeframe="M1", number_of_candles=300, balance=100000,
+                                           amount_to_risk=0.01, strategies=strategies)
+    assert set(outcomes) == {strategy.comment for strategy in strategies}
+    assert frames == [("EURUSD", "M1")]
+    assert ema_size_calls == [[5, 10, 20]]
+
+
+def test_streaming_matches_the_graph(terminal):
+    strategy = strategy_lib.EmaCrossStrategy(ema_one=5, ema_two=10)
+    crosses = 0
+    for _ in range(150):
+        terminal.advance(60)
+        candles = ema_cross_strategy.get_data(symbol="EURUSD", timeframe="M1", number_of_candles=2).to_dict('records')
+        streaming_event = strategy.det_streaming_trade_event(symbol="EURUSD", timeframe="M1", number_of_candles=300,
+                                                             candles=candles)
+        graph = strategy_lib.IndicatorGraph()
+        for node in strategy.indicators():
+            graph.add(node)
+        frame = graph.compute(ema_cross_strategy.get_frame(symbol="EURUSD", timeframe="M1", number_of_candles=300))
+        graph_event = strategy.det_trade_event(frame)
+        assert streaming_event['ema_cross'] == graph_event['ema_cross']
+        for name in ['stop_price', 'stop_loss', 'take_profit']:
+            assert streaming_event[name] == pytest.approx(graph_event[name])
+        crosses += graph_event['ema_cross']
+    assert crosses > 0
+
+
+def test_main_strategy_runs_through_the_registry(terminal, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    def fail(**kwargs):
+        raise AssertionError("the main strategy must run through strategy_lib")
+
+    monkeypatch.setattr(ema_cross_strategy, "ema_cross_strategy", fail)
+    project_settings = {"mt5": {"symbols": ["EURUSD", "GBPUSD"], "timeframe": "M1"}}
+    assert main.run_strategy(project_settings=project_settings, comment="TEST", max_workers=1) is True
+    strategy = strategy_lib.strategy_registry["TEST"]
+    assert (strategy.ema_one, strategy.ema_two) == (main.EMA_1_PERIOD, main.EMA_2_PERIOD)
+    # Registered once, however many cycles run
+    assert main.run_strategy(project_settings=project_settings, comment="TEST", max_workers=1) is True
+    assert list(strategy_lib.strategy_registry) == ["TEST"]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_each_stage_is_timed_once_per_cycle(terminal, monkeypatch, tmp_path, streaming):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(strategy_lib, "make_trade", lambda **kwargs: False)
+    strategy = strategy_lib.EmaCrossStrategy(ema_one=5, ema_two=10)
+    metrics.reset()
+    metrics.enable()
+    try:
+        for _ in range(5):
+            terminal.advance(60)
+            strategy_lib.run_strategies(symbol="EURUSD", timeframe="M1", number_of_candles=300, balance=100000,
+                                        amount_to_risk=0.01, strategies=[strategy], streaming=streaming)
+        histograms = metrics.snapshot()
+    finally:
+        metrics.disable()
+        metrics.reset()
+    assert histograms[("det_trade", "EURUSD")]['count'] == 5
+    assert histograms[("calc_indicators", "EURUSD")]['count'] == 5
+    assert ("get_data", "EURUSD") not in histograms
@@ -0,0 +1,74 @@
+import datetime
+
+import numpy
+
+import fake_mt5
+import tick_feed
+
+
+# Function to make compact ticks from lists of times, bids and asks
+def make_ticks(times_msc, bids, asks):
+    ticks = numpy.zeros(len(times_msc), dtype=tick_feed.TICK_DTYPE)
+    ticks['time_msc'] = times_msc
+    ticks['bid'] = bids
+    ticks['ask'] = asks
+    return ticks
+
+
+def test_bars_built_from_polled_ticks_match_the_candles(terminal):
+    # Small requests and a small ring, so polls have to catch up over several requests and the ring wraps
+    feed = tick_feed.TickFeed(symbol="EURUSD", capacity=50, fetch_count=25)
+    feed.add_bars(name="M1", seconds=60)
+    feed.add_bars(name="T30", ticks_per_bar=30)
+    start = terminal.time // 60 * 60
+    feed.poll(date_from=datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc))
+    for _ in range(10):
+        terminal.advance(60)
+        feed.poll()
+    # Every tick is received exactly once
+    ticks = tick_feed.to_tick_array(fake_mt5.copy_ticks_range(
+        "EURUSD", start, terminal.time, fake_mt5.COPY_TICKS_ALL
+    ))
+    assert feed.ring.written == len(ticks)
+    numpy.testing.assert_array_equal(feed.ring.tail(), ticks[-50:])
+    # Time based bars follow the M1 candles, the bar of the current minute is still forming
+    bars = feed.get_candlesticks(name="M1", number_of_candles=100)
+    candles = terminal.get_rates("EURUSD", fake_mt5.TIMEFRAME_M1, start // 60, terminal.time // 60 - 1)
+    assert len(bars) == len(candles) == 10
+    for name in ['time', 'open', 'high', 'low', 'close']:
+        numpy.testing.assert_array_equal(bars[name].to_numpy(), candles[name])
+    assert feed.forming(name="M1")['time'][0] == terminal.time // 60 * 60
+    # Tick count bars hold 30 ticks each
+    tick_bars = feed.get_candlesticks(name="T30", number_of_candles=100)
+    assert len(tick_bars) == len(ticks) // 30
+    assert (tick_bars['tick_volume'] == 30).all()
+    numpy.testing.assert_array_equal(tick_bars['open'].to_numpy(), ticks['bid'][:len(tick_bars) * 30:30])
+
+
+def test_replay_buy_stop_fills_at_the_ask_and_slips_on_a_gap():
+    ticks = make_ticks(times_msc=[0, 1000, 2000, 3000, 4000],
+                       bids=[1.0000, 1.0008, 1.0012, 1.0002, 0.9990],
+                       asks=[1.0001, 1.0009, 1.0013, 1.0003, 0.9991])
+    # The ask gaps from 1.0001 to 1.0009, through the stop price
+    status, fill_time, fill_price, exit_time, exit_price, exit_reason = tick_feed.replay_stop_order(
+        ticks=ticks, order_type="BUY_STOP", stop_price=1.0005, stop_loss=0.9995, take_profit=1.0020, start_msc=0,
+        expiry_msc=2000
+    )
+    assert (status, fill_time, fill_price) == ("filled", 1000, 1.0009)
+    # The stop loss is passed by a gap too, so the exit is at the bid of that tick
+    assert (exit_time, exit_price, exit_reason) == (4000, 0.9990, "stop_loss")
+
+
+def test_replay_sell_stop_take_profit_rejected_and_cancelled():
+    ticks = make_ticks(times_msc=[0, 1000, 2000, 3000],
+                       bids=[1.0010, 1.0004, 1.0001, 0.9990],
+                       asks=[1.0011, 1.0005, 1.0002, 0.9991])
+    outcome = tick_feed.replay_stop_order(ticks=ticks, order_type="SELL_STOP", stop_price=1.0005, stop_loss=1.0015,
+                                          take_profit=0.9995, start_msc=0, expiry_msc=2000)
+    assert outcome == ("filled", 1000, 1.0004, 3000, 0.9995, "take_profit")
+    # Already through the market when placed
+    assert tick_feed.replay_stop_order(ticks=ticks, order_type="SELL_STOP", stop_price=1.0020, stop_loss=1.0030,
+                                       take_profit=0.9990, start_msc=0, expiry_msc=2000)[0] == "rejected"
+    # Not reached before the order expires
+    assert tick_feed.replay_stop_order(ticks=ticks, order_type="SELL_STOP", stop_price=0.9995, stop_loss=1.0005,
+                                       take_profit=0.9985, start_msc=0, expiry_msc=2000)[0] == "cancelled"
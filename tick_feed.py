@@ -0,0 +1,438 @@
+import datetime
+
+import MetaTrader5
+import numpy
+import pandas
+
+import metrics
+import mt5_lib
+
+# Ticks kept per symbol in the ring buffer
+TICK_CAPACITY = 100000
+# Most ticks requested from MT5 in one call
+FETCH_COUNT = 10000
+# Compact tick record kept in the ring buffer. MT5 tick records also carry the time in seconds and an integer volume,
+# which are dropped
+TICK_DTYPE = numpy.dtype([
+    ('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<f8'), ('flags', '<u4')
+])
+# Bars built from ticks, same fields as the candles returned by copy_rates_from_pos
+BAR_DTYPE = numpy.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('tick_volume', '<u8'),
+    ('spread', '<i4'), ('real_volume', '<u8')
+])
+
+
+# Function to convert MT5 ticks to compact ticks
+def to_tick_array(ticks):
+    """
+    Function to convert the ticks returned by copy_ticks_from / copy_ticks_range to compact tick records
+    :param ticks: structured array of ticks as returned by MT5. None is treated as no ticks
+    :return: structured array of TICK_DTYPE
+    """
+    if ticks is None:
+        return numpy.empty(0, dtype=TICK_DTYPE)
+    compact = numpy.empty(len(ticks), dtype=TICK_DTYPE)
+    compact['time_msc'] = ticks['time_msc']
+    compact['bid'] = ticks['bid']
+    compact['ask'] = ticks['ask']
+    compact['last'] = ticks['last']
+    compact['volume'] = ticks['volume_real']
+    compact['flags'] = ticks['flags']
+    return compact
+
+
+# Function to retrieve the ticks of a period from MT5
+def get_ticks(symbol, date_from, date_to):
+    """
+    Function to retrieve every tick of a symbol between two dates from MT5, i.e. to replay orders on
+    :param symbol: string of the symbol
+    :param date_from: datetime of the first tick (naive datetimes are taken as UTC)
+    :param date_to: datetime of the last tick
+    :return: structured array of TICK_DTYPE, oldest first
+    """
+    with metrics.timed("tick_fetch", symbol), mt5_lib.mt5_lock:
+        ticks = MetaTrader5.copy_ticks_range(symbol, date_from, date_to, MetaTrader5.COPY_TICKS_ALL)
+    return to_tick_array(ticks)
+
+
+# Class to hold the most recent ticks of a symbol
+class TickRing:
+    """
+    Ring buffer of the most recent ticks of a symbol, preallocated at a fixed capacity. Appending writes the new ticks
+    over the oldest ones, so memory stays bounded however long the feed runs
+    """
+
+    def __init__(self, capacity=TICK_CAPACITY):
+        """
+        :param capacity: integer of the number of ticks kept
+        """
+        self.capacity = capacity
+        self.ticks = numpy.zeros(capacity, dtype=TICK_DTYPE)
+        self.written = 0
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    # Function to append ticks
+    def append(self, ticks):
+        """
+        Function to append ticks, overwriting the oldest ones once the buffer is full
+        :param ticks: structured array of TICK_DTYPE, oldest first
+        :return: None
+        """
+        if len(ticks) == 0:
+            return
+        skipped = max(len(ticks) - self.capacity, 0)
+        ticks = ticks[skipped:]
+        position = (self.written + skipped) % self.capacity
+        # Write up to the end of the buffer, then wrap around to its start
+        first = min(len(ticks), self.capacity - position)
+        self.ticks[position:position + first] = ticks[:first]
+        self.ticks[:len(ticks) - first] = ticks[first:]
+        self.written += skipped + len(ticks)
+
+    # Function to get the most recent ticks
+    def tail(self, number_of_ticks=None):
+        """
+        Function to get the most recent ticks, oldest first
+        :param number_of_ticks: integer of the number of ticks. Defaults to None (every tick held)
+        :return: structured array of TICK_DTYPE (a copy)
+        """
+        size = len(self) if number_of_ticks is None else min(number_of_ticks, len(self))
+        end = self.written % self.capacity
+        if size <= end:
+            return self.ticks[end - size:end].copy()
+        return numpy.concatenate((self.ticks[self.capacity - (size - end):], self.ticks[:end]))
+
+    # Function to get the most recent tick
+    def last(self):
+        """
+        Function to get the most recent tick
+        :return: tick record. None if no tick has been received
+        """
+        if self.written == 0:
+            return None
+        return self.ticks[(self.written - 1) % self.capacity]
+
+
+# Class to build bars from ticks
+class BarBuilder:
+    """
+    Builds bars from ticks as they arrive, either time based (a bar per period of seconds, aligned like MT5 candles)
+    or tick count based (a bar per ticks_per_bar ticks). Bars are built from the bid, as MT5 builds candles. The
+    ticks of the bar still forming are held until it completes, so its current state can be read at any time
+    """
+
+    def __init__(self, seconds=None, ticks_per_bar=None, point=1.0):
+        """
+        :param seconds: integer of the length of a time based bar in seconds
+        :param ticks_per_bar: integer of the number of ticks in a tick count based bar. Give seconds or ticks_per_bar
+        :param point: float of the point size of the symbol, used to express the spread in points
+        """
+        if (seconds is None) == (ticks_per_bar is None):
+            raise ValueError("Provide either seconds or ticks_per_bar")
+        self.seconds = seconds
+        self.ticks_per_bar = ticks_per_bar
+        self.point = point
+        self.pending = numpy.empty(0, dtype=TICK_DTYPE)
+
+    # Function to fold ticks into bars
+    def update(self, ticks):
+        """
+        Function to fold new ticks into bars. A time based bar completes when a tick of a later period arrives, a tick
+        count based bar when it holds ticks_per_bar ticks
+        :param ticks: structured array of TICK_DTYPE, oldest first
+        :return: structured array of BAR_DTYPE of the bars completed by these ticks
+        """
+        if len(ticks) == 0:
+            return numpy.empty(0, dtype=BAR_DTYPE)
+        ticks = numpy.concatenate((self.pending, ticks))
+        if self.seconds is not None:
+            groups = ticks['time_msc'] // (self.seconds * 1000)
+        else:
+            groups = numpy.arange(len(ticks)) // self.ticks_per_bar
+        # Every group but the last is complete. The last is complete too once it is full
+        starts = numpy.flatnonzero(numpy.r_[True, groups[1:] != groups[:-1]])
+        complete = starts[-1]
+        if self.ticks_per_bar is not None and len(ticks) - starts[-1] == self.ticks_per_bar:
+            complete = len(ticks)
+        self.pending = ticks[complete:]
+        return self.make_bars(ticks=ticks[:complete], starts=starts[starts < complete])
+
+    # Function to close the forming bar once its period has passed
+    def flush(self, time_msc):
+        """
+        Function to complete the forming time based bar if time_msc is past its period, for quiet markets where the
+        next tick may be a long time coming
+        :param time_msc: integer of the current server time in milliseconds
+        :return: structured array of BAR_DTYPE of the bar completed. Empty if none
+        """
+        if self.seconds is None or len(self.pending) == 0 \
+                or time_msc // (self.seconds * 1000) == self.pending['time_msc'][0] // (self.seconds * 1000):
+            return numpy.empty(0, dtype=BAR_DTYPE)
+        ticks = self.pending
+        self.pending = numpy.empty(0, dtype=TICK_DTYPE)
+        return self.make_bars(ticks=ticks, starts=numpy.array([0]))
+
+    # Function to get the bar still forming
+    def forming(self):
+        """
+        Function to get the bar still forming, for intrabar checks
+        :return: structured array of BAR_DTYPE holding one bar. Empty if no tick has arrived since the last bar
+        """
+        if len(self.pending) == 0:
+            return numpy.empty(0, dtype=BAR_DTYPE)
+        return self.make_bars(ticks=self.pending, starts=numpy.array([0]))
+
+    # Function to build bars from groups of ticks
+    def make_bars(self, ticks, starts):
+        """
+        Function to build one bar per group of ticks
+        :param ticks: structured array of TICK_DTYPE
+        :param starts: numpy array of the index of the first tick of each group
+        :return: structured array of BAR_DTYPE
+        """
+        bars = numpy.empty(len(starts), dtype=BAR_DTYPE)
+        if len(starts) == 0:
+            return bars
+        ends = numpy.r_[starts[1:], len(ticks)] - 1
+        bids = ticks['bid']
+        times = ticks['time_msc'] // 1000
+        if self.seconds is not None:
+            bars['time'] = times[starts] // self.seconds * self.seconds
+        else:
+            bars['time'] = times[starts]
+        bars['open'] = bids[starts]
+        bars['high'] = numpy.maximum.reduceat(bids, starts)
+        bars['low'] = numpy.minimum.reduceat(bids, starts)
+        bars['close'] = bids[ends]
+        bars['tick_volume'] = ends - starts + 1
+        spreads = numpy.rint((ticks['ask'] - bids) / self.point).astype(numpy.int64)
+        bars['spread'] = numpy.minimum.reduceat(spreads, starts)
+        bars['real_volume'] = numpy.add.reduceat(ticks['volume'], starts)
+        return bars
+
+
+# Class to ingest the ticks of a symbol
+class TickFeed:
+    """
+    Tick ingestion for one symbol. Each poll requests the ticks since the last one received with copy_ticks_from,
+    drops the ones already seen, stores them in a TickRing and folds them into every registered BarBuilder. Completed
+    bars are kept in a CandleCache, so they read like the candles from get_candlesticks
+    """
+
+    def __init__(self, symbol, capacity=TICK_CAPACITY, fetch_count=FETCH_COUNT):
+        """
+        :param symbol: string of the symbol
+        :param capacity: integer of the number of ticks kept
+        :param fetch_count: integer of the most ticks requested in one call
+        """
+        self.symbol = symbol
+        self.ring = TickRing(capacity=capacity)
+        self.fetch_count = fetch_count
+        self.builders = {}
+        self.bars = {}
+        self.last_time_msc = None
+        # Number of ticks received with the time of the last tick. Several ticks can share a millisecond
+        self.last_time_count = 0
+
+    # Function to add a bar builder
+    def add_bars(self, name, seconds=None, ticks_per_bar=None, number_of_candles=1000):
+        """
+        Function to build bars from the ticks of the feed, from the next poll on
+        :param name: string naming the bars (i.e. M1, T100)
+        :param seconds: integer of the length of a time based bar in seconds
+        :param ticks_per_bar: integer of the number of ticks in a tick count based bar
+        :param number_of_candles: integer of the number of completed bars kept
+        :return: BarBuilder
+        """
+        symbol_info = mt5_lib.symbol_registry.get_info(self.symbol)
+        point = symbol_info.point if symbol_info is not None else 1.0
+        self.builders[name] = BarBuilder(seconds=seconds, ticks_per_bar=ticks_per_bar, point=point)
+        self.bars[name] = mt5_lib.CandleCache(max_candles=number_of_candles)
+        return self.builders[name]
+
+    # Function to get new ticks from MT5
+    def poll(self, date_from=None):
+        """
+        Function to request the ticks received since the last poll and fold them into the bars. Requests are repeated
+        while they come back full, so a feed which fell behind catches up in one poll
+        :param date_from: datetime of the first tick wanted on the first poll. Defaults to None (from the latest tick)
+        :return: integer of the number of new ticks
+        """
+        if self.last_time_msc is None:
+            if date_from is None:
+                with mt5_lib.mt5_lock:
+                    tick = MetaTrader5.symbol_info_tick(self.symbol)
+                if tick is None:
+                    return 0
+                date_from = datetime.datetime.fromtimestamp(tick.time, tz=datetime.timezone.utc)
+            self.last_time_msc = -1
+        else:
+            date_from = datetime.datetime.fromtimestamp(self.last_time_msc // 1000, tz=datetime.timezone.utc)
+        received = 0
+        with metrics.timed("tick_poll", self.symbol):
+            while True:
+                with mt5_lib.mt5_lock:
+                    ticks = MetaTrader5.copy_ticks_from(self.symbol, date_from, self.fetch_count,
+                                                        MetaTrader5.COPY_TICKS_ALL)
+                fetched = 0 if ticks is None else len(ticks)
+                ticks = self.drop_seen(ticks=to_tick_array(ticks))
+                if len(ticks) > 0:
+                    self.ring.append(ticks)
+                    for name, builder in self.builders.items():
+                        self.store_bars(name=name, bars=builder.update(ticks))
+                    received += len(ticks)
+                # Stop once MT5 has nothing more, or nothing new
+                if fetched < self.fetch_count or len(ticks) == 0:
+                    break
+                date_from = datetime.datetime.fromtimestamp(self.last_time_msc // 1000, tz=datetime.timezone.utc)
+        return received
+
+    # Function to drop ticks already received
+    def drop_seen(self, ticks):
+        """
+        Function to drop the ticks received by an earlier poll. Requests start on a whole second, so they overlap the
+        ticks of the second of the last tick
+        :param ticks: structured array of TICK_DTYPE, oldest first
+        :return: structured array of TICK_DTYPE of the new ticks
+        """
+        ticks = ticks[ticks['time_msc'] >= self.last_time_msc]
+        # Ticks sharing the millisecond of the last tick are new once past the ones already counted
+        same_time = int(numpy.count_nonzero(ticks['time_msc'] == self.last_time_msc))
+        ticks = ticks[min(same_time, self.last_time_count):]
+        if len(ticks) > 0:
+            last_time_msc = int(ticks['time_msc'][-1])
+            count = int(numpy.count_nonzero(ticks['time_msc'] == last_time_msc))
+            if last_time_msc == self.last_time_msc:
+                count += self.last_time_count
+            self.last_time_msc = last_time_msc
+            self.last_time_count = count
+        return ticks
+
+    # Function to store completed bars
+    def store_bars(self, name, bars):
+        """
+        Function to add completed bars to the bars kept under name
+        :param name: string naming the bars
+        :param bars: structured array of BAR_DTYPE
+        :return: None
+        """
+        if len(bars) == 0:
+            return
+        cache = self.bars[name]
+        if cache.candles is None:
+            cache.replace(bars)
+        else:
+            cache.append(bars)
+
+    # Function to complete time based bars on a quiet market
+    def flush(self, time_msc):
+        """
+        Function to complete the forming time based bars whose period has passed
+        :param time_msc: integer of the current server time in milliseconds
+        :return: None
+        """
+        for name, builder in self.builders.items():
+            self.store_bars(name=name, bars=builder.flush(time_msc))
+
+    # Function to get the completed bars
+    def get_candlesticks(self, name, number_of_candles):
+        """
+        Function to get the most recent completed bars, in the same format as mt5_lib.get_candlesticks
+        :param name: string naming the bars
+        :param number_of_candles: integer of the number of bars
+        :return: dataframe of the bars
+        """
+        candles, human_time = self.bars[name].tail(number_of_candles)
+        dataframe = pandas.DataFrame(candles)
+        dataframe['human_time'] = human_time
+        return dataframe
+
+    # Function to get the bar still forming
+    def forming(self, name):
+        """
+        Function to get the bar still forming, for intrabar checks
+        :param name: string naming the bars
+        :return: structured array of BAR_DTYPE holding one bar. Empty if no tick has arrived since the last bar
+        """
+        return self.builders[name].forming()
+
+
+# Tick feeds per symbol
+tick_feeds = {}
+
+
+# Function to get the tick feed of a symbol
+def get_tick_feed(symbol, capacity=TICK_CAPACITY):
+    """
+    Function to get the tick feed of a symbol, creating it the first time
+    :param symbol: string of the symbol
+    :param capacity: integer of the number of ticks kept. Only used when the feed is created
+    :return: TickFeed
+    """
+    feed = tick_feeds.get(symbol)
+    if feed is None:
+        feed = TickFeed(symbol=symbol, capacity=capacity)
+        tick_feeds[symbol] = feed
+    return feed
+
+
+# Function to replay a stop order on ticks
+def replay_stop_order(ticks, order_type, stop_price, stop_loss, take_profit, start_msc, expiry_msc, window=4096):
+    """
+    Function to replay a BUY_STOP or SELL_STOP, as make_trade places them, on ticks:
+    1. The order is rejected if its stop_price is already through the market on the first tick from start_msc
+    2. A BUY_STOP fills at the ask of the first tick with the ask at or above the stop_price, a SELL_STOP at the bid of
+    the first tick with the bid at or below it, before expiry_msc. A gap through the stop_price fills at the gap price
+    3. Once filled, the position closes on the first tick through the stop_loss (at that tick's price, so gaps slip) or
+    the take_profit (at the take_profit). A BUY closes on the bid, a SELL on the ask
+    :param ticks: structured array with time_msc, bid and ask fields, oldest first
+    :param order_type: string. BUY_STOP or SELL_STOP
+    :param stop_price: float of the stop_price
+    :param stop_loss: float of the stop_loss
+    :param take_profit: float of the take_profit
+    :param start_msc: integer of the time the order is placed, in milliseconds
+    :param expiry_msc: integer of the time the order is cancelled, in milliseconds
+    :param window: integer of the initial exit search window
+    :return: tuple of (status, fill time, fill price, exit time, exit price, exit reason). Status is filled, cancelled,
+    rejected or no_ticks. Exit reason is 'open' if neither exit is hit by the last tick
+    """
+    times = ticks['time_msc']
+    bids = ticks['bid']
+    asks = ticks['ask']
+    is_buy = order_type == "BUY_STOP"
+    first = int(numpy.searchsorted(times, start_msc, side='left'))
+    last = int(numpy.searchsorted(times, expiry_msc, side='left'))
+    if first >= len(ticks):
+        return "no_ticks", 0, numpy.nan, 0, numpy.nan, ""
+    if (is_buy and asks[first] >= stop_price) or (not is_buy and bids[first] <= stop_price):
+        return "rejected", 0, numpy.nan, 0, numpy.nan, ""
+    triggered = asks[first:last] >= stop_price if is_buy else bids[first:last] <= stop_price
+    if not triggered.any():
+        return "cancelled", 0, numpy.nan, 0, numpy.nan, ""
+    fill = first + int(numpy.argmax(triggered))
+    fill_price = asks[fill] if is_buy else bids[fill]
+    # Search for the exit in growing windows so short trades do not scan the rest of the ticks
+    start = fill
+    exit_prices = bids if is_buy else asks
+    while start < len(ticks):
+        end = min(start + window, len(ticks))
+        prices = exit_prices[start:end]
+        if is_buy:
+            hit_stop_loss = prices <= stop_loss
+            hit_take_profit = prices >= take_profit
+        else:
+            hit_stop_loss = prices >= stop_loss
+            hit_take_profit = prices <= take_profit
+        hit = hit_stop_loss | hit_take_profit
+        if hit.any():
+            index = start + int(numpy.argmax(hit))
+            if hit_stop_loss[index - start]:
+                return "filled", int(times[fill]), fill_price, int(times[index]), exit_prices[index], "stop_loss"
+            return "filled", int(times[fill]), fill_price, int(times[index]), take_profit, "take_profit"
+        start = end
+        window *= 2
+    # Still open at the last tick
+    return "filled", int(times[fill]), fill_price, int(times[-1]), exit_prices[-1], "open"